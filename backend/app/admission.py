@@ -0,0 +1,345 @@
+"""Admission control for provider requests: priority queues, load shedding, circuit breakers.
+
+Every chat completion and embedding request takes a slot from a
+``ProviderGate``, one per provider and operation: ``chat`` allows
+``provider_chat_max_in_flight`` requests at once, ``embed``
+``embedding_max_in_flight``. When all slots are taken, requests wait in a
+priority queue. Interactive work (answers, question embeddings, follow-up
+rewrites) goes before background work (ingestion embeddings, conversation
+summaries). An interactive request is shed with ``Overloaded`` (HTTP 429
+with ``Retry-After``) when ``provider_max_queue`` others are already
+waiting or no slot frees up within ``provider_queue_timeout``. Background
+work waits as long as it takes.
+
+A ``CircuitBreaker`` per provider opens after ``breaker_failure_threshold``
+consecutive failures (connection errors, timeouts, 5xx). While it is open,
+requests fail at once with ``ProviderUnavailable`` (HTTP 503 with
+``Retry-After``) instead of each waiting for its own timeout, and chat moves
+to the other configured provider when ``provider_fallback`` is on. After
+``breaker_reset_seconds`` one trial request goes through; its outcome
+closes the circuit or opens it again.
+
+State is per worker process.
+"""
+
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+import math
+import time
+from collections.abc import AsyncIterator
+from enum import IntEnum
+
+import httpx
+
+from app.config import settings
+from app.providers import loaded_openai
+from app.telemetry import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_SHED,
+    ADMISSION_WAIT,
+    CIRCUIT_STATE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+class Overloaded(Exception):
+    """No provider slot within the wait budget."""
+
+    def __init__(self, provider: str, retry_after: float) -> None:
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(
+            f"Tjänsten är hårt belastad ({provider}). "
+            f"Försök igen om {math.ceil(retry_after)} sekunder."
+        )
+
+
+class ProviderUnavailable(Exception):
+    """The provider's circuit is open."""
+
+    def __init__(self, provider: str, retry_after: float) -> None:
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(
+            f"{provider} svarar inte just nu. Försök igen om {math.ceil(retry_after)} sekunder."
+        )
+
+
+def is_provider_failure(exc: BaseException) -> bool:
+    """Errors that say the provider is degraded, as opposed to a bad request."""
+    openai = loaded_openai()
+    if isinstance(exc, httpx.HTTPStatusError) or (
+        openai is not None and isinstance(exc, openai.APIStatusError)
+    ):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError) or (
+        openai is not None and isinstance(exc, openai.APIConnectionError)
+    )
+
+
+class CircuitBreaker:
+    _STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, provider: str, threshold: int, reset_seconds: float) -> None:
+        self.provider = provider
+        self._threshold = threshold
+        self._reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at: float | None = None
+        # The half-open trial request is in flight
+        self._trial = False
+        CIRCUIT_STATE.labels(provider).set(0)
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self._reset_seconds:
+            return "half_open"
+        return "open"
+
+    def is_open(self) -> bool:
+        """Would a request be rejected right now?"""
+        state = self.state
+        return state == "open" or (state == "half_open" and self._trial)
+
+    def retry_after(self) -> float:
+        if self._opened_at is None:
+            return 1.0
+        return max(1.0, self._opened_at + self._reset_seconds - time.monotonic())
+
+    def check(self) -> None:
+        if self._threshold > 0 and self.is_open():
+            raise ProviderUnavailable(self.provider, self.retry_after())
+
+    def begin(self) -> bool:
+        """Admit one request; returns whether it is the half-open trial."""
+        if self._threshold <= 0:
+            return False
+        self.check()
+        if self.state == "half_open":
+            self._trial = True
+            CIRCUIT_STATE.labels(self.provider).set(self._STATES["half_open"])
+            return True
+        return False
+
+    def end(self, trial: bool, failed: bool | None) -> None:
+        """``failed`` is None when the request was cancelled and says nothing."""
+        if trial:
+            self._trial = False
+        if failed is None:
+            return
+        if not failed:
+            if self._opened_at is not None:
+                logger.info("Circuit of %s closed", self.provider)
+            self._failures = 0
+            self._opened_at = None
+        else:
+            self._failures += 1
+            if self._threshold > 0 and (
+                trial or (self._opened_at is None and self._failures >= self._threshold)
+            ):
+                logger.warning(
+                    "Circuit of %s opened after %d consecutive failures; failing fast for %.0f s",
+                    self.provider, self._failures, self._reset_seconds,
+                )
+                self._opened_at = time.monotonic()
+        CIRCUIT_STATE.labels(self.provider).set(self._STATES[self.state])
+
+
+class ProviderGate:
+    """At most ``max_in_flight`` requests at once; the rest wait, highest priority first."""
+
+    def __init__(
+        self,
+        provider: str,
+        operation: str,
+        max_in_flight: int,
+        max_queue: int,
+        max_wait: float,
+        breaker: CircuitBreaker,
+        prioritize: bool = True,
+    ) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.provider = provider
+        self.operation = operation
+        self._max_in_flight = max(1, max_in_flight)
+        self._max_queue = max_queue
+        self._max_wait = max_wait
+        self._breaker = breaker
+        self._prioritize = prioritize
+        self._in_flight = 0
+        # (priority, arrival, future); futures of waiters that gave up stay until popped
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._arrivals = itertools.count()
+        self._queued = {priority: 0 for priority in Priority}
+        # Moving average of how long a slot is held, for Retry-After
+        self._hold = 1.0
+
+    @contextlib.asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE) -> AsyncIterator[None]:
+        try:
+            # Don't queue for a provider that is known to be down
+            self._breaker.check()
+        except ProviderUnavailable:
+            ADMISSION_SHED.labels(self.provider, self.operation, "circuit_open").inc()
+            raise
+        await self._acquire(priority)
+        try:
+            trial = self._breaker.begin()
+        except ProviderUnavailable:
+            self._release()
+            ADMISSION_SHED.labels(self.provider, self.operation, "circuit_open").inc()
+            raise
+
+        started = time.monotonic()
+        failed: bool | None = None
+        try:
+            yield
+            failed = False
+        except Exception as e:
+            failed = is_provider_failure(e)
+            raise
+        finally:
+            self._breaker.end(trial, failed)
+            self._hold = 0.8 * self._hold + 0.2 * (time.monotonic() - started)
+            self._release()
+
+    def check(self) -> None:
+        """Shed now if an interactive request would be; for streams, before they start."""
+        if (
+            self._in_flight >= self._max_in_flight
+            and self._queued[Priority.INTERACTIVE] >= self._max_queue
+        ):
+            raise self._shed("queue_full")
+
+    def retry_after(self) -> float:
+        """Roughly when the interactive queue will have drained."""
+        waiting = self._queued[Priority.INTERACTIVE] + 1
+        return max(1.0, self._hold * waiting / self._max_in_flight)
+
+    def _shed(self, reason: str) -> Overloaded:
+        ADMISSION_SHED.labels(self.provider, self.operation, reason).inc()
+        return Overloaded(self.provider, self.retry_after())
+
+    async def _acquire(self, priority: Priority) -> None:
+        if self._in_flight < self._max_in_flight and not self._waiters:
+            self._in_flight += 1
+            ADMISSION_IN_FLIGHT.labels(self.provider, self.operation).set(self._in_flight)
+            return
+
+        interactive = priority == Priority.INTERACTIVE
+        if interactive and self._queued[priority] >= self._max_queue:
+            raise self._shed("queue_full")
+
+        future = self.loop.create_future()
+        rank = priority if self._prioritize else 0
+        heapq.heappush(self._waiters, (rank, next(self._arrivals), future))
+        self._set_queued(priority, +1)
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(self._max_wait if interactive and self._max_wait > 0 else None):
+                await future
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up
+                self._release()
+            future.cancel()
+            if isinstance(e, TimeoutError):
+                raise self._shed("timeout") from None
+            raise
+        finally:
+            self._set_queued(priority, -1)
+            ADMISSION_WAIT.labels(self.provider, self.operation, priority.name.lower()).observe(
+                time.perf_counter() - started
+            )
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Handed over directly, so no newcomer can take it first
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+        ADMISSION_IN_FLIGHT.labels(self.provider, self.operation).set(self._in_flight)
+
+    def _set_queued(self, priority: Priority, delta: int) -> None:
+        self._queued[priority] += delta
+        ADMISSION_QUEUE_DEPTH.labels(self.provider, self.operation, priority.name.lower()).set(
+            self._queued[priority]
+        )
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_gates: dict[tuple[str, str], ProviderGate] = {}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            provider, settings.breaker_failure_threshold, settings.breaker_reset_seconds
+        )
+        _breakers[provider] = breaker
+    return breaker
+
+
+def get_gate(provider: str, operation: str) -> ProviderGate:
+    gate = _gates.get((provider, operation))
+    # Futures are bound to the loop that created them (see get_clients)
+    if gate is None or gate.loop is not asyncio.get_running_loop():
+        max_in_flight = (
+            settings.embedding_max_in_flight
+            if operation == "embed"
+            else settings.provider_chat_max_in_flight
+        )
+        gate = ProviderGate(
+            provider,
+            operation,
+            max_in_flight=max_in_flight,
+            max_queue=settings.provider_max_queue,
+            max_wait=settings.provider_queue_timeout,
+            breaker=get_breaker(provider),
+            prioritize=settings.admission_priority,
+        )
+        _gates[(provider, operation)] = gate
+    return gate
+
+
+def admit(
+    provider: str, operation: str, priority: Priority = Priority.INTERACTIVE
+) -> contextlib.AbstractAsyncContextManager[None]:
+    """Hold a slot of the provider for one request."""
+    return get_gate(provider, operation).slot(priority)
+
+
+def is_configured(provider: str) -> bool:
+    if provider == "openai":
+        return bool(settings.openai_api_key)
+    return bool(settings.ollama_base_url)
+
+
+def chat_provider(provider: str) -> str:
+    """The provider to send a chat request to: its own, or the fallback while its circuit is open.
+
+    Raises ``ProviderUnavailable`` when neither can take it.
+    """
+    breaker = get_breaker(provider)
+    if settings.breaker_failure_threshold <= 0 or not breaker.is_open():
+        return provider
+    other = "ollama" if provider == "openai" else "openai"
+    if settings.provider_fallback and is_configured(other) and not get_breaker(other).is_open():
+        return other
+    ADMISSION_SHED.labels(provider, "chat", "circuit_open").inc()
+    raise ProviderUnavailable(provider, breaker.retry_after())
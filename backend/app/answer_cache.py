@@ -0,0 +1,180 @@
+"""Semantic answer cache for repeated questions.
+
+An answer is reused when a new question retrieves the same set of chunks
+with the same model and temperature, and its embedding is within
+``answer_cache_similarity_threshold`` cosine similarity of a cached
+question. Only the cached entries with the same key are compared, as one
+NumPy product. Entries expire after a TTL, are evicted least recently used
+first, and a tenant's entries are dropped whenever its corpus version
+changes.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from app.config import settings
+from app.models import ChatResponse
+
+logger = logging.getLogger(__name__)
+
+# (tenant, provider, model, temperature, frozenset of chunk ids)
+AnswerKey = tuple[str, str, str, float, frozenset[str]]
+
+
+@dataclass
+class _Entry:
+    key: AnswerKey
+    # Unit-normalized float32
+    embedding: np.ndarray
+    response: ChatResponse
+    generation_ms: float
+    created: float
+
+
+@dataclass
+class _Bucket:
+    """The entries of one key, with their embeddings stacked for one matrix product."""
+
+    ids: list[int] = field(default_factory=list)
+    # Rebuilt on the next lookup after ids change
+    matrix: np.ndarray | None = None
+
+
+class AnswerCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, threshold: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved_ms = 0.0
+        # Least recently used first
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        # A lookup only compares the entries with its own key
+        self._by_key: dict[AnswerKey, _Bucket] = {}
+        self._next_id = 0
+        self._corpus_versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def lookup(
+        self,
+        embedding: list[float],
+        key: AnswerKey,
+        corpus_version: int,
+    ) -> ChatResponse | None:
+        query = _normalize(embedding)
+        now = time.monotonic()
+
+        with self._lock:
+            self._check_version(key[0], corpus_version)
+            self._expire(now)
+            bucket = self._by_key.get(key)
+            for entry_id in list(bucket.ids if bucket else ()):
+                if now - self._entries[entry_id].created > self.ttl_seconds:
+                    self._remove(entry_id)
+
+            best_id = None
+            if bucket and bucket.ids:
+                if bucket.matrix is None:
+                    bucket.matrix = np.stack([self._entries[i].embedding for i in bucket.ids])
+                scores = bucket.matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    best_id = bucket.ids[best]
+
+            if best_id is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_id)
+            entry = self._entries[best_id]
+            self.hits += 1
+            self.latency_saved_ms += entry.generation_ms
+            return entry.response
+
+    def store(
+        self,
+        embedding: list[float],
+        key: AnswerKey,
+        response: ChatResponse,
+        generation_ms: float,
+        corpus_version: int,
+    ) -> None:
+        with self._lock:
+            self._check_version(key[0], corpus_version)
+            self._entries[self._next_id] = _Entry(
+                key=key,
+                embedding=_normalize(embedding),
+                response=response,
+                generation_ms=generation_ms,
+                created=time.monotonic(),
+            )
+            bucket = self._by_key.setdefault(key, _Bucket())
+            bucket.ids.append(self._next_id)
+            bucket.matrix = None
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _expire(self, now: float) -> None:
+        """Drop expired entries from the least recently used end (lock held)."""
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if now - entry.created <= self.ttl_seconds:
+                return
+            self._remove(entry_id)
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        bucket = self._by_key[entry.key]
+        bucket.ids.remove(entry_id)
+        bucket.matrix = None
+        if not bucket.ids:
+            del self._by_key[entry.key]
+
+    def _check_version(self, tenant: str, corpus_version: int) -> None:
+        if self._corpus_versions.get(tenant) == corpus_version:
+            return
+        stale = [entry_id for entry_id, entry in self._entries.items() if entry.key[0] == tenant]
+        if stale:
+            logger.info("Corpus of %s changed — dropping %d cached answers", tenant, len(stale))
+        for entry_id in stale:
+            self._remove(entry_id)
+        self._corpus_versions[tenant] = corpus_version
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "latency_saved_ms": round(self.latency_saved_ms, 1),
+        }
+
+
+def _normalize(vector: list[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+_cache: AnswerCache | None = None
+
+
+def get_answer_cache() -> AnswerCache | None:
+    global _cache
+    if not settings.answer_cache_enabled:
+        return None
+    if _cache is None:
+        _cache = AnswerCache(
+            max_entries=settings.answer_cache_max_entries,
+            ttl_seconds=settings.answer_cache_ttl_seconds,
+            threshold=settings.answer_cache_similarity_threshold,
+        )
+    return _cache
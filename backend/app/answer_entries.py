@@ -0,0 +1,59 @@
+"""Key → value entries of ORSAK → FÖRKLARING (and FRÅGA → SVAR) table rows.
+
+Collected while a document is chunked, also in the parse worker processes,
+which is why this lives apart from the lookup in ``app.direct_answers``:
+importing it must not pull in the catalog or telemetry.
+"""
+
+import re
+import unicodedata
+
+from app.models import ChunkInfo
+
+_KEY_HEADER_RE = re.compile(r"ORSAK|FRÅGA|FRAGE|QUESTION|CAUSE", re.IGNORECASE)
+_VALUE_HEADER_RE = re.compile(r"FÖRKLARING|SVAR|ANSWER|EXPLANATION", re.IGNORECASE)
+
+
+def normalize_key(text: str) -> str:
+    """Case-, width- and punctuation-insensitive form of a key: "Orsak S-01" → "orsaks01"."""
+    return "".join(ch for ch in unicodedata.normalize("NFKC", text).casefold() if ch.isalnum())
+
+
+class AnswerCollector:
+    """Called by ``iter_chunks`` for every table entry; collects one entry per key/value row."""
+
+    def __init__(self) -> None:
+        self.entries: list[dict] = []
+        self._row: tuple[int, int] | None = None
+        self._key: tuple[str, str] | None = None
+        self._value: tuple[str, str, ChunkInfo] | None = None
+        self._done = False
+
+    def __call__(self, section: dict, chunk: ChunkInfo) -> None:
+        row = (section.get("table_index", 0), section.get("row_index", 0))
+        if row != self._row:
+            self._row, self._key, self._value, self._done = row, None, None, False
+        if self._done:
+            return
+        header = section.get("header", "")
+        if _VALUE_HEADER_RE.search(header):
+            if self._value is None:
+                self._value = (header, section["text"], chunk)
+        elif _KEY_HEADER_RE.search(header):
+            if self._key is None and normalize_key(section["text"]):
+                self._key = (header, section["text"])
+        else:
+            return
+
+        # A row's entry is complete as soon as it has both columns
+        if self._key and self._value:
+            (key_header, key), (value_header, value, value_chunk) = self._key, self._value
+            self.entries.append({
+                "key": key,
+                "key_header": key_header,
+                "value": value,
+                "value_header": value_header,
+                "section": value_chunk.section,
+                "chunk_index": value_chunk.chunk_index,
+            })
+            self._done = True
@@ -0,0 +1,552 @@
+"""Persistent catalog of documents, chunks, ingestion jobs and corpus versions.
+
+One SQLite database (WAL mode) shared by every worker process, so
+``/api/documents``, ``/api/health`` and job polling give the same answer
+whichever ``uvicorn --workers N`` process serves them, and survive restarts.
+
+A document is recorded as ``indexing`` before its chunks are written and
+becomes ``ready`` (or ``failed``) afterwards. Its chunk ids and
+direct-answer entries are replaced in the same transaction that bumps the
+tenant's corpus version, right after
+the vector store has been written and flushed. A worker whose open index
+was loaded at an older version reloads it before the next search, and
+answer caches keyed by the version stay valid across processes.
+
+Conversations keep their rolling summary and the turns not yet folded
+into it, so a follow-up can be served by any worker.
+
+Writers to one tenant's index are serialized across processes with a lock
+file per tenant (``write_lock``).
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import AsyncIterator
+
+from app.config import settings
+from app.models import DocumentInfo, IngestionJob
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only hold within one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tenants (
+    tenant TEXT PRIMARY KEY,
+    corpus_version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    tenant TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    status TEXT NOT NULL,
+    content_hash TEXT,
+    chunking TEXT,
+    num_chunks INTEGER NOT NULL DEFAULT 0,
+    num_tables INTEGER NOT NULL DEFAULT 0,
+    num_paragraphs INTEGER NOT NULL DEFAULT 0,
+    sample_sections TEXT NOT NULL DEFAULT '[]',
+    stage_ms TEXT NOT NULL DEFAULT '{}',
+    error TEXT,
+    job_id TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (tenant, filename)
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    tenant TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    PRIMARY KEY (tenant, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS chunks_document ON chunks (tenant, filename);
+CREATE TABLE IF NOT EXISTS answers (
+    tenant TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_document ON answers (tenant, filename);
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    tenant TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_tenant ON jobs (tenant, created_at);
+CREATE TABLE IF NOT EXISTS conversations (
+    tenant TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    summarized_turns INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (tenant, conversation_id)
+);
+CREATE INDEX IF NOT EXISTS conversations_updated ON conversations (updated_at);
+CREATE TABLE IF NOT EXISTS turns (
+    tenant TEXT NOT NULL,
+    conversation_id TEXT NOT NULL,
+    turn INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    PRIMARY KEY (tenant, conversation_id, turn)
+) WITHOUT ROWID;
+"""
+
+_DOCUMENT_COLUMNS = (
+    "filename, status, content_hash, num_chunks, num_tables, num_paragraphs, "
+    "sample_sections, stage_ms, error, updated_at"
+)
+
+# Chunk ids inserted per statement
+_INSERT_BATCH = 1000
+
+
+class Catalog:
+    def __init__(self, path: str) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        # Other workers may hold the write lock for a moment; wait rather than fail
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    # -- corpus versions --
+
+    def corpus_version(self, tenant: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT corpus_version FROM tenants WHERE tenant = ?", (tenant,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def _bump(self, tenant: str) -> int:
+        return self._conn.execute(
+            "INSERT INTO tenants (tenant, corpus_version) VALUES (?, 1) "
+            "ON CONFLICT (tenant) DO UPDATE SET corpus_version = corpus_version + 1 "
+            "RETURNING corpus_version",
+            (tenant,),
+        ).fetchone()[0]
+
+    # -- documents --
+
+    def begin_document(
+        self, tenant: str, filename: str, content_hash: str | None, chunking: str, job_id: str
+    ) -> None:
+        """Record that a (new version of a) document is being indexed."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO documents (tenant, filename, status, content_hash, chunking, "
+                "job_id, updated_at) VALUES (?, ?, 'indexing', ?, ?, ?, ?) "
+                "ON CONFLICT (tenant, filename) DO UPDATE SET status = 'indexing', "
+                "content_hash = excluded.content_hash, chunking = excluded.chunking, "
+                "job_id = excluded.job_id, error = NULL, updated_at = excluded.updated_at",
+                (tenant, filename, content_hash, chunking, job_id, time.time()),
+            )
+
+    def commit_chunks(
+        self,
+        tenant: str,
+        chunk_ids: dict[str, list[str]],
+        changed: bool,
+        answers: dict[str, list[dict]] | None = None,
+    ) -> int:
+        """Replace the chunk ids and direct answers of the given documents.
+
+        Returns the corpus version, bumped if anything changed.
+        """
+        with self._lock, self._conn:
+            for filename, entries in (answers or {}).items():
+                rows = [json.dumps(entry, ensure_ascii=False) for entry in entries]
+                stored = [row for (row,) in self._conn.execute(
+                    "SELECT data FROM answers WHERE tenant = ? AND filename = ? ORDER BY rowid",
+                    (tenant, filename),
+                )]
+                if rows == stored:
+                    continue
+                self._conn.execute(
+                    "DELETE FROM answers WHERE tenant = ? AND filename = ?", (tenant, filename)
+                )
+                self._conn.executemany(
+                    "INSERT INTO answers (tenant, filename, data) VALUES (?, ?, ?)",
+                    [(tenant, filename, row) for row in rows],
+                )
+                # Same chunks, new answers (first upload since the index existed)
+                changed = True
+            for filename, ids in chunk_ids.items():
+                self._conn.execute(
+                    "DELETE FROM chunks WHERE tenant = ? AND filename = ?", (tenant, filename)
+                )
+                for i in range(0, len(ids), _INSERT_BATCH):
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO chunks (tenant, chunk_id, filename) "
+                        "VALUES (?, ?, ?)",
+                        [(tenant, chunk_id, filename) for chunk_id in ids[i : i + _INSERT_BATCH]],
+                    )
+            if changed:
+                return self._bump(tenant)
+            row = self._conn.execute(
+                "SELECT corpus_version FROM tenants WHERE tenant = ?", (tenant,)
+            ).fetchone()
+            return row[0] if row else 0
+
+    def finish_document(
+        self, tenant: str, document: DocumentInfo, stage_ms: dict[str, float]
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE documents SET status = 'ready', num_chunks = ?, num_tables = ?, "
+                "num_paragraphs = ?, sample_sections = ?, stage_ms = ?, updated_at = ? "
+                "WHERE tenant = ? AND filename = ?",
+                (
+                    document.num_chunks,
+                    document.num_tables,
+                    document.num_paragraphs,
+                    json.dumps(document.sample_sections, ensure_ascii=False),
+                    json.dumps(stage_ms),
+                    time.time(),
+                    tenant,
+                    document.filename,
+                ),
+            )
+
+    def fail_document(self, tenant: str, filename: str, error: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE documents SET status = 'failed', error = ?, updated_at = ? "
+                "WHERE tenant = ? AND filename = ?",
+                (error, time.time(), tenant, filename),
+            )
+
+    def remove_document(self, tenant: str, filename: str) -> int:
+        """Forget one document and its chunks; returns the new corpus version."""
+        with self._lock, self._conn:
+            for table in ("chunks", "answers", "documents"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE tenant = ? AND filename = ?", (tenant, filename)
+                )
+            return self._bump(tenant)
+
+    def clear_tenant(self, tenant: str) -> int:
+        with self._lock, self._conn:
+            for table in ("chunks", "answers", "documents"):
+                self._conn.execute(f"DELETE FROM {table} WHERE tenant = ?", (tenant,))
+            return self._bump(tenant)
+
+    def backfill(self, tenant: str, chunk_ids: dict[str, list[str]]) -> None:
+        """Register documents found in a store that predates the catalog."""
+        now = time.time()
+        with self._lock, self._conn:
+            for filename, ids in chunk_ids.items():
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO documents (tenant, filename, status, num_chunks, "
+                    "updated_at) VALUES (?, ?, 'ready', ?, ?)",
+                    (tenant, filename, len(ids), now),
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO chunks (tenant, chunk_id, filename) VALUES (?, ?, ?)",
+                    [(tenant, chunk_id, filename) for chunk_id in ids],
+                )
+        logger.info("Catalog: registered %d existing documents of %s", len(chunk_ids), tenant)
+
+    def list_documents(self, tenant: str) -> list[DocumentInfo]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_DOCUMENT_COLUMNS} FROM documents WHERE tenant = ? ORDER BY updated_at",
+                (tenant,),
+            ).fetchall()
+        return [_document(row) for row in rows]
+
+    def get_document(self, tenant: str, filename: str) -> DocumentInfo | None:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_DOCUMENT_COLUMNS} FROM documents WHERE tenant = ? AND filename = ?",
+                (tenant, filename),
+            ).fetchone()
+        return _document(row) if row else None
+
+    def find_unchanged(
+        self, tenant: str, filename: str, content_hash: str, chunking: str
+    ) -> DocumentInfo | None:
+        """The ready document if this exact file was already indexed with these settings."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_DOCUMENT_COLUMNS} FROM documents WHERE tenant = ? AND filename = ? "
+                "AND status = 'ready' AND content_hash = ? AND chunking = ?",
+                (tenant, filename, content_hash, chunking),
+            ).fetchone()
+        return _document(row) if row else None
+
+    def document_counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT tenant, COUNT(*) FROM documents GROUP BY tenant"
+            ).fetchall()
+        return dict(rows)
+
+    def chunk_count(self, tenant: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM chunks WHERE tenant = ?", (tenant,)
+            ).fetchone()[0]
+
+    def list_answers(self, tenant: str) -> list[tuple[str, dict]]:
+        """(filename, entry) of every direct-answer entry of the tenant, by filename."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT filename, data FROM answers WHERE tenant = ? ORDER BY filename, rowid",
+                (tenant,),
+            ).fetchall()
+        return [(filename, json.loads(data)) for filename, data in rows]
+
+    # -- jobs --
+
+    def save_job(self, job: IngestionJob) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, tenant, status, created_at, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (job.job_id, job.tenant, job.status, job.created_at, job.model_dump_json()),
+            )
+
+    def get_job(self, job_id: str) -> IngestionJob | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return IngestionJob.model_validate_json(row[0]) if row else None
+
+    def list_jobs(self, tenant: str, limit: int) -> list[IngestionJob]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM jobs WHERE tenant = ? ORDER BY created_at DESC LIMIT ?",
+                (tenant, limit),
+            ).fetchall()
+        return [IngestionJob.model_validate_json(row[0]) for row in reversed(rows)]
+
+    def trim_jobs(self, keep: int) -> None:
+        """Drop finished jobs beyond the ``keep`` most recent."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND job_id NOT IN ("
+                "SELECT job_id FROM jobs ORDER BY created_at DESC LIMIT ?)",
+                (keep,),
+            )
+
+    # -- snapshots --
+
+    def export_registry(self, tenant: str) -> dict:
+        """The tenant's ready documents with their chunk ids and direct answers."""
+        with self._lock:
+            documents = self._conn.execute(
+                "SELECT filename, content_hash, chunking, num_chunks, num_tables, "
+                "num_paragraphs, sample_sections, stage_ms FROM documents "
+                "WHERE tenant = ? AND status = 'ready' ORDER BY updated_at",
+                (tenant,),
+            ).fetchall()
+            ready = {row[0] for row in documents}
+            chunks: dict[str, list[str]] = {}
+            for chunk_id, filename in self._conn.execute(
+                "SELECT chunk_id, filename FROM chunks WHERE tenant = ?", (tenant,)
+            ):
+                if filename in ready:
+                    chunks.setdefault(filename, []).append(chunk_id)
+            answers: dict[str, list[dict]] = {}
+            for filename, data in self._conn.execute(
+                "SELECT filename, data FROM answers WHERE tenant = ? ORDER BY filename, rowid",
+                (tenant,),
+            ):
+                if filename in ready:
+                    answers.setdefault(filename, []).append(json.loads(data))
+        columns = (
+            "filename", "content_hash", "chunking", "num_chunks", "num_tables",
+            "num_paragraphs", "sample_sections", "stage_ms",
+        )
+        return {
+            "documents": [dict(zip(columns, row)) for row in documents],
+            "chunks": chunks,
+            "answers": answers,
+        }
+
+    def import_registry(self, tenant: str, registry: dict) -> int:
+        """Register the documents of a restored snapshot; returns the new corpus version."""
+        now = time.time()
+        with self._lock, self._conn:
+            for document in registry["documents"]:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents (tenant, filename, status, content_hash, "
+                    "chunking, num_chunks, num_tables, num_paragraphs, sample_sections, "
+                    "stage_ms, updated_at) VALUES (?, ?, 'ready', ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        tenant, document["filename"], document["content_hash"],
+                        document["chunking"], document["num_chunks"], document["num_tables"],
+                        document["num_paragraphs"], document["sample_sections"],
+                        document["stage_ms"], now,
+                    ),
+                )
+            for filename, ids in registry["chunks"].items():
+                for i in range(0, len(ids), _INSERT_BATCH):
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO chunks (tenant, chunk_id, filename) "
+                        "VALUES (?, ?, ?)",
+                        [(tenant, chunk_id, filename) for chunk_id in ids[i : i + _INSERT_BATCH]],
+                    )
+            for filename, entries in registry["answers"].items():
+                self._conn.executemany(
+                    "INSERT INTO answers (tenant, filename, data) VALUES (?, ?, ?)",
+                    [(tenant, filename, json.dumps(e, ensure_ascii=False)) for e in entries],
+                )
+            return self._bump(tenant)
+
+    # -- conversations --
+
+    def load_conversation(
+        self, tenant: str, conversation_id: str
+    ) -> tuple[str, int, list[tuple[int, str, str]]]:
+        """(summary, turns folded into it, later (turn, question, answer)s in order)."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, summarized_turns FROM conversations "
+                "WHERE tenant = ? AND conversation_id = ?",
+                (tenant, conversation_id),
+            ).fetchone()
+            if row is None:
+                return "", 0, []
+            turns = self._conn.execute(
+                "SELECT turn, question, answer FROM turns WHERE tenant = ? "
+                "AND conversation_id = ? AND turn > ? ORDER BY turn",
+                (tenant, conversation_id, row[1]),
+            ).fetchall()
+        return row[0], row[1], turns
+
+    def add_turn(self, tenant: str, conversation_id: str, question: str, answer: str) -> int:
+        """Append a turn, starting the conversation if needed; returns its number."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO conversations (tenant, conversation_id, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (tenant, conversation_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (tenant, conversation_id, now),
+            )
+            return self._conn.execute(
+                "INSERT INTO turns (tenant, conversation_id, turn, question, answer) "
+                "SELECT ?, ?, COALESCE(MAX(turn), 0) + 1, ?, ? FROM turns "
+                "WHERE tenant = ? AND conversation_id = ? RETURNING turn",
+                (tenant, conversation_id, question, answer, tenant, conversation_id),
+            ).fetchone()[0]
+
+    def fold_turns(
+        self, tenant: str, conversation_id: str, summary: str, since: int, through: int
+    ) -> bool:
+        """Replace turns ``since + 1 … through`` by ``summary``.
+
+        Only if nobody else folded since ``since`` was read; returns whether it applied.
+        """
+        with self._lock, self._conn:
+            applied = self._conn.execute(
+                "UPDATE conversations SET summary = ?, summarized_turns = ? "
+                "WHERE tenant = ? AND conversation_id = ? AND summarized_turns = ?",
+                (summary, through, tenant, conversation_id, since),
+            ).rowcount
+            if applied:
+                self._conn.execute(
+                    "DELETE FROM turns WHERE tenant = ? AND conversation_id = ? AND turn <= ?",
+                    (tenant, conversation_id, through),
+                )
+        return bool(applied)
+
+    def delete_conversation(self, tenant: str, conversation_id: str) -> bool:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM turns WHERE tenant = ? AND conversation_id = ?",
+                (tenant, conversation_id),
+            )
+            return bool(self._conn.execute(
+                "DELETE FROM conversations WHERE tenant = ? AND conversation_id = ?",
+                (tenant, conversation_id),
+            ).rowcount)
+
+    def trim_conversations(self, older_than: float) -> int:
+        """Drop conversations not continued since ``older_than``; returns how many."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM turns WHERE (tenant, conversation_id) IN ("
+                "SELECT tenant, conversation_id FROM conversations WHERE updated_at < ?)",
+                (older_than,),
+            )
+            return self._conn.execute(
+                "DELETE FROM conversations WHERE updated_at < ?", (older_than,)
+            ).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _document(row: tuple) -> DocumentInfo:
+    (
+        filename, status, content_hash, num_chunks, num_tables, num_paragraphs,
+        sample_sections, stage_ms, error, updated_at,
+    ) = row
+    return DocumentInfo(
+        filename=filename,
+        num_chunks=num_chunks,
+        num_tables=num_tables,
+        num_paragraphs=num_paragraphs,
+        sample_sections=json.loads(sample_sections),
+        status=status,
+        content_hash=content_hash,
+        stage_ms=json.loads(stage_ms),
+        error=error,
+        updated_at=updated_at,
+    )
+
+
+_catalog: Catalog | None = None
+
+
+def get_catalog() -> Catalog:
+    global _catalog
+    if _catalog is None:
+        _catalog = Catalog(settings.catalog_path)
+    return _catalog
+
+
+# -- cross-process write locks --
+
+_local_locks: dict[str, asyncio.Lock] = {}
+
+
+@contextlib.asynccontextmanager
+async def write_lock(tenant: str) -> AsyncIterator[None]:
+    """Hold the tenant's index for writing, in this process and in every other worker."""
+    local = _local_locks.setdefault(tenant, asyncio.Lock())
+    async with local:
+        if fcntl is None:
+            yield
+            return
+
+        directory = os.path.join(os.path.dirname(settings.catalog_path) or ".", "locks")
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(os.path.join(directory, f"{tenant}.lock"), os.O_RDWR | os.O_CREAT)
+        try:
+            # Poll instead of blocking a thread, so a cancelled waiter never takes the lock
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(0.05)
+            yield
+        finally:
+            os.close(fd)  # releases the lock
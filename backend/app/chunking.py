@@ -1,98 +1,235 @@
-"""Text chunking with configurable size and overlap."""
+"""Text chunking with a size budget in one unit: characters or tokens.
+
+Every size — ``chunk_size``, ``chunk_overlap`` and the merged windows — is
+measured in the same unit, heading line and table label included, so no
+chunk exceeds ``chunk_size`` (except a single word longer than the budget)
+unless a heading line or table label is longer than half of the room it
+shares with the text. The text always keeps at least half, so such a chunk
+is at most its heading and label plus ``chunk_size // 2``. Tokens are
+counted with the local estimator in ``app.tokens``.
+
+Long paragraphs are split on sentence boundaries; a sentence longer than
+the budget is split on word boundaries. Consecutive pieces repeat the
+whole trailing sentences (or words) that fit in ``chunk_overlap``.
+
+Sizes come from a prefix sum over the text (``size(a, b) = p[b] - p[a]``):
+the identity for characters, and for tokens one vectorized pass over a
+block of paragraphs at a time. Pieces are found by binary search over the
+cumulative sizes of their sentences and sliced from the original text.
+"""
+
+import itertools
+import re
+from bisect import bisect_left, bisect_right
+from collections.abc import Callable, Iterable, Iterator, Sequence
 
 from app.document import ParsedDocument
 from app.models import ChunkInfo
+from app.tokens import estimate_tokens, token_prefix
+
+UNITS = ("chars", "tokens")
+
+# Sections measured together in tokens mode; bounds memory for streamed input
+_BLOCK_SIZE = 512
+
+# Sentence gap: . ! ? or … then spaces and a capital letter or an opening
+# quote/bracket ("t.ex. om" and "kl. 8.30" stay one sentence), or a line break.
+# One pattern per terminator: a literal first character lets the regex engine
+# skip ahead with a fast search, several times faster than one alternation.
+_GAP_RES = [
+    (end, re.compile(re.escape(end) + r"[ \t\xa0]+(?=[\"'“”«(\[A-ZÅÄÖÉÜÆØ])"))
+    for end in ".!?…"
+]
+_WORD_RE = re.compile(r"\S+")
 
 
 def chunk_document(
     parsed: ParsedDocument,
     chunk_size: int = 500,
     chunk_overlap: int = 50,
+    unit: str = "chars",
+    merge_windows: bool = False,
 ) -> list[ChunkInfo]:
-    chunks: list[ChunkInfo] = []
+    return list(
+        iter_chunks(
+            parsed.sections, parsed.filename, chunk_size, chunk_overlap, unit, merge_windows
+        )
+    )
+
+
+def iter_chunks(
+    sections: Iterable[dict],
+    source: str,
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    unit: str = "chars",
+    merge_windows: bool = False,
+    on_table_entry: Callable[[dict, ChunkInfo], None] | None = None,
+) -> Iterator[ChunkInfo]:
+    """Chunk a stream of parsed sections without holding the document in memory.
+
+    With ``merge_windows`` two paragraphs that follow each other in the same
+    section are also emitted as one chunk (right after the second) when
+    together they fit in ``chunk_size``. ``on_table_entry`` is called with
+    each table entry section and its (first) chunk.
+    """
+    if unit not in UNITS:
+        raise ValueError(f"Unknown chunk unit: {unit} (expected one of {', '.join(UNITS)})")
+    if chunk_size <= 0 or not 0 <= chunk_overlap < chunk_size:
+        raise ValueError(f"Invalid chunking: size {chunk_size}, overlap {chunk_overlap}")
+
+    chunk_index = 0
+    # (text without heading, size) of the last paragraph piece, for merged windows
+    previous: tuple[str, int] | None = None
+
+    def make_chunk(text: str, section: str | None, kind: str = "paragraph") -> ChunkInfo:
+        nonlocal chunk_index
+        chunk = ChunkInfo(
+            text=text, source=source, chunk_index=chunk_index, section=section, kind=kind
+        )
+        chunk_index += 1
+        return chunk
 
-    # Strategy 1: Chunk body paragraphs with overlap
     current_section = None
-    for section in parsed.sections:
+    heading = ""
+    budget = chunk_size
+    for section, prefix in _measured(sections, unit):
         if section["type"] == "heading":
             current_section = section["text"]
+            heading = f"[Avsnitt: {current_section}]\n"
+            # The heading line is part of every chunk and counts against its budget
+            budget = max(chunk_size - _size(heading, unit), chunk_size // 2)
+            previous = None
             continue
 
         if section["type"] == "paragraph":
-            text = section["text"]
-            if len(text) <= chunk_size:
-                chunks.append(ChunkInfo(
-                    text=_with_heading(text, current_section),
-                    source=parsed.filename,
-                    chunk_index=len(chunks),
-                    section=current_section,
-                ))
-            else:
-                # Split long paragraphs
-                sub_chunks = _split_text(text, chunk_size, chunk_overlap)
-                for sc in sub_chunks:
-                    chunks.append(ChunkInfo(
-                        text=_with_heading(sc, current_section),
-                        source=parsed.filename,
-                        chunk_index=len(chunks),
-                        section=current_section,
-                    ))
+            for piece, size in _split(section["text"], prefix, budget, chunk_overlap):
+                yield make_chunk(heading + piece, current_section)
+
+                if merge_windows:
+                    if previous is not None and previous[1] + size + 1 <= budget:
+                        yield make_chunk(
+                            f"{heading}{previous[0]}\n{piece}", current_section, "window"
+                        )
+                    previous = (piece, size)
 
         elif section["type"] == "table_entry":
-            # Keep table entries as individual chunks — they're self-contained Q&A pairs
+            # Table entries stay whole — they're self-contained Q&A pairs — unless too long
             header = section.get("header", "")
-            text = section["text"]
-            prefixed = f"[{header}] {text}" if header else text
-            chunks.append(ChunkInfo(
-                text=_with_heading(prefixed, current_section),
-                source=parsed.filename,
-                chunk_index=len(chunks),
-                section=current_section,
-            ))
+            label = f"[{header}] " if header else ""
+            entry_budget = max(budget - _size(label, unit), budget // 2)
+            pieces = _split(section["text"], prefix, entry_budget, chunk_overlap)
+            for i, (piece, _) in enumerate(pieces):
+                chunk = make_chunk(heading + label + piece, current_section, "table_entry")
+                if i == 0 and on_table_entry:
+                    on_table_entry(section, chunk)
+                yield chunk
+            previous = None
+
+
+def split_text(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int = 0,
+    unit: str = "chars",
+) -> list[str]:
+    """Pieces of at most ``chunk_size``, cut between sentences where possible."""
+    prefix = token_prefix(text) if unit == "tokens" else range(len(text) + 1)
+    return [piece for piece, _ in _split(text, prefix, chunk_size, chunk_overlap)]
+
 
-    # Strategy 2: Also create merged paragraph windows for broader context
-    merged = _merge_adjacent_chunks(chunks, chunk_size, chunk_overlap)
-    chunks.extend(merged)
+def _size(text: str, unit: str) -> int:
+    return estimate_tokens(text) if unit == "tokens" else len(text)
 
-    return chunks
 
+def _measured(sections: Iterable[dict], unit: str) -> Iterator[tuple[dict, Sequence[int]]]:
+    """Pair each section with the prefix sizes of its text."""
+    if unit == "chars":
+        for section in sections:
+            yield section, range(len(section["text"]) + 1)
+        return
 
-def _with_heading(text: str, heading: str | None) -> str:
-    if heading:
-        return f"[Avsnitt: {heading}]\n{text}"
-    return text
+    stream = iter(sections)
+    while block := list(itertools.islice(stream, _BLOCK_SIZE)):
+        # One pass over the whole block; the newline between texts holds no tokens
+        prefix = token_prefix("\n".join(s["text"] for s in block))
+        offset = 0
+        for section in block:
+            end = offset + len(section["text"])
+            yield section, prefix[offset : end + 1]
+            offset = end + 1
+
+
+def _split(
+    text: str,
+    prefix: Sequence[int],
+    budget: int,
+    overlap: int,
+) -> list[tuple[str, int]]:
+    size = int(prefix[len(text)] - prefix[0])
+    if size <= budget:
+        return [(text, size)]
 
+    spans: list[tuple[int, int]] = []
+    for start, end in _sentence_spans(text):
+        if prefix[end] - prefix[start] > budget:
+            spans.extend(m.span() for m in _WORD_RE.finditer(text, start, end))
+        else:
+            spans.append((start, end))
+    return _pack(text, spans, prefix, budget, min(overlap, budget // 2))
 
-def _split_text(text: str, chunk_size: int, overlap: int) -> list[str]:
-    words = text.split()
-    chunks = []
+
+def _sentence_spans(text: str) -> list[tuple[int, int]]:
+    # (start, end) of each gap; a sentence keeps its closing punctuation
+    gaps = [
+        (m.start() + 1, m.end())
+        for end, pattern in _GAP_RES
+        if end in text
+        for m in pattern.finditer(text)
+    ]
+    position = text.find("\n")
+    while position != -1:
+        gaps.append((position, position + 1))
+        position = text.find("\n", position + 1)
+    gaps.sort()
+
+    spans = []
     start = 0
-    while start < len(words):
-        end = start + chunk_size
-        chunk = " ".join(words[start:end])
-        chunks.append(chunk)
-        start = end - overlap
-        if start >= len(words):
-            break
-    return chunks
+    for end, next_start in gaps:
+        if text[start:end].strip():
+            spans.append((start, end))
+        start = next_start
+    if text[start:].strip():
+        spans.append((start, len(text)))
+    return spans
 
 
-def _merge_adjacent_chunks(
-    chunks: list[ChunkInfo],
-    max_size: int,
+def _pack(
+    text: str,
+    spans: list[tuple[int, int]],
+    prefix: Sequence[int],
+    budget: int,
     overlap: int,
-) -> list[ChunkInfo]:
-    """Create overlapping windows of adjacent chunks for broader context retrieval."""
-    merged: list[ChunkInfo] = []
-    paragraph_chunks = [c for c in chunks if not c.text.startswith("[")]
-
-    for i in range(0, len(paragraph_chunks) - 1):
-        combined = paragraph_chunks[i].text + "\n" + paragraph_chunks[i + 1].text
-        if len(combined) <= max_size * 2:
-            merged.append(ChunkInfo(
-                text=combined,
-                source=paragraph_chunks[i].source,
-                chunk_index=len(chunks) + len(merged),
-                section=paragraph_chunks[i].section,
-            ))
-    return merged
+) -> list[tuple[str, int]]:
+    """Greedily join consecutive spans into pieces of at most ``budget``."""
+    # Spans are ordered, so both lists are non-decreasing and
+    # spans[i:j] measures ends[j - 1] - starts[i]
+    starts = [int(prefix[s]) for s, _ in spans]
+    ends = [int(prefix[e]) for _, e in spans]
+    n = len(spans)
+    pieces: list[tuple[str, int]] = []
+    i = 0
+    while i < n:
+        # A span larger than the budget becomes a piece of its own
+        j = max(bisect_right(ends, starts[i] + budget, lo=i), i + 1)
+        pieces.append((text[spans[i][0] : spans[j - 1][1]], ends[j - 1] - starts[i]))
+        if j == n:
+            break
+
+        # The next piece repeats the trailing spans that fit in the overlap ...
+        k = bisect_left(starts, ends[j - 1] - overlap, lo=i + 1, hi=j)
+        # ... unless it would then have no room for anything new
+        if ends[j] - starts[k] > budget:
+            k = j
+        i = k
+    return pieces
@@ -6,7 +6,21 @@ class Settings(BaseSettings):
     upload_dir: str = "uploads"
     max_file_size_mb: int = 50
 
-    # Chunking defaults
+    # Background ingestion
+    ingest_workers: int = 2
+    ingest_max_concurrent_jobs: int = 2
+    ingest_batch_size: int = 256
+    ingest_job_history: int = 100
+    # Processes that parse and chunk uploads (PDF text extraction is pure
+    # Python); 0 = parse in the ingestion threads instead
+    ingest_parse_processes: int = 2
+    # Batch uploads: at most this many documents per request, zips included
+    batch_max_files: int = 200
+
+    # Chunking defaults; sizes are measured in chunk_unit: "chars" or "tokens"
+    chunk_unit: str = "chars"
+    # Also index adjacent short paragraphs as one merged chunk (more chunks to embed)
+    chunk_merge_windows: bool = False
     default_chunk_size: int = 500
     default_chunk_overlap: int = 50
 
@@ -14,21 +28,143 @@ class Settings(BaseSettings):
     embedding_provider: str = "openai"
     openai_embedding_model: str = "text-embedding-3-small"
     ollama_embedding_model: str = "nomic-embed-text"
+    # Matryoshka truncation: keep the first n dimensions of every embedding
+    # (0 = all). Only for models trained for it (text-embedding-3-*,
+    # nomic-embed-text v1.5); clear the documents after changing it
+    embedding_dimensions: int = 0
+
+    # Persistent embedding cache keyed by (provider, model, sha256(text))
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "data/embedding_cache.sqlite3"
+    embedding_cache_max_entries: int = 50_000
+
+    # Embedding request scheduling (shared by all uploads per provider)
+    embedding_max_in_flight: int = 4
+    embedding_tokens_per_minute: int = 0  # 0 = no client-side limit
+    embedding_batch_max_tokens: int = 16_000
+    embedding_batch_max_items: int = 512
+    embedding_max_retries: int = 5
+    embedding_retry_base_delay: float = 0.5
+    embedding_retry_max_delay: float = 30.0
+    # Query micro-batching: concurrent question embeddings wait up to this
+    # long (or until query_batch_max_items) and go out as one request; 0 = off
+    query_batch_wait_ms: float = 2.0
+    query_batch_max_items: int = 32
+
+    # Admission control per provider (app.admission): requests in flight for
+    # chat (embeddings: embedding_max_in_flight); interactive requests beyond
+    # that wait, at most provider_max_queue of them for provider_queue_timeout
+    # seconds, else 429 with Retry-After. Background work (ingestion
+    # embeddings, summaries) waits behind them; admission_priority=false
+    # serves everything first come, first served
+    provider_chat_max_in_flight: int = 16
+    provider_max_queue: int = 64
+    provider_queue_timeout: float = 10.0
+    admission_priority: bool = True
+    # Circuit breaker per provider: after this many consecutive failures
+    # (0 = off) requests fail fast for breaker_reset_seconds, then one is
+    # let through to test. Meanwhile chat goes to the other provider if it
+    # is configured and provider_fallback is on
+    breaker_failure_threshold: int = 5
+    breaker_reset_seconds: float = 30.0
+    provider_fallback: bool = True
 
-    # Vector store
+    # Vector store backend: "chroma" (HNSW) or "numpy" (exact, memory-mapped)
+    vector_backend: str = "chroma"
     chroma_persist_dir: str = "data/chroma"
+    # Chroma server (e.g. http://chroma:8000) instead of the embedded store;
+    # needed for chroma with more than one worker process
+    chroma_server_url: str = ""
+    numpy_index_dir: str = "data/numpy_index"
+    # NumPy backend: search a compact copy of the vectors first ("int8" is 4x,
+    # "binary" 32x smaller than float32) and rerank the best top_k × factor
+    # rows with the full vectors, which then mostly stay on disk
+    vector_quantization: str = "none"
+    quantization_rerank_factor: int = 4
+
+    # Hybrid retrieval: BM25 over exact terms fused with vector results (RRF)
+    hybrid_search: bool = True
+    hybrid_candidates: int = 20
+    hybrid_rrf_k: int = 60
+    lexical_index_path: str = "data/lexical_index.npz"
+
+    # Catalog of documents, chunk ids, ingestion jobs and corpus versions,
+    # shared by all worker processes
+    catalog_path: str = "data/catalog.sqlite3"
+
+    # Tenants, selected per request by the X-Tenant-ID header. Requests without
+    # it use "default" and the paths above; every other tenant gets its own
+    # Chroma collection and files under tenants_dir. A tenant's index opens on
+    # first use and is closed after tenant_idle_seconds unused, or earlier
+    # (least recently used first) when more than tenant_max_loaded are open
+    tenants_dir: str = "data/tenants"
+    tenant_idle_seconds: float = 600.0
+    tenant_max_loaded: int = 32
+    # /api/tenants lists every tenant id; off unless only operators can reach it
+    tenant_listing_enabled: bool = False
 
     # LLM
     openai_api_key: str = ""
+    # Optional OpenAI-compatible endpoint (proxies, local stand-ins)
+    openai_base_url: str = ""
 
     openai_model: str = "gpt-4o-mini"
     ollama_base_url: str = "http://localhost:11434"
     ollama_model: str = "gemma3"
 
+    # Provider HTTP clients (shared, keep-alive connection pools)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http_connect_timeout: float = 5.0
+    http_timeout: float = 120.0
+
     # RAG
     default_top_k: int = 5
     default_temperature: float = 0.3
 
+    # Context selection: de-duplicate and merge retrieved chunks, then send up to
+    # top_k distinct sources within this many tokens (0 = top_k chunks as they are)
+    context_token_budget: int = 1500
+    context_overfetch: int = 5
+
+    # Semantic answer cache for repeated questions
+    answer_cache_enabled: bool = True
+    answer_cache_similarity_threshold: float = 0.95
+    answer_cache_ttl_seconds: float = 3600.0
+    answer_cache_max_entries: int = 1000
+
+    # Answer "Vad betyder ORSAK X?" straight from ORSAK/FÖRKLARING (FRÅGA/SVAR)
+    # table rows, without retrieval or the LLM
+    direct_answers_enabled: bool = True
+
+    # Conversations (ChatRequest.conversation_id), stored in the catalog. The
+    # last conversation_max_turns turns go to the LLM verbatim, after the system
+    # prompt and a rolling summary of the older ones (folded in the background,
+    # at most conversation_summary_tokens); follow-ups are rewritten into
+    # standalone questions for retrieval. Idle conversations expire after the TTL
+    conversation_max_turns: int = 6
+    conversation_summary_tokens: int = 200
+    conversation_condense: bool = True
+    conversation_ttl_seconds: float = 86_400.0
+
+    # Observability: Prometheus /metrics, recent stage breakdowns at /api/traces,
+    # and a Server-Timing header on /api/chat (always, or when the client sends
+    # X-Debug-Timings: 1)
+    metrics_enabled: bool = True
+    trace_history: int = 200
+    stage_timings_header: bool = False
+
+    # Cold start (app.warmup): restore a snapshot (path or http(s) URL, see
+    # app.snapshot) into the default tenant when it has no documents, open the
+    # indexes and clients before serving, and optionally embed and search one
+    # question to connect to the embedding provider. Starting the parse processes
+    # there costs every cold start time and memory, though most see no upload
+    snapshot_url: str = ""
+    warmup_enabled: bool = True
+    warmup_question: str = ""
+    warmup_parse_pool: bool = False
+
     model_config = {"env_file": ".env", "extra": "ignore"}
 
 
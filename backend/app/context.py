@@ -0,0 +1,141 @@
+"""Post-retrieval context selection: de-duplicate, merge neighbours, fit a token budget.
+
+The chunker stores merged windows next to the paragraphs they cover, and
+long paragraphs are split into overlapping pieces, so raw search results
+repeat a lot of text. Before the LLM call the candidates are:
+
+1. de-duplicated — a chunk whose text is contained in a better-ranked one
+   is dropped, and a window that contains better-ranked chunks replaces them
+2. merged — consecutive chunks (by ``chunk_index``) of the same document and
+   section become one source, with the overlapping words removed
+3. packed — taken in rank order until ``max_sources`` distinct sources are
+   chosen or the context token budget is used up, whichever comes first
+
+Retrieval fetches a few more candidates than ``top_k`` so the sources that
+de-duplication removes are backfilled from further down the ranking.
+"""
+
+import re
+
+from app.models import SourceReference
+from app.tokens import estimate_tokens
+
+_WS_RE = re.compile(r"\s+")
+_HEADING_RE = re.compile(r"^\[Avsnitt: [^\]\n]*\]\n")
+
+
+def select_context(
+    candidates: list[SourceReference],
+    max_sources: int,
+    token_budget: int,
+    format_source=None,
+) -> list[SourceReference]:
+    """Pick the sources to send, best first.
+
+    ``format_source(i, source)`` renders one source as it appears in the
+    prompt, so the budget counts exactly what is sent. The best source is
+    always kept, even if it alone exceeds the budget.
+    """
+    sources = _merge_neighbours(_drop_contained(candidates))
+
+    selected: list[SourceReference] = []
+    used = 0
+    for source in sources:
+        if len(selected) == max_sources:
+            break
+        cost = estimate_tokens(
+            format_source(len(selected) + 1, source) if format_source else source.chunk_text
+        )
+        if selected and used + cost > token_budget:
+            # A smaller, lower-ranked source may still fit
+            continue
+        selected.append(source)
+        used += cost
+    return selected
+
+
+def _normalized(text: str) -> str:
+    return _WS_RE.sub(" ", text).strip()
+
+
+def _drop_contained(candidates: list[SourceReference]) -> list[SourceReference]:
+    kept: list[tuple[str, SourceReference]] = []
+    for source in candidates:
+        text = _normalized(source.chunk_text)
+        if any(text in other for other, _ in kept):
+            continue
+        covered = [i for i, (other, _) in enumerate(kept) if other in text]
+        if covered:
+            # A wider window covering better-ranked chunks takes the place of the best one
+            best = kept[covered[0]][1]
+            source = source.model_copy(update={"score": max(best.score, source.score)})
+            kept[covered[0]] = (text, source)
+            for i in reversed(covered[1:]):
+                del kept[i]
+        else:
+            kept.append((text, source))
+    return [source for _, source in kept]
+
+
+def _merge_neighbours(sources: list[SourceReference]) -> list[SourceReference]:
+    """Join runs of consecutive chunks; a run takes the rank of its best member."""
+    by_position = {(s.source, s.chunk_index): s for s in sources}
+    merged: list[SourceReference] = []
+    done: set[tuple[str, int]] = set()
+
+    for source in sources:
+        position = (source.source, source.chunk_index)
+        if position in done:
+            continue
+        # Walk back to the start of the run, then forward to its end
+        start = source.chunk_index
+        while _neighbour(by_position, source, start - 1):
+            start -= 1
+        run: list[SourceReference] = []
+        index = start
+        while (part := by_position.get((source.source, index))) and (
+            index == start or _neighbour(by_position, source, index)
+        ):
+            run.append(part)
+            done.add((source.source, index))
+            index += 1
+
+        if len(run) == 1:
+            merged.append(source)
+            continue
+        text = run[0].chunk_text
+        for part in run[1:]:
+            text = _join_overlapping(text, part.chunk_text)
+        merged.append(
+            run[0].model_copy(
+                update={
+                    "chunk_text": text,
+                    "score": max(p.score for p in run),
+                    "chunk_id": "+".join(p.chunk_id or str(p.chunk_index) for p in run),
+                }
+            )
+        )
+    return merged
+
+
+def _neighbour(
+    by_position: dict[tuple[str, int], SourceReference],
+    source: SourceReference,
+    index: int,
+) -> bool:
+    other = by_position.get((source.source, index))
+    return other is not None and other.section == source.section
+
+
+def _join_overlapping(first: str, second: str) -> str:
+    """Append ``second`` to ``first`` without repeating its heading or overlapping words."""
+    heading = _HEADING_RE.match(second)
+    if heading and first.startswith(heading.group(0)):
+        second = second[heading.end():]
+
+    a, b = first.split(), second.split()
+    # Longest suffix of a that is a prefix of b (split paragraphs overlap by a few words)
+    for size in range(min(len(a), len(b), 200), 0, -1):
+        if a[-size:] == b[:size]:
+            return first + " " + " ".join(b[size:]) if size < len(b) else first
+    return first + "\n" + second
@@ -0,0 +1,200 @@
+"""Server-side conversations: bounded history, rolling summary, standalone follow-ups.
+
+A conversation is the turns (question and answer) sent with the same
+``ChatRequest.conversation_id``, kept in the catalog. The LLM sees them as
+ordinary chat messages, laid out so that the prompt only grows at its end:
+
+    system prompt | summary of older turns | last turns | context + new question
+
+Everything before the new context stays byte-identical from one follow-up
+to the next until turns are folded into the summary, so a provider's
+prompt cache (OpenAI: identical prefixes of 1024+ tokens) serves it.
+Earlier turns are sent without the context they were answered from.
+
+When more than ``conversation_max_turns`` turns are unsummarized, all but
+the newest half are folded into the summary by one LLM call in the
+background, after the answer has been sent. A follow-up ("och för
+deltid?") is rewritten into a standalone question for retrieval by another
+short call; the answering LLM still sees the question as asked.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+
+from app.catalog import get_catalog
+from app.config import settings
+from app.models import Conversation, ConversationTurn
+from app.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# (messages, max_tokens) → completion; bound to the request's provider and model
+Complete = Callable[[list[dict], int], Awaitable[str]]
+
+CONDENSE_PROMPT = """Skriv om användarens följdfråga till en fristående fråga som går att förstå utan samtalet.
+Behåll alla namn, koder, belopp och datum. Svara ENBART med den omskrivna frågan.
+Om följdfrågan redan är fristående, upprepa den oförändrad."""
+
+SUMMARIZE_PROMPT = """Sammanfatta samtalet mellan användaren och assistenten på svenska, med högst {words} ord.
+Ta med vad användaren frågat om och de fakta, regler och koder som assistenten svarat med.
+Bygg vidare på den tidigare sammanfattningen om det finns en. Svara ENBART med sammanfattningen."""
+
+SUMMARY_HEADER = "SAMMANFATTNING AV TIDIGARE SAMTAL:"
+
+# Recent turns shown when rewriting a follow-up, and how much of each answer
+_CONDENSE_TURNS = 3
+_CONDENSE_ANSWER_CHARS = 400
+_CONDENSE_MAX_TOKENS = 100
+# Expired conversations are deleted at most this often per process
+_TRIM_INTERVAL = 3600.0
+
+_folding: set[tuple[str, str]] = set()
+_tasks: set[asyncio.Task] = set()
+_last_trim = 0.0
+
+
+@dataclass
+class History:
+    conversation_id: str
+    summary: str
+    summarized_turns: int
+    # (turn, question, answer) not yet folded into the summary
+    turns: list[tuple[int, str, str]]
+
+    def messages(self) -> list[dict]:
+        """Chat messages between the system prompt and the new question."""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"{SUMMARY_HEADER}\n{self.summary}"})
+        # A fold may still be running; never send more than the bound meanwhile
+        for _, question, answer in self.turns[-settings.conversation_max_turns :]:
+            messages.append({"role": "user", "content": question})
+            messages.append({"role": "assistant", "content": answer})
+        return messages
+
+
+def load_history(tenant: str, conversation_id: str) -> History:
+    summary, summarized, turns = get_catalog().load_conversation(tenant, conversation_id)
+    return History(conversation_id, summary, summarized, turns)
+
+
+def get_conversation(tenant: str, conversation_id: str) -> Conversation | None:
+    history = load_history(tenant, conversation_id)
+    if not history.summarized_turns and not history.turns:
+        return None
+    return Conversation(
+        conversation_id=conversation_id,
+        summary=history.summary,
+        summarized_turns=history.summarized_turns,
+        turns=[ConversationTurn(turn=t, question=q, answer=a) for t, q, a in history.turns],
+    )
+
+
+async def standalone_question(question: str, history: History, complete: Complete) -> str:
+    """The follow-up rewritten to stand on its own; the question itself without history."""
+    if not settings.conversation_condense or not (history.turns or history.summary):
+        return question
+
+    lines = [f"{SUMMARY_HEADER}\n{history.summary}\n"] if history.summary else []
+    for _, asked, answer in history.turns[-_CONDENSE_TURNS:]:
+        lines.append(f"Användare: {asked}")
+        lines.append(f"Assistent: {_clip(answer, _CONDENSE_ANSWER_CHARS)}")
+    messages = [
+        {"role": "system", "content": CONDENSE_PROMPT},
+        {
+            "role": "user",
+            "content": "SAMTALET HITTILLS:\n" + "\n".join(lines) + f"\n\nFÖLJDFRÅGA:\n{question}",
+        },
+    ]
+    try:
+        with span("condense_question"):
+            rewritten = await complete(messages, _CONDENSE_MAX_TOKENS)
+    except Exception:
+        # Retrieval with the question as asked beats no answer
+        logger.warning("Could not rewrite follow-up question", exc_info=True)
+        return question
+    rewritten = rewritten.strip().strip('"').strip()
+    return rewritten.splitlines()[0] if rewritten else question
+
+
+async def remember(
+    tenant: str, history: History, question: str, answer: str, complete: Complete
+) -> None:
+    """Store the turn; fold older turns into the summary in the background when due."""
+    conversation_id = history.conversation_id
+    turn = await asyncio.to_thread(
+        get_catalog().add_turn, tenant, conversation_id, question, answer
+    )
+    await _trim_expired()
+
+    key = (tenant, conversation_id)
+    if turn - history.summarized_turns > settings.conversation_max_turns and key not in _folding:
+        _folding.add(key)
+        # A fresh context: the fold outlives the request's trace
+        task = asyncio.create_task(
+            _fold(tenant, conversation_id, complete), context=contextvars.Context()
+        )
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+        task.add_done_callback(lambda _: _folding.discard(key))
+
+
+def delete_conversation(tenant: str, conversation_id: str) -> bool:
+    return get_catalog().delete_conversation(tenant, conversation_id)
+
+
+async def _fold(tenant: str, conversation_id: str, complete: Complete) -> None:
+    history = await asyncio.to_thread(load_history, tenant, conversation_id)
+    keep = max(1, settings.conversation_max_turns // 2)
+    folded = history.turns[:-keep]
+    if not folded:
+        return
+
+    transcript = "\n".join(
+        f"Användare: {question}\nAssistent: {answer}" for _, question, answer in folded
+    )
+    previous = f"TIDIGARE SAMMANFATTNING:\n{history.summary}\n\n" if history.summary else ""
+    # Roughly 4 characters per token, 6 per Swedish word
+    words = max(20, settings.conversation_summary_tokens * 2 // 3)
+    messages = [
+        {"role": "system", "content": SUMMARIZE_PROMPT.format(words=words)},
+        {"role": "user", "content": f"{previous}SAMTAL ATT SAMMANFATTA:\n{transcript}"},
+    ]
+    try:
+        with span("summarize_conversation"):
+            summary = (await complete(messages, settings.conversation_summary_tokens)).strip()
+    except Exception:
+        # The turns stay verbatim; the next answered turn tries again
+        logger.warning("Could not summarize conversation %s", conversation_id, exc_info=True)
+        return
+    if not summary:
+        return
+
+    through = folded[-1][0]
+    applied = await asyncio.to_thread(
+        get_catalog().fold_turns,
+        tenant, conversation_id, summary, history.summarized_turns, through,
+    )
+    if applied:
+        logger.info("Conversation %s: folded turns up to %d into the summary", conversation_id, through)
+
+
+async def _trim_expired() -> None:
+    global _last_trim
+    now = time.time()
+    if now - _last_trim < _TRIM_INTERVAL:
+        return
+    _last_trim = now
+    removed = await asyncio.to_thread(
+        get_catalog().trim_conversations, now - settings.conversation_ttl_seconds
+    )
+    if removed:
+        logger.info("Deleted %d expired conversations", removed)
+
+
+def _clip(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " …"
@@ -0,0 +1,219 @@
+"""Direct answers from ORSAK → FÖRKLARING (and FRÅGA → SVAR) table rows, without the LLM.
+
+While a document is chunked, every table row with a key column (ORSAK,
+FRÅGA, QUESTION, CAUSE) and an answer column (FÖRKLARING, SVAR, ANSWER,
+EXPLANATION) becomes a key → value entry (``app.answer_entries``). The entries are stored in the
+catalog with the document's chunk ids and loaded per tenant and corpus
+version into a ``DirectAnswerIndex``.
+
+A question is answered from the index only when it is a plain lookup: it
+names exactly one key (ignoring case, spaces and punctuation, or one typo
+away for keys of at least ``_FUZZY_MIN_LENGTH`` characters), and all its
+other words are lookup words ("Vad betyder …?"). Two keys, a key with
+different values in different documents, or a question that asks more
+than the meaning all go to retrieval and the LLM as before.
+"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.answer_entries import normalize_key
+from app.catalog import get_catalog
+from app.models import SearchFilters, SourceReference
+from app.telemetry import DIRECT_ANSWERS
+
+logger = logging.getLogger(__name__)
+
+# Codes like ORSAK-S01 or 12.3/b stay one word
+_WORD_RE = re.compile(r"\w+(?:[-./]\w+)*")
+
+# Words a lookup question may have besides the key
+_LOOKUP_WORDS = frozenset(
+    "vad vilken vilket betyder betyda innebär innebära står stå för menas med är "
+    "förklara förklaring förklaringen orsak orsaken orsakskod orsakskoden kod koden "
+    "en ett den det om av gäller "
+    "what does do is mean means meaning explain explanation code cause the a of for".split()
+)
+_MAX_KEY_WORDS = 8
+_MAX_QUESTION_WORDS = 40
+_FUZZY_MIN_LENGTH = 6
+_CACHE_TENANTS = 64
+
+
+@dataclass
+class DirectAnswer:
+    answer: str
+    source: SourceReference
+    fuzzy: bool
+
+
+class DirectAnswerIndex:
+    def __init__(self, rows: list[tuple[str, dict]]) -> None:
+        # normalized key → (filename, entry), in filename order
+        self._exact: dict[str, list[tuple[str, dict]]] = {}
+        # one character deleted → normalized keys (symmetric-delete fuzzy matching)
+        self._deletes: dict[str, set[str]] = {}
+        for filename, entry in rows:
+            key = normalize_key(entry["key"])
+            self._exact.setdefault(key, []).append((filename, entry))
+            if len(key) >= _FUZZY_MIN_LENGTH:
+                for variant in _deletions(key):
+                    self._deletes.setdefault(variant, set()).add(key)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._exact.values())
+
+    def lookup(self, question: str, filters: SearchFilters | None = None) -> DirectAnswer | None:
+        words = _WORD_RE.findall(question)
+        if not words or len(words) > _MAX_QUESTION_WORDS or not self._exact:
+            return None
+        if filters and filters.kinds and "table_entry" not in filters.kinds:
+            return None
+
+        matches = self._matches(words, fuzzy=False)
+        fuzzy = not matches
+        if fuzzy:
+            matches = self._matches(words, fuzzy=True)
+        keys = {key for key, _, _ in matches}
+        if len(keys) != 1:
+            DIRECT_ANSWERS.labels("ambiguous" if keys else "miss").inc()
+            return None
+
+        key = keys.pop()
+        covered = {i for _, start, end in matches for i in range(start, end)}
+        rest = [w.casefold() for i, w in enumerate(words) if i not in covered]
+        if any(word not in _LOOKUP_WORDS for word in rest):
+            DIRECT_ANSWERS.labels("not_lookup").inc()
+            return None
+
+        entries = [
+            (filename, entry) for filename, entry in self._exact[key]
+            if not filters or (
+                (not filters.sources or filename in filters.sources)
+                and (not filters.sections or entry["section"] in filters.sections)
+            )
+        ]
+        if not entries or len({" ".join(e["value"].split()) for _, e in entries}) != 1:
+            DIRECT_ANSWERS.labels("ambiguous" if entries else "miss").inc()
+            return None
+
+        DIRECT_ANSWERS.labels("fuzzy" if fuzzy else "exact").inc()
+        filename, entry = entries[0]
+        return DirectAnswer(
+            answer=_answer_text(filename, entry),
+            source=SourceReference(
+                chunk_text=(
+                    f"[{entry['key_header']}] {entry['key']}\n"
+                    f"[{entry['value_header']}] {entry['value']}"
+                ),
+                source=filename,
+                section=entry["section"],
+                score=0.9 if fuzzy else 1.0,
+                chunk_index=entry["chunk_index"],
+            ),
+            fuzzy=fuzzy,
+        )
+
+    def _matches(self, words: list[str], fuzzy: bool) -> list[tuple[str, int, int]]:
+        """(normalized key, first word, end word) of the longest non-overlapping matches."""
+        matches: list[tuple[str, int, int]] = []
+        taken: set[int] = set()
+        for n in range(min(_MAX_KEY_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - n + 1):
+                span = range(start, start + n)
+                if taken.intersection(span):
+                    continue
+                text = normalize_key("".join(words[start : start + n]))
+                key = self._fuzzy(text) if fuzzy else (text if text in self._exact else None)
+                if key:
+                    matches.append((key, start, start + n))
+                    taken.update(span)
+        # The whole question can be a FRÅGA key longer than _MAX_KEY_WORDS
+        whole = normalize_key(" ".join(words))
+        if not matches and not fuzzy and whole in self._exact:
+            matches.append((whole, 0, len(words)))
+        return matches
+
+    def _fuzzy(self, text: str) -> str | None:
+        """The one key within one edit of ``text``, if exactly one is."""
+        if len(text) < _FUZZY_MIN_LENGTH:
+            return None
+        candidates = set(self._deletes.get(text, ()))
+        for variant in _deletions(text):
+            if variant in self._exact:
+                candidates.add(variant)
+            candidates.update(self._deletes.get(variant, ()))
+        found = {key for key in candidates if _within_one_edit(text, key)}
+        return found.pop() if len(found) == 1 else None
+
+
+def _deletions(text: str) -> set[str]:
+    return {text[:i] + text[i + 1 :] for i in range(len(text))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """Levenshtein distance ≤ 1, or one swap of adjacent characters."""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        return len(diff) == 1 or (
+            len(diff) == 2 and diff[1] == diff[0] + 1
+            and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+        )
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    i = next((i for i in range(len(shorter)) if shorter[i] != longer[i]), len(shorter))
+    return shorter[i:] == longer[i + 1 :]
+
+
+def _answer_text(filename: str, entry: dict) -> str:
+    section = f", avsnitt {entry['section']}" if entry["section"] else ""
+    return f"{entry['key']}\n{entry['value']}\n\n(Källa: {filename}{section})"
+
+
+_indexes: OrderedDict[str, tuple[int, DirectAnswerIndex]] = OrderedDict()
+_indexes_lock = threading.Lock()
+# One build at a time: requests arriving meanwhile wait for it rather than build again
+_build_lock = threading.Lock()
+
+
+def get_index(tenant: str) -> DirectAnswerIndex:
+    """The tenant's index at the catalog's current corpus version (blocking: run in a thread)."""
+    catalog = get_catalog()
+    version = catalog.corpus_version(tenant)
+    index = _cached(tenant, version)
+    if index is not None:
+        return index
+
+    with _build_lock:
+        index = _cached(tenant, version)
+        if index is not None:
+            return index
+        index = DirectAnswerIndex(catalog.list_answers(tenant))
+        with _indexes_lock:
+            _indexes[tenant] = (version, index)
+            _indexes.move_to_end(tenant)
+            while len(_indexes) > _CACHE_TENANTS:
+                _indexes.popitem(last=False)
+    logger.info("Direct answers of %s: %d entries at version %d", tenant, len(index), version)
+    return index
+
+
+def _cached(tenant: str, version: int) -> DirectAnswerIndex | None:
+    with _indexes_lock:
+        cached = _indexes.get(tenant)
+        if cached and cached[0] == version:
+            _indexes.move_to_end(tenant)
+            return cached[1]
+    return None
+
+
+def find_direct_answer(
+    question: str, tenant: str, filters: SearchFilters | None = None
+) -> DirectAnswer | None:
+    return get_index(tenant).lookup(question, filters)
@@ -1,9 +1,15 @@
-"""DOCX document parser — extracts body text and table cells (ORSAK/FÖRKLARING)."""
+"""DOCX document parser — extracts body text and table cells (ORSAK/FÖRKLARING).
+
+The section stream it yields is what every parser in ``app.parsers``
+produces; ``TableState`` pairs table cells with their headers for all of them.
+"""
 
 import re
+import zipfile
+from collections.abc import Iterator
 from dataclasses import dataclass, field
 
-from docx import Document
+from lxml import etree
 
 
 @dataclass
@@ -35,69 +41,197 @@ class ParsedDocument:
 
 
 def parse_docx(file_path: str, filename: str) -> ParsedDocument:
-    doc = Document(file_path)
     parsed = ParsedDocument(filename=filename)
 
-    # Extract paragraphs with heading detection
-    current_heading = None
-    for para in doc.paragraphs:
-        text = para.text.strip()
-        if not text:
-            continue
+    for section in iter_docx_sections(file_path):
+        parsed.sections.append(section)
+        if section["type"] == "paragraph":
+            parsed.paragraphs.append(section["text"])
+        elif section["type"] == "table_entry":
+            parsed.tables.append(TableEntry(
+                header=section["header"],
+                content=section["text"],
+                row_index=section["row_index"],
+                table_index=section["table_index"],
+            ))
+
+    return parsed
+
+
+def iter_docx_sections(file_path: str) -> Iterator[dict]:
+    """Stream headings, paragraphs and table entries in document order.
+
+    Reads ``word/document.xml`` with ``iterparse`` and discards each body
+    element once handled, so memory stays flat however large the document is.
+    Table entries carry the heading in effect at the table's real position.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        heading_styles = _heading_style_ids(archive)
+
+        with archive.open("word/document.xml") as xml:
+            current_heading = None
+            table_index = 0
+            table: TableState | None = None
+            depth = 0
+
+            for event, elem in etree.iterparse(xml, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if depth == 3 and elem.tag == _TBL:
+                        table = TableState(table_index)
+                    continue
+                depth -= 1
+
+                # Rows of a top-level table: handle and drop them one at a time
+                if depth == 3 and elem.tag == _TR and table is not None:
+                    yield from table.add_row(elem, current_heading)
+                    _discard(elem)
+                    continue
+
+                if depth != 2:
+                    continue
+
+                if elem.tag == _P:
+                    text = _paragraph_text(elem).strip()
+                    if text:
+                        if _paragraph_style(elem) in heading_styles:
+                            current_heading = text
+                            yield {"type": "heading", "text": text, "heading": current_heading}
+                        else:
+                            yield {"type": "paragraph", "text": text, "heading": current_heading}
+                elif elem.tag == _TBL:
+                    table = None
+                    table_index += 1
+                _discard(elem)
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_P, _R, _T, _TBL, _TR, _TC = (f"{_W}{t}" for t in ("p", "r", "t", "tbl", "tr", "tc"))
+_RUN_TEXT = {
+    f"{_W}tab": "\t",
+    f"{_W}ptab": "\t",
+    f"{_W}cr": "\n",
+    f"{_W}noBreakHyphen": "-",
+}
+
+
+class TableState:
+    """Header row and vertical-merge bookkeeping for the table being streamed."""
+
+    def __init__(self, table_index: int) -> None:
+        self.table_index = table_index
+        self.row_index = 0
+        self.headers: list[str] = []
+        self.previous_row: list[str] = []
+
+    def add_row(self, tr: etree._Element, current_heading: str | None) -> Iterator[dict]:
+        yield from self.add_cells(_row_cells(tr, self.previous_row), current_heading)
 
-        if para.style and para.style.name.startswith("Heading"):
-            current_heading = text
-            parsed.sections.append({"type": "heading", "text": text, "heading": current_heading})
+    def add_cells(self, cells: list[str], current_heading: str | None) -> Iterator[dict]:
+        """Table entries of one row; the first row is the header if it looks like one."""
+        self.previous_row = cells
+        r_idx = self.row_index
+        self.row_index += 1
+
+        if r_idx == 0:
+            self.headers = [c.upper() for c in cells]
+            if _is_header_row(self.headers):
+                return
+
+        # Try to pair cells as key-value (ORSAK->FÖRKLARING, Fråga->Svar, etc.)
+        paired = _pair_cells(self.headers, cells, self.table_index, r_idx)
+        if paired:
+            entries = paired
         else:
-            parsed.paragraphs.append(text)
-            parsed.sections.append({
-                "type": "paragraph",
-                "text": text,
+            # Fallback: concatenate all non-empty cells
+            combined = " | ".join(c for c in cells if c)
+            if not combined:
+                return
+            entries = [TableEntry(
+                header="Tabell",
+                content=combined,
+                row_index=r_idx,
+                table_index=self.table_index,
+            )]
+
+        for entry in entries:
+            yield {
+                "type": "table_entry",
+                "text": entry.content,
+                "header": entry.header,
                 "heading": current_heading,
-            })
-
-    # Extract tables — look for ORSAK/FÖRKLARING patterns and general Q&A
-    for t_idx, table in enumerate(doc.tables):
-        headers = []
-        if table.rows:
-            headers = [cell.text.strip().upper() for cell in table.rows[0].cells]
-
-        for r_idx, row in enumerate(table.rows):
-            if r_idx == 0 and _is_header_row(headers):
-                continue
-
-            cells = [cell.text.strip() for cell in row.cells]
-
-            # Try to pair cells as key-value (ORSAK->FÖRKLARING, Fråga->Svar, etc.)
-            paired = _pair_cells(headers, cells, t_idx, r_idx)
-            if paired:
-                for entry in paired:
-                    parsed.tables.append(entry)
-                    parsed.sections.append({
-                        "type": "table_entry",
-                        "text": entry.content,
-                        "header": entry.header,
-                        "heading": current_heading,
-                    })
-            else:
-                # Fallback: concatenate all non-empty cells
-                combined = " | ".join(c for c in cells if c)
-                if combined:
-                    entry = TableEntry(
-                        header="Tabell",
-                        content=combined,
-                        row_index=r_idx,
-                        table_index=t_idx,
-                    )
-                    parsed.tables.append(entry)
-                    parsed.sections.append({
-                        "type": "table_entry",
-                        "text": combined,
-                        "header": "Tabell",
-                        "heading": current_heading,
-                    })
+                "table_index": entry.table_index,
+                "row_index": entry.row_index,
+            }
 
-    return parsed
+
+def _heading_style_ids(archive: zipfile.ZipFile) -> set[str]:
+    """Style ids whose name starts with "Heading" (python-docx's heading test)."""
+    try:
+        root = etree.fromstring(archive.read("word/styles.xml"))
+    except KeyError:
+        return set()
+    ids = set()
+    for style in root.iter(f"{_W}style"):
+        name = style.find(f"{_W}name")
+        if name is not None and name.get(f"{_W}val", "").lower().startswith("heading"):
+            ids.add(style.get(f"{_W}styleId"))
+    return ids
+
+
+def _paragraph_style(p: etree._Element) -> str | None:
+    style = p.find(f"{_W}pPr/{_W}pStyle")
+    return style.get(f"{_W}val") if style is not None else None
+
+
+def _paragraph_text(p: etree._Element) -> str:
+    # Same rules as python-docx: runs and hyperlinked runs, tabs/breaks as text
+    parts = []
+    for run in p.iterchildren(_R, f"{_W}hyperlink"):
+        for r in (run,) if run.tag == _R else run.iterchildren(_R):
+            for child in r:
+                if child.tag == _T:
+                    parts.append(child.text or "")
+                elif child.tag == f"{_W}br":
+                    if child.get(f"{_W}type", "textWrapping") == "textWrapping":
+                        parts.append("\n")
+                elif child.tag in _RUN_TEXT:
+                    parts.append(_RUN_TEXT[child.tag])
+    return "".join(parts)
+
+
+def _row_cells(tr: etree._Element, previous_row: list[str]) -> list[str]:
+    """Cell texts per grid column, like python-docx ``row.cells``.
+
+    Horizontally merged cells repeat across their span; vertically merged
+    continuation cells repeat the text of the cell above.
+    """
+    cells: list[str] = []
+    for tc in tr.iterchildren(_TC):
+        tc_pr = tc.find(f"{_W}tcPr")
+        span, continued = 1, False
+        if tc_pr is not None:
+            grid_span = tc_pr.find(f"{_W}gridSpan")
+            if grid_span is not None:
+                span = int(grid_span.get(f"{_W}val", "1"))
+            v_merge = tc_pr.find(f"{_W}vMerge")
+            continued = v_merge is not None and v_merge.get(f"{_W}val", "continue") == "continue"
+
+        col = len(cells)
+        if continued and col < len(previous_row):
+            text = previous_row[col]
+        else:
+            text = "\n".join(_paragraph_text(p) for p in tc.iterchildren(_P)).strip()
+        cells.extend([text] * span)
+    return cells
+
+
+def _discard(elem: etree._Element) -> None:
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
 
 
 _QA_PATTERNS = re.compile(
@@ -0,0 +1,171 @@
+"""Persistent, content-addressed embedding cache.
+
+Vectors are keyed by (provider, model, sha256(text)) and stored as packed
+float32 in SQLite, so re-uploading an unchanged document or asking a common
+question again costs no embedding API call. The least recently used entries
+are evicted once the cache grows past ``embedding_cache_max_entries``;
+a hit refreshes an entry's recency at most once an hour, so most lookups
+only read.
+
+The database is shared by every worker process; the entry count is read
+from it when deciding to evict, not kept per process.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_BATCH = 500
+
+# A hit refreshes an entry's last_used at most this often: eviction only needs
+# rough recency, and a lookup that writes contends with every other worker
+_TOUCH_AFTER_SECONDS = 3600.0
+
+
+class EmbeddingCache:
+    def __init__(self, path: str, max_entries: int) -> None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Other workers may hold the write lock for a moment; wait rather than fail
+        self._conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                text_hash BLOB NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (provider, model, text_hash)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, provider: str, model: str, texts: list[str]) -> list[list[float] | None]:
+        hashes = [_hash(t) for t in texts]
+        found: dict[bytes, bytes] = {}
+        stale: list[bytes] = []
+        now = time.time()
+
+        with self._lock:
+            unique = list(dict.fromkeys(hashes))
+            for i in range(0, len(unique), _QUERY_BATCH):
+                batch = unique[i : i + _QUERY_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector, last_used FROM embeddings "
+                    f"WHERE provider = ? AND model = ? AND text_hash IN ({marks})",
+                    [provider, model, *batch],
+                ).fetchall()
+                for text_hash, vector, last_used in rows:
+                    found[text_hash] = vector
+                    if now - last_used > _TOUCH_AFTER_SECONDS:
+                        stale.append(text_hash)
+            if stale:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? "
+                    "WHERE provider = ? AND model = ? AND text_hash = ?",
+                    [(now, provider, model, h) for h in stale],
+                )
+                self._conn.commit()
+
+            results = [_unpack(found[h]) if h in found else None for h in hashes]
+            hit_count = sum(1 for r in results if r is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def put_many(
+        self,
+        provider: str,
+        model: str,
+        texts: list[str],
+        vectors: list[list[float]],
+    ) -> None:
+        now = time.time()
+        rows = [(provider, model, _hash(t), _pack(v), now) for t, v in zip(texts, vectors)]
+
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (provider, model, text_hash, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            if cursor.rowcount > 0:
+                # Counted in the database: other workers insert too
+                entries = self._count()
+                if entries > self.max_entries:
+                    self._evict(entries - self.max_entries)
+            self._conn.commit()
+
+    def _evict(self, count: int) -> None:
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE (provider, model, text_hash) IN ("
+            "SELECT provider, model, text_hash FROM embeddings ORDER BY last_used LIMIT ?)",
+            (count,),
+        )
+        logger.info("Evicted %d least recently used embeddings from cache", count)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self._count()
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def _pack(vector: list[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _unpack(blob: bytes) -> list[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+_cache: EmbeddingCache | None = None
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    global _cache
+    if not settings.embedding_cache_enabled:
+        return None
+    if _cache is None:
+        _cache = EmbeddingCache(settings.embedding_cache_path, settings.embedding_cache_max_entries)
+    return _cache
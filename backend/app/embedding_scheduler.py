@@ -0,0 +1,212 @@
+"""Concurrent, rate-limit-aware batching for embedding requests.
+
+Texts are split into batches by estimated token count (not by item count),
+sent concurrently within the provider's admission gate (``app.admission``:
+``embedding_max_in_flight``, question embeddings ahead of ingestion) and an
+optional tokens-per-minute budget, and retried with exponential backoff on
+429 and 5xx responses. A ``Retry-After`` from the provider pauses every
+batch of that provider, not just the one that was rejected. Output order
+always matches input order.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections.abc import Awaitable, Callable
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from app.admission import Overloaded, Priority, ProviderGate, ProviderUnavailable
+from app.providers import loaded_openai
+from app.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SendBatch = Callable[[list[str]], Awaitable[list[list[float]]]]
+
+
+def split_batches(
+    texts: list[str],
+    max_tokens: int,
+    max_items: int,
+) -> list[tuple[int, int, int]]:
+    """Consecutive ``(start, end, tokens)`` ranges within both budgets.
+
+    A single text larger than ``max_tokens`` gets a batch of its own.
+    """
+    batches: list[tuple[int, int, int]] = []
+    start = 0
+    tokens = 0
+    for i, text in enumerate(texts):
+        n = estimate_tokens(text)
+        if i > start and (tokens + n > max_tokens or i - start >= max_items):
+            batches.append((start, i, tokens))
+            start, tokens = i, 0
+        tokens += n
+    if start < len(texts):
+        batches.append((start, len(texts), tokens))
+    return batches
+
+
+class TokenRateLimiter:
+    """Token bucket refilled continuously at ``tokens_per_minute``."""
+
+    def __init__(self, tokens_per_minute: int) -> None:
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self._available = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int) -> None:
+        # Oversized requests wait for a full bucket rather than forever
+        tokens = min(float(tokens), self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._available = min(
+                    self.capacity, self._available + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._available >= tokens:
+                    self._available -= tokens
+                    return
+                await asyncio.sleep((tokens - self._available) / self.rate)
+
+
+class EmbeddingScheduler:
+    """Shared by every embedding call for one provider, so limits hold across uploads."""
+
+    def __init__(
+        self,
+        send: SendBatch,
+        gate: ProviderGate,
+        tokens_per_minute: int,
+        batch_max_tokens: int,
+        batch_max_items: int,
+        max_retries: int,
+        retry_base_delay: float,
+        retry_max_delay: float,
+    ) -> None:
+        self.loop = asyncio.get_running_loop()
+        self._send = send
+        self._gate = gate
+        self._limiter = TokenRateLimiter(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._batch_max_tokens = batch_max_tokens
+        self._batch_max_items = batch_max_items
+        self._max_retries = max_retries
+        self._retry_base_delay = retry_base_delay
+        self._retry_max_delay = retry_max_delay
+        # Monotonic deadline set by Retry-After; no batch is sent before it
+        self._paused_until = 0.0
+        self.retries = 0
+
+    async def embed(
+        self, texts: list[str], priority: Priority = Priority.INTERACTIVE
+    ) -> list[list[float]]:
+        if not texts:
+            return []
+        batches = split_batches(texts, self._batch_max_tokens, self._batch_max_items)
+        results = await asyncio.gather(
+            *(
+                self._run_batch(texts[start:end], tokens, priority)
+                for start, end, tokens in batches
+            )
+        )
+        # gather preserves order, and every batch is a consecutive range
+        return [vector for batch in results for vector in batch]
+
+    async def _run_batch(
+        self, batch: list[str], tokens: int, priority: Priority
+    ) -> list[list[float]]:
+        attempt = 0
+        # Charged once: rejected attempts don't count against the provider's quota
+        if self._limiter is not None:
+            await self._limiter.acquire(tokens)
+        while True:
+            # Waited out before taking a slot, so a paused batch doesn't hold one
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            try:
+                # A slot per attempt: backoff sleeps don't hold one either
+                async with self._gate.slot(priority):
+                    vectors = await self._send(batch)
+                break
+            except (Overloaded, ProviderUnavailable) as e:
+                # A question can't wait out an open circuit; ingestion can
+                if priority == Priority.INTERACTIVE or attempt >= self._max_retries:
+                    raise
+                delay = max(e.retry_after, self._backoff(attempt))
+                reason = _describe(e)
+            except Exception as e:
+                retry_after = _retry_after(e)
+                if retry_after is None or attempt >= self._max_retries:
+                    raise
+                delay = max(retry_after, self._backoff(attempt))
+                if retry_after:
+                    self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+                reason = _describe(e)
+            attempt += 1
+            self.retries += 1
+            logger.warning(
+                "Embedding batch of %d failed (%s), retry %d/%d in %.2f s",
+                len(batch), reason, attempt, self._max_retries, delay,
+            )
+            await asyncio.sleep(delay)
+
+        if len(vectors) != len(batch):
+            raise ValueError(
+                f"Embedding provider returned {len(vectors)} vectors for {len(batch)} texts"
+            )
+        return vectors
+
+    def _backoff(self, attempt: int) -> float:
+        # Exponential with jitter so concurrent batches don't retry in lockstep
+        delay = min(self._retry_max_delay, self._retry_base_delay * 2**attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+
+def _retry_after(exc: Exception) -> float | None:
+    """Seconds the provider asked us to wait (0.0 if unspecified), or None if not retryable."""
+    openai = loaded_openai()
+    if isinstance(exc, httpx.HTTPStatusError):
+        response = exc.response
+    elif openai is not None and isinstance(exc, openai.APIStatusError):
+        response = exc.response
+    elif isinstance(exc, httpx.TransportError) or (
+        openai is not None and isinstance(exc, openai.APIConnectionError)
+    ):
+        return 0.0
+    else:
+        return None
+
+    if response.status_code != 429 and response.status_code < 500:
+        return None
+    return _parse_retry_after(response.headers.get("retry-after"))
+
+
+def _describe(exc: Exception) -> str:
+    openai = loaded_openai()
+    if isinstance(exc, httpx.HTTPStatusError) or (
+        openai is not None and isinstance(exc, openai.APIStatusError)
+    ):
+        return f"HTTP {exc.response.status_code}"
+    if isinstance(exc, ProviderUnavailable):
+        return "circuit open"
+    return type(exc).__name__
+
+
+def _parse_retry_after(value: str | None) -> float:
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
@@ -1,68 +1,248 @@
-"""Embedding service using OpenAI or Ollama embedding APIs."""
+"""Embedding service using OpenAI or Ollama embedding APIs.
 
-import logging
+Question embeddings that miss the cache go through a ``QueryBatcher``:
+questions arriving within ``query_batch_wait_ms`` of each other are sent
+as one request instead of one request each.
+"""
 
-import httpx
-from openai import OpenAI
+import asyncio
+import logging
+import math
+import time
+from collections.abc import Awaitable, Callable
 
+from app.admission import Priority, get_gate
 from app.config import settings
+from app.embedding_cache import get_embedding_cache
+from app.embedding_scheduler import EmbeddingScheduler, SendBatch
+from app.providers import get_clients
+from app.telemetry import QUERY_BATCH_SIZE, QUERY_BATCH_WAIT, provider_call, record_usage, span
 
 logger = logging.getLogger(__name__)
 
 # Cache the current provider so we can detect switches
 _current_provider: str | None = None
 
+_schedulers: dict[str, EmbeddingScheduler] = {}
+_batchers: dict[str, "QueryBatcher"] = {}
+
 
 def _get_provider() -> str:
     return settings.embedding_provider
 
 
-def embed_texts(texts: list[str], provider: str | None = None) -> list[list[float]]:
-    provider = provider or _get_provider()
+def _get_model(provider: str) -> str:
     if provider == "openai":
-        return _openai_embed(texts)
+        return settings.openai_embedding_model
     elif provider == "ollama":
-        return _ollama_embed(texts)
+        return settings.ollama_embedding_model
     else:
         raise ValueError(f"Unknown embedding provider: {provider}")
 
 
-def embed_query(query: str, provider: str | None = None) -> list[float]:
-    return embed_texts([query], provider=provider)[0]
+async def embed_texts(
+    texts: list[str],
+    provider: str | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+) -> list[list[float]]:
+    """Embeddings of ``texts``; ingestion passes ``Priority.BACKGROUND`` so questions go first."""
+    provider = provider or _get_provider()
+    model = _get_model(provider)
+
+    cache = get_embedding_cache()
+    if cache is None:
+        return _truncated(await _embed_uncached(texts, provider, priority))
+
+    with span("embedding_cache"):
+        embeddings = await asyncio.to_thread(cache.get_many, provider, model, texts)
+    missing = [i for i, e in enumerate(embeddings) if e is None]
+    if missing:
+        # Identical texts within one call are embedded once
+        unique = list(dict.fromkeys(texts[i] for i in missing))
+        fresh = await _embed_uncached(unique, provider, priority)
+        with span("embedding_cache"):
+            await asyncio.to_thread(cache.put_many, provider, model, unique, fresh)
+        by_text = dict(zip(unique, fresh))
+        for i in missing:
+            embeddings[i] = by_text[texts[i]]
+    else:
+        logger.info("All %d embeddings served from cache", len(texts))
+
+    return _truncated(embeddings)
+
+
+def _truncated(embeddings: list[list[float]]) -> list[list[float]]:
+    """Keep the first ``embedding_dimensions`` of each vector, renormalized to unit length.
 
+    Applied after the cache, so the cache keeps full vectors and changing
+    the setting needs no re-embedding.
+    """
+    dims = settings.embedding_dimensions
+    if not dims or not embeddings or len(embeddings[0]) <= dims:
+        return embeddings
+    truncated = []
+    for embedding in embeddings:
+        head = embedding[:dims]
+        norm = math.sqrt(sum(v * v for v in head)) or 1.0
+        truncated.append([v / norm for v in head])
+    return truncated
 
-def _openai_embed(texts: list[str]) -> list[list[float]]:
-    if not settings.openai_api_key:
+
+async def _embed_uncached(
+    texts: list[str], provider: str, priority: Priority
+) -> list[list[float]]:
+    if provider == "openai" and not settings.openai_api_key:
         raise ValueError(
             "OpenAI API-nyckel saknas. Ange OPENAI_API_KEY i .env eller välj Ollama."
         )
+    logger.info("Embedding %d texts with %s %s", len(texts), provider, _get_model(provider))
+    return await _get_scheduler(provider).embed(texts, priority)
+
+
+def _get_scheduler(provider: str) -> EmbeddingScheduler:
+    scheduler = _schedulers.get(provider)
+    # Its gate is bound to the loop that created it (see get_clients)
+    if scheduler is None or scheduler.loop is not asyncio.get_running_loop():
+        send: SendBatch = _openai_embed if provider == "openai" else _ollama_embed
+        scheduler = EmbeddingScheduler(
+            send,
+            gate=get_gate(provider, "embed"),
+            tokens_per_minute=settings.embedding_tokens_per_minute,
+            batch_max_tokens=settings.embedding_batch_max_tokens,
+            batch_max_items=settings.embedding_batch_max_items,
+            max_retries=settings.embedding_max_retries,
+            retry_base_delay=settings.embedding_retry_base_delay,
+            retry_max_delay=settings.embedding_retry_max_delay,
+        )
+        _schedulers[provider] = scheduler
+    return scheduler
 
-    client = OpenAI(api_key=settings.openai_api_key)
-    model = settings.openai_embedding_model
-    logger.info("Embedding %d texts with OpenAI %s", len(texts), model)
-
-    # OpenAI allows batches up to 2048 inputs
-    all_embeddings: list[list[float]] = []
-    batch_size = 512
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i : i + batch_size]
-        response = client.embeddings.create(model=model, input=batch)
-        # Sort by index to maintain order
-        sorted_data = sorted(response.data, key=lambda x: x.index)
-        all_embeddings.extend([d.embedding for d in sorted_data])
 
-    return all_embeddings
+async def embed_query(query: str, provider: str | None = None) -> list[float]:
+    provider = provider or _get_provider()
+    if settings.query_batch_wait_ms <= 0:
+        return (await embed_texts([query], provider=provider))[0]
+
+    # Cache hits need no batch to wait for
+    cache = get_embedding_cache()
+    if cache is not None:
+        with span("embedding_cache"):
+            hit = await asyncio.to_thread(cache.get_many, provider, _get_model(provider), [query])
+        if hit[0] is not None:
+            return _truncated(hit)[0]
+    return _truncated([await _get_batcher(provider).embed(query)])[0]
+
+
+def _get_batcher(provider: str) -> "QueryBatcher":
+    batcher = _batchers.get(provider)
+    if batcher is None or batcher.loop is not asyncio.get_running_loop():
+
+        async def send(texts: list[str]) -> list[list[float]]:
+            # Every text already missed the cache in embed_query; don't look it up again
+            fresh = await _embed_uncached(texts, provider, Priority.INTERACTIVE)
+            cache = get_embedding_cache()
+            if cache is not None:
+                with span("embedding_cache"):
+                    await asyncio.to_thread(
+                        cache.put_many, provider, _get_model(provider), texts, fresh
+                    )
+            return fresh
+
+        batcher = QueryBatcher(
+            send,
+            max_wait=settings.query_batch_wait_ms / 1000,
+            max_items=settings.query_batch_max_items,
+        )
+        _batchers[provider] = batcher
+    return batcher
+
+
+class QueryBatcher:
+    """Collects single texts for up to ``max_wait`` seconds and embeds them in one call.
+
+    The first text of a batch starts the timer; the batch goes out when it
+    fires or when ``max_items`` texts are waiting. Every caller gets its own
+    vector, or the exception of the batch's request.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[list[str]], Awaitable[list[list[float]]]],
+        max_wait: float,
+        max_items: int,
+    ) -> None:
+        self.loop = asyncio.get_running_loop()
+        self._send = send
+        self._max_wait = max_wait
+        self._max_items = max(1, max_items)
+        self._pending: list[tuple[str, asyncio.Future, float]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> list[float]:
+        future = self.loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        if len(self._pending) >= self._max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = self.loop.call_later(self._max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = self.loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future, float]]) -> None:
+        now = time.perf_counter()
+        for _, _, queued in batch:
+            QUERY_BATCH_WAIT.observe(now - queued)
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        QUERY_BATCH_SIZE.observe(len(texts))
+        try:
+            vectors = await self._send(texts)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        by_text = dict(zip(texts, vectors))
+        for text, future, _ in batch:
+            # A caller that gave up (cancelled) no longer takes a result
+            if not future.done():
+                future.set_result(by_text[text])
+
+
+async def _openai_embed(batch: list[str]) -> list[list[float]]:
+    # Retries are handled by the scheduler, which also honours Retry-After
+    client = get_clients().openai.with_options(max_retries=0)
+    with provider_call("openai", "embed"):
+        response = await client.embeddings.create(
+            model=settings.openai_embedding_model, input=batch
+        )
+    if response.usage:
+        record_usage("openai", "embed", response.usage.prompt_tokens)
+    # Sort by index to maintain order
+    return [d.embedding for d in sorted(response.data, key=lambda x: x.index)]
 
 
-def _ollama_embed(texts: list[str]) -> list[list[float]]:
-    model = settings.ollama_embedding_model
+async def _ollama_embed(batch: list[str]) -> list[list[float]]:
     url = f"{settings.ollama_base_url}/api/embed"
-    logger.info("Embedding %d texts with Ollama %s", len(texts), model)
-
     # Ollama /api/embed supports batch input
-    with httpx.Client(timeout=120.0) as client:
-        response = client.post(url, json={"model": model, "input": texts})
+    with provider_call("ollama", "embed"):
+        response = await get_clients().ollama.post(
+            url, json={"model": settings.ollama_embedding_model, "input": batch}
+        )
         response.raise_for_status()
-        data = response.json()
-
+    data = response.json()
+    record_usage("ollama", "embed", data.get("prompt_eval_count"))
     return data["embeddings"]
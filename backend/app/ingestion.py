@@ -0,0 +1,367 @@
+"""Background document ingestion — parse, chunk, embed and store outside the request.
+
+``/api/upload`` only spools the file to disk and submits a job; the work
+runs as an asyncio task, and at most ``ingest_max_concurrent_jobs``
+documents are processed at once. Parsing and chunking run in a process
+pool (``ingest_parse_processes``), so CPU-bound parsers do not hold the
+server's GIL, and write the chunks to a spool file that embedding and
+storing then read a batch at a time in a thread pool. With no parse
+processes, parse → chunk is one streaming pipeline pulled by those threads.
+Clients poll the job for its current stage and chunk counts.
+
+Jobs and documents are recorded in the catalog at every stage change, so
+any worker process can answer a poll; the records are written in order on
+one thread, so a database busy with another worker's write never stalls
+the event loop. A file identical to the document's
+ready version (same content hash and chunking settings) is not re-parsed.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import uuid
+from typing import Any
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.catalog import get_catalog
+from app.chunking import iter_chunks
+from app.config import settings
+from app.answer_entries import AnswerCollector
+from app.models import DocumentInfo, IndexResult, IngestionJob
+from app.parsers import (
+    SectionStats,
+    file_type,
+    iter_sections,
+    iter_spool,
+    parse_to_spool,
+    warm_worker,
+)
+from app.telemetry import PARSE_BYTES, PARSE_SECONDS, trace
+from app.vectorstore import DEFAULT_TENANT, METADATA_VERSION, add_chunks
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("done", "failed")
+
+_jobs: OrderedDict[str, IngestionJob] = OrderedDict()
+_tasks: set[asyncio.Task] = set()
+_executor: ThreadPoolExecutor | None = None
+_parse_pool: ProcessPoolExecutor | None = None
+_writer: ThreadPoolExecutor | None = None
+_slots: asyncio.Semaphore | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ingest_workers, thread_name_prefix="ingest"
+        )
+    return _executor
+
+
+def _get_writer() -> ThreadPoolExecutor:
+    global _writer
+    if _writer is None:
+        # One thread, so job records are written in the order their stages changed
+        _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-writer")
+    return _writer
+
+
+def _write(fn: Callable[..., None], *args: Any) -> None:
+    """Run a catalog write on the writer thread; the event loop never waits on a busy database."""
+
+    def run() -> None:
+        try:
+            fn(*args)
+        except Exception:
+            logger.exception("Catalog write %s failed", fn.__name__)
+
+    _get_writer().submit(run)
+
+
+def _save(job: IngestionJob) -> None:
+    # A copy: the job keeps changing while the write waits
+    _write(get_catalog().save_job, job.model_copy(deep=True))
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _parse_pool
+    if _parse_pool is None:
+        # spawn: a forked child would inherit the event loop, open indexes and locks
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=settings.ingest_parse_processes,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _parse_pool
+
+
+async def start_parse_pool() -> None:
+    """Spawn the parse processes now; otherwise the first upload waits for their start-up."""
+    if settings.ingest_parse_processes <= 0:
+        return
+    loop = asyncio.get_running_loop()
+    pool = _get_parse_pool()
+    # Submitted together, so each lands on a process of its own
+    await asyncio.gather(
+        *(loop.run_in_executor(pool, warm_worker) for _ in range(settings.ingest_parse_processes))
+    )
+
+
+def _get_slots() -> asyncio.Semaphore:
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(settings.ingest_max_concurrent_jobs)
+    return _slots
+
+
+def submit_job(
+    file_path: str,
+    filename: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    tenant: str = DEFAULT_TENANT,
+    content_hash: str | None = None,
+) -> IngestionJob:
+    job = IngestionJob(
+        job_id=uuid.uuid4().hex, filename=filename, tenant=tenant, created_at=time.time()
+    )
+    _jobs[job.job_id] = job
+    _save(job)
+    _trim_history()
+
+    task = asyncio.create_task(_run(job, file_path, chunk_size, chunk_overlap, content_hash))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return job
+
+
+def get_job(job_id: str) -> IngestionJob | None:
+    # Jobs running here are fresher than their last saved stage
+    return _jobs.get(job_id) or get_catalog().get_job(job_id)
+
+
+def list_jobs(tenant: str = DEFAULT_TENANT) -> list[IngestionJob]:
+    saved = get_catalog().list_jobs(tenant, settings.ingest_job_history)
+    return [_jobs.get(job.job_id, job) for job in saved]
+
+
+async def shutdown_jobs() -> None:
+    global _executor, _parse_pool, _writer, _slots
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+    if _writer is not None:
+        # Waits for the jobs' last records
+        await asyncio.to_thread(_writer.shutdown)
+        _writer = None
+    _slots = None
+
+
+def _trim_history() -> None:
+    finished = [job_id for job_id, job in _jobs.items() if job.status in FINISHED]
+    for job_id in finished[: max(0, len(_jobs) - settings.ingest_job_history)]:
+        del _jobs[job_id]
+    _write(get_catalog().trim_jobs, settings.ingest_job_history)
+
+
+class _StageClock:
+    """Moves a job between stages and accumulates wall time per stage."""
+
+    def __init__(self, job: IngestionJob) -> None:
+        self.job = job
+        self.started = time.perf_counter()
+
+    def enter(self, stage: str) -> None:
+        self._close()
+        self.job.status = stage
+        _save(self.job)
+
+    def finish(self, status: str) -> None:
+        self._close()
+        self.job.status = status
+        _save(self.job)
+
+    def _close(self) -> None:
+        now = time.perf_counter()
+        stage = self.job.status
+        if stage not in FINISHED:
+            elapsed = (now - self.started) * 1000
+            self.job.stage_ms[stage] = round(self.job.stage_ms.get(stage, 0.0) + elapsed, 1)
+        self.started = now
+
+
+async def _run(
+    job: IngestionJob,
+    file_path: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    content_hash: str | None,
+) -> None:
+    clock = _StageClock(job)
+    catalog = get_catalog()
+    chunking = (
+        f"{settings.chunk_unit}:{chunk_size}:{chunk_overlap}:{int(settings.chunk_merge_windows)}"
+        f":m{METADATA_VERSION}"
+    )
+    async with _get_slots():
+        with trace("ingest") as current:
+            try:
+                unchanged = content_hash and await asyncio.to_thread(
+                    catalog.find_unchanged, job.tenant, job.filename, content_hash, chunking
+                )
+                if unchanged:
+                    job.chunks_total = job.chunks_stored = unchanged.num_chunks
+                    job.index = IndexResult(unchanged=unchanged.num_chunks)
+                    job.document = unchanged
+                    clock.finish("done")
+                    logger.info("Document unchanged, not re-indexed: %s", job.filename)
+                    return
+
+                await asyncio.to_thread(
+                    catalog.begin_document,
+                    job.tenant,
+                    job.filename,
+                    content_hash,
+                    chunking,
+                    job.job_id,
+                )
+                job.file_bytes = os.path.getsize(file_path)
+                # Each step's completion moves the job on to the next stage: batches are
+                # parsed and embedded in turn, then stored together (see add_chunks)
+                next_stage = {"parsing": "embedding", "embedding": "parsing", "storing": "storing"}
+
+                def on_progress(stage: str, done: int) -> None:
+                    if stage == "parsing":
+                        job.chunks_total = max(job.chunks_total, done)
+                    elif stage == "embedding":
+                        job.chunks_embedded = done
+                    else:
+                        job.chunks_stored = done
+                    clock.enter(next_stage[stage])
+
+                clock.enter("parsing")
+                spool_path = f"{file_path}.{job.job_id}.chunks"
+                try:
+                    if settings.ingest_parse_processes > 0:
+                        stats, answers = await _parse_in_pool(
+                            job, file_path, spool_path, chunk_size, chunk_overlap
+                        )
+                        chunks = iter_spool(spool_path)
+                    else:
+                        # parse → chunk is one lazy pipeline, pulled batch by batch by add_chunks
+                        stats = SectionStats(iter_sections(file_path, job.filename))
+                        collector = AnswerCollector()
+                        answers = collector.entries
+                        chunks = iter_chunks(
+                            stats,
+                            job.filename,
+                            chunk_size,
+                            chunk_overlap,
+                            unit=settings.chunk_unit,
+                            merge_windows=settings.chunk_merge_windows,
+                            on_table_entry=collector,
+                        )
+                    job.index = await add_chunks(
+                        chunks,
+                        on_progress=on_progress,
+                        executor=_get_executor(),
+                        tenant=job.tenant,
+                        answers={job.filename: answers},
+                    )
+                finally:
+                    if os.path.exists(spool_path):
+                        os.remove(spool_path)
+                if settings.ingest_parse_processes <= 0:
+                    # Pulled by the embedding loop, so this includes waiting on it
+                    _observe_parse(job, job.stage_ms.get("parsing", 0.0))
+
+                job.document = DocumentInfo(
+                    filename=job.filename,
+                    num_chunks=job.chunks_stored,
+                    num_tables=stats.tables,
+                    num_paragraphs=stats.paragraphs,
+                    sample_sections=stats.headings,
+                    content_hash=content_hash,
+                )
+                clock.finish("done")
+                await asyncio.to_thread(
+                    catalog.finish_document, job.tenant, job.document, job.stage_ms
+                )
+
+                logger.info(
+                    "Document ingested: %s (%d chunks, %d new, %d tables, %d paragraphs, "
+                    "parsed at %s MB/s) stages %s",
+                    job.filename,
+                    job.chunks_stored,
+                    job.index.added,
+                    stats.tables,
+                    stats.paragraphs,
+                    job.parse_mb_per_s,
+                    job.stage_ms,
+                )
+
+            except asyncio.CancelledError:
+                job.error = "Bearbetningen avbröts."
+                clock.finish("failed")
+                _write(catalog.fail_document, job.tenant, job.filename, job.error)
+                raise
+            except Exception as e:
+                logger.exception("Failed to process document: %s", job.filename)
+                job.error = f"Kunde inte bearbeta dokumentet: {e}"
+                current.error = type(e).__name__
+                clock.finish("failed")
+                _write(catalog.fail_document, job.tenant, job.filename, job.error)
+
+
+async def _parse_in_pool(
+    job: IngestionJob, file_path: str, spool_path: str, chunk_size: int, chunk_overlap: int
+) -> tuple[SectionStats, list[dict]]:
+    """Parse and chunk in a worker process into ``spool_path``; the counts and direct answers."""
+    global _parse_pool
+    loop = asyncio.get_running_loop()
+    try:
+        parsed = await loop.run_in_executor(
+            _get_parse_pool(),
+            parse_to_spool,
+            file_path,
+            job.filename,
+            spool_path,
+            chunk_size,
+            chunk_overlap,
+            settings.chunk_unit,
+            settings.chunk_merge_windows,
+        )
+    except BrokenProcessPool:
+        # A parser took its process down (e.g. out of memory); the next job gets a new pool
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=False, cancel_futures=True)
+            _parse_pool = None
+        raise RuntimeError("Tolkningsprocessen avslutades oväntat.") from None
+    job.chunks_total = parsed["chunks"]
+    _observe_parse(job, parsed["parse_ms"])
+
+    stats = SectionStats(())
+    stats.paragraphs, stats.tables, stats.headings = (
+        parsed["paragraphs"], parsed["tables"], parsed["headings"]
+    )
+    return stats, parsed["answers"]
+
+
+def _observe_parse(job: IngestionJob, parse_ms: float) -> None:
+    fmt = file_type(job.filename).lstrip(".") or "unknown"
+    PARSE_BYTES.labels(fmt).inc(job.file_bytes)
+    PARSE_SECONDS.labels(fmt).inc(parse_ms / 1000)
+    if parse_ms > 0:
+        job.parse_mb_per_s = round(job.file_bytes / (1024 * 1024) / (parse_ms / 1000), 2)
@@ -0,0 +1,327 @@
+"""BM25 inverted index for exact-term retrieval.
+
+The handbook is full of exact terms — ORSAK codes, "OB-tillägg",
+"semesterersättning", article numbers — that dense retrieval tends to rank
+below vaguely similar paragraphs. This index is maintained next to the
+vector store and fused with vector results in ``vectorstore.search``.
+
+Layout: postings live in a CSR "base" (``term_ptr`` → ``post_docs`` /
+``post_tfs`` numpy arrays) plus a small per-term "delta" of postings added
+since the last flush. Removing a chunk only clears its ``live`` flag;
+``flush()`` merges the delta, drops dead postings, renumbers documents and
+writes everything to one ``.npz``. A query touches only the postings of
+its own terms, scored with vectorized numpy operations.
+"""
+
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Words, codes and numbers; "OB-tillägg", "ORSAK-000120" and "12.3" stay whole
+_TOKEN_RE = re.compile(r"\w+(?:[-./]\w+)*", re.UNICODE)
+_PART_RE = re.compile(r"\w+", re.UNICODE)
+
+_STOPWORDS = frozenset(
+    "och det att i en jag hon som han på den med var sig för så till är men ett om "
+    "hade de av icke mig du henne då sin nu har inte hans honom skulle hennes där min "
+    "man ej vid kunde något från ut när efter upp vi dem vara vad över än dig kan sina "
+    "här ha mot alla under någon eller allt mycket sedan ju denna själv detta åt utan "
+    "varit hur ingen mitt ni bli blev oss din dessa några deras blir mina samma vilken "
+    "er sådan vår blivit dess inom mellan sådant varför varje vilka ditt vem vilket "
+    "sitta sådana vart dina vars vårt våra ert era vilkas".split()
+)
+
+_VOWELS = "aeiouyäåö"
+# Snowball Swedish step 1, longest first
+_SUFFIXES = sorted(
+    (
+        "a arna erna heterna orna ad e ade ande arne are aste en anden aren heten ern "
+        "ar er heter or as arnas ernas ornas es ades andes ens arens hetens erns at "
+        "andet het ast"
+    ).split(),
+    key=len,
+    reverse=True,
+)
+_S_ENDING = set("bcdfghjklmnoprtvy")
+
+
+def _r1(word: str) -> int:
+    """Start of Snowball's R1 region, at least 3 characters in."""
+    for i in range(1, len(word)):
+        if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+            return max(i + 1, 3)
+    return len(word)
+
+
+def stem(word: str) -> str:
+    """Light Swedish stemmer (Snowball steps 1–2): 'löner' → 'lön', 'ersättningar' → 'ersättning'."""
+    if len(word) < 4 or not word.isalpha():
+        return word
+    r1 = _r1(word)
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= r1:
+            word = word[: -len(suffix)]
+            break
+    else:
+        if word.endswith("s") and len(word) - 1 >= r1 and word[-2] in _S_ENDING:
+            word = word[:-1]
+    if word[-2:] in ("dd", "gd", "nn", "dt", "gt", "kt", "tt") and len(word) - 1 >= r1:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased, stemmed terms; compounds and codes are indexed whole and by part."""
+    text = unicodedata.normalize("NFC", text).lower()
+    terms: list[str] = []
+    for token in _TOKEN_RE.findall(text):
+        if token.isalpha():
+            if token not in _STOPWORDS:
+                terms.append(stem(token))
+            continue
+        terms.append(token)
+        parts = _PART_RE.findall(token)
+        if len(parts) > 1:
+            terms.extend(stem(p) for p in parts if p not in _STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75) -> None:
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._reset()
+        self._load()
+
+    def _reset(self) -> None:
+        self._terms: dict[str, int] = {}
+        self._doc_ids: list[str] = []
+        self._doc_of: dict[str, int] = {}
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._live = np.zeros(0, dtype=bool)
+        self._total_length = 0.0
+        self._term_ptr = np.zeros(1, dtype=np.int64)
+        self._post_docs = np.zeros(0, dtype=np.int32)
+        self._post_tfs = np.zeros(0, dtype=np.uint16)
+        # term id → (doc indexes, term frequencies) added since the last flush
+        self._delta: dict[int, tuple[list[int], list[int]]] = {}
+        self._dirty = False
+        # (allowed ids, row mask) of the last filtered search; rows move on add and flush
+        self._allowed_rows: tuple[set[str], np.ndarray] | None = None
+
+    # -- persistence --
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with np.load(self.path, allow_pickle=False) as data:
+            terms = _split(data["terms"])
+            self._terms = {t: i for i, t in enumerate(terms)}
+            self._doc_ids = _split(data["doc_ids"])
+            self._lengths = data["lengths"].astype(np.float32)
+            self._term_ptr = data["term_ptr"]
+            self._post_docs = data["post_docs"]
+            self._post_tfs = data["post_tfs"]
+        self._doc_of = {d: i for i, d in enumerate(self._doc_ids)}
+        self._live = np.ones(len(self._doc_ids), dtype=bool)
+        self._total_length = float(self._lengths.sum())
+        logger.info(
+            "Loaded BM25 index: %d chunks, %d terms, %d postings",
+            len(self._doc_ids), len(self._terms), len(self._post_docs),
+        )
+
+    def flush(self) -> None:
+        """Merge pending postings, drop removed chunks and persist."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._compact()
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            terms = [""] * len(self._terms)
+            for term, i in self._terms.items():
+                terms[i] = term
+            tmp = self.path + ".tmp.npz"
+            np.savez(
+                tmp,
+                terms=_join(terms),
+                doc_ids=_join(self._doc_ids),
+                lengths=self._lengths.astype(np.uint32),
+                term_ptr=self._term_ptr,
+                post_docs=self._post_docs,
+                post_tfs=self._post_tfs,
+            )
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+    def _compact(self) -> None:
+        n_terms = len(self._terms)
+        base_terms = np.repeat(
+            np.arange(len(self._term_ptr) - 1, dtype=np.int32), np.diff(self._term_ptr)
+        )
+        delta_terms, delta_docs, delta_tfs = [], [], []
+        for term_id, (docs, tfs) in self._delta.items():
+            delta_terms.append(np.full(len(docs), term_id, dtype=np.int32))
+            delta_docs.append(np.asarray(docs, dtype=np.int32))
+            delta_tfs.append(np.asarray(tfs, dtype=np.uint16))
+
+        terms = np.concatenate([base_terms, *delta_terms])
+        docs = np.concatenate([self._post_docs, *delta_docs])
+        tfs = np.concatenate([self._post_tfs, *delta_tfs])
+
+        keep = self._live[docs]
+        terms, docs, tfs = terms[keep], docs[keep], tfs[keep]
+        # Renumber live documents densely
+        new_index = np.cumsum(self._live, dtype=np.int64) - 1
+        docs = new_index[docs].astype(np.int32)
+
+        order = np.argsort(terms, kind="stable")
+        self._post_docs = docs[order]
+        self._post_tfs = tfs[order]
+        self._term_ptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=n_terms), out=self._term_ptr[1:])
+
+        live = np.flatnonzero(self._live)
+        self._doc_ids = [self._doc_ids[i] for i in live]
+        self._doc_of = {d: i for i, d in enumerate(self._doc_ids)}
+        self._lengths = self._lengths[live]
+        self._live = np.ones(len(self._doc_ids), dtype=bool)
+        self._delta = {}
+        self._allowed_rows = None
+
+    # -- writes --
+
+    def add(self, ids: list[str], texts: list[str]) -> None:
+        with self._lock:
+            self.remove([i for i in ids if i in self._doc_of])
+            start = len(self._doc_ids)
+            lengths = []
+            for offset, (chunk_id, text) in enumerate(zip(ids, texts)):
+                doc = start + offset
+                self._doc_ids.append(chunk_id)
+                self._doc_of[chunk_id] = doc
+                counts: dict[str, int] = {}
+                for term in tokenize(text):
+                    counts[term] = counts.get(term, 0) + 1
+                for term, tf in counts.items():
+                    term_id = self._terms.setdefault(term, len(self._terms))
+                    docs, tfs = self._delta.setdefault(term_id, ([], []))
+                    docs.append(doc)
+                    tfs.append(min(tf, 65535))
+                lengths.append(sum(counts.values()))
+            self._lengths = np.concatenate([self._lengths, np.asarray(lengths, dtype=np.float32)])
+            self._live = np.concatenate([self._live, np.ones(len(ids), dtype=bool)])
+            self._total_length += sum(lengths)
+            self._dirty = True
+            self._allowed_rows = None
+
+    def remove(self, ids: list[str]) -> None:
+        with self._lock:
+            for chunk_id in ids:
+                doc = self._doc_of.pop(chunk_id, None)
+                if doc is None:
+                    continue
+                self._live[doc] = False
+                self._total_length -= float(self._lengths[doc])
+                self._dirty = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    # -- reads --
+
+    def count(self) -> int:
+        return len(self._doc_of)
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        allowed_ids: set[str] | None = None,
+    ) -> list[tuple[str, float]]:
+        """Best ``top_k`` chunk ids by BM25 score, best first.
+
+        ``allowed_ids`` is treated as read-only: its row mask is reused while
+        the same set is passed again and no chunks were added.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            n_live = len(self._doc_of)
+            if not n_live or not terms or top_k <= 0:
+                return []
+            avg_length = max(self._total_length / n_live, 1.0)
+            scores = np.zeros(len(self._doc_ids), dtype=np.float32)
+            allowed = None if allowed_ids is None else self._rows_of(allowed_ids)
+
+            for term in terms:
+                term_id = self._terms.get(term)
+                if term_id is None:
+                    continue
+                docs, tfs = self._postings(term_id)
+                live = self._live[docs]
+                if allowed is not None:
+                    live &= allowed[docs]
+                docs, tfs = docs[live], tfs[live]
+                if docs.size == 0:
+                    continue
+                idf = math.log(1.0 + (n_live - docs.size + 0.5) / (docs.size + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * self._lengths[docs] / avg_length)
+                # Each document appears once per term, so fancy-index += is safe
+                scores[docs] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+
+            candidates = np.flatnonzero(scores)
+            if candidates.size == 0:
+                return []
+            k = min(top_k, candidates.size)
+            best = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            best = best[np.argsort(-scores[best])]
+            return [(self._doc_ids[i], float(scores[i])) for i in best.tolist()]
+
+    def _rows_of(self, allowed_ids: set[str]) -> np.ndarray:
+        if self._allowed_rows is not None and self._allowed_rows[0] is allowed_ids:
+            return self._allowed_rows[1]
+        mask = np.zeros(len(self._doc_ids), dtype=bool)
+        mask[[self._doc_of[i] for i in allowed_ids if i in self._doc_of]] = True
+        self._allowed_rows = (allowed_ids, mask)
+        return mask
+
+    def _postings(self, term_id: int) -> tuple[np.ndarray, np.ndarray]:
+        if term_id + 1 < len(self._term_ptr):
+            lo, hi = self._term_ptr[term_id], self._term_ptr[term_id + 1]
+            docs, tfs = self._post_docs[lo:hi], self._post_tfs[lo:hi].astype(np.float32)
+        else:
+            docs, tfs = self._post_docs[:0], np.zeros(0, dtype=np.float32)
+        delta = self._delta.get(term_id)
+        if delta:
+            docs = np.concatenate([docs, np.asarray(delta[0], dtype=np.int32)])
+            tfs = np.concatenate([tfs, np.asarray(delta[1], dtype=np.float32)])
+        return docs, tfs
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[str]:
+    """Merge ranked id lists: each id scores sum(1 / (k + rank)) over the lists."""
+    scores: dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.__getitem__, reverse=True)
+
+
+def _join(strings: list[str]) -> np.ndarray:
+    return np.frombuffer("\n".join(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _split(data: np.ndarray) -> list[str]:
+    text = data.tobytes().decode("utf-8")
+    return text.split("\n") if text else []
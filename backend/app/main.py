@@ -1,32 +1,80 @@
 """FastAPI application — RAG chatbot with document upload."""
 
+import asyncio
+import hashlib
+import json
 import logging
+import math
 import os
 import shutil
+import time
+import uuid
+import zipfile
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-from app.chunking import chunk_document
+from app.admission import Overloaded, ProviderUnavailable
+from app.answer_cache import get_answer_cache
+from app.catalog import get_catalog
 from app.config import settings
-from app.document import parse_docx
+from app.conversations import delete_conversation, get_conversation
+from app.embedding_cache import get_embedding_cache
+from app.ingestion import get_job, list_jobs, shutdown_jobs, submit_job
 from app.models import (
+    BatchUploadResponse,
     ChatRequest,
     ChatResponse,
+    Conversation,
     DocumentInfo,
+    Facets,
     HealthResponse,
+    IngestionJob,
+    SkippedFile,
+    StageTrace,
+    TenantStats,
 )
-from app.rag import generate_response
-from app.vectorstore import add_chunks, clear_all, get_stats
+from app.parsers import PARSERS, file_type, is_supported
+from app.providers import close_clients, get_clients, start_clients
+from app.rag import check_provider, generate_response, stream_response
+from app.telemetry import HTTP_SECONDS, recent_traces, trace
+from app.vectorstore import (
+    DEFAULT_TENANT,
+    clear_all,
+    delete_document,
+    get_facets,
+    get_stats,
+    is_valid_tenant,
+    run_tenant_sweeper,
+    tenant_dir,
+    tenant_stats,
+)
+from app.warmup import warm_up
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_clients()
+    await warm_up()
+    sweeper = asyncio.create_task(run_tenant_sweeper())
+    yield
+    sweeper.cancel()
+    await shutdown_jobs()
+    await close_clients()
+
+
 app = FastAPI(
     title="RAG Chatbot API",
-    description="Upload Word documents and chat with AI using RAG",
+    description="Upload documents (Word, PDF, HTML, Excel) and chat with AI using RAG",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -35,101 +83,279 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
-# Track uploaded documents
-uploaded_documents: list[DocumentInfo] = []
+
+@app.middleware("http")
+async def observe_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # The route template, not the raw path, keeps label cardinality bounded
+    route = request.scope.get("route")
+    HTTP_SECONDS.labels(
+        request.method, route.path if route else "unmatched", str(response.status_code)
+    ).observe(time.perf_counter() - started)
+    return response
+
+
+UPLOAD_BLOCK_SIZE = 1024 * 1024
 
 # Ensure upload directory exists
 os.makedirs(settings.upload_dir, exist_ok=True)
 
 
+def get_tenant(x_tenant_id: str | None = Header(default=None)) -> str:
+    """The tenant a request acts on: the ``X-Tenant-ID`` header, or the default tenant."""
+    if x_tenant_id is None:
+        return DEFAULT_TENANT
+    if not is_valid_tenant(x_tenant_id):
+        raise HTTPException(
+            status_code=400,
+            detail="Ogiltigt X-Tenant-ID: 1–48 tecken (A–Z, a–z, 0–9, - och _).",
+        )
+    return x_tenant_id
+
+
+def _upload_dir(tenant: str) -> str:
+    if tenant == DEFAULT_TENANT:
+        return settings.upload_dir
+    return os.path.join(tenant_dir(tenant), "uploads")
+
+
 @app.get("/api/health", response_model=HealthResponse)
-async def health_check():
-    stats = get_stats()
+async def health_check(tenant: str = Depends(get_tenant)):
+    stats = await asyncio.to_thread(get_stats, tenant)
+    documents = await asyncio.to_thread(_documents, tenant)
     emb_model = (
         settings.openai_embedding_model
         if settings.embedding_provider == "openai"
         else settings.ollama_embedding_model
     )
+    cache = get_embedding_cache()
+    answers = get_answer_cache()
     return HealthResponse(
         status="ok",
-        documents_loaded=len(uploaded_documents),
+        tenant=tenant,
+        documents_loaded=len(documents),
         total_chunks=stats["total_chunks"],
+        vector_backend=stats["backend"],
         embedding_model=f"{settings.embedding_provider}/{emb_model}",
+        embedding_cache=cache.stats() if cache else None,
+        answer_cache=answers.stats() if answers else None,
     )
 
 
-@app.post("/api/upload", response_model=DocumentInfo)
+def _check_chunking(chunk_size: int, chunk_overlap: int) -> None:
+    if chunk_size <= 0 or not 0 <= chunk_overlap < chunk_size:
+        raise HTTPException(
+            status_code=400,
+            detail="Ogiltig segmentering: överlappningen måste vara mindre än segmentstorleken.",
+        )
+
+
+def _unsupported(filename: str) -> str:
+    return f"Filtypen stöds inte: {filename}. Tillåtna: {', '.join(sorted(PARSERS))}."
+
+
+async def _spool_upload(file: UploadFile, file_path: str, max_bytes: int) -> str | None:
+    """Write the upload to disk in blocks; its SHA-256, or None (and no file) if too large."""
+    size = 0
+    digest = hashlib.sha256()
+    with open(file_path, "wb") as f:
+        while block := await file.read(UPLOAD_BLOCK_SIZE):
+            size += len(block)
+            if size > max_bytes:
+                break
+            digest.update(block)
+            f.write(block)
+    if size > max_bytes:
+        os.remove(file_path)
+        return None
+    return digest.hexdigest()
+
+
+@app.post("/api/upload", response_model=IngestionJob, status_code=202)
 async def upload_document(
     file: UploadFile = File(...),
     chunk_size: int = 500,
     chunk_overlap: int = 50,
+    tenant: str = Depends(get_tenant),
 ):
-    if not file.filename or not file.filename.endswith((".docx", ".DOCX")):
+    if not file.filename or not is_supported(file.filename):
+        raise HTTPException(status_code=400, detail=_unsupported(file.filename or ""))
+    _check_chunking(chunk_size, chunk_overlap)
+
+    # Spool the upload to disk in chunks instead of holding it in memory
+    upload_dir = _upload_dir(tenant)
+    os.makedirs(upload_dir, exist_ok=True)
+    file_path = os.path.join(upload_dir, Path(file.filename).name)
+    content_hash = await _spool_upload(file, file_path, settings.max_file_size_mb * 1024 * 1024)
+    if content_hash is None:
         raise HTTPException(
             status_code=400,
-            detail="Endast .docx-filer stöds. Ladda upp ett Word-dokument.",
+            detail=f"Filen är för stor. Max: {settings.max_file_size_mb} MB.",
         )
 
-    # Check file size
-    contents = await file.read()
-    size_mb = len(contents) / (1024 * 1024)
-    if size_mb > settings.max_file_size_mb:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Filen är för stor ({size_mb:.1f} MB). Max: {settings.max_file_size_mb} MB.",
-        )
+    # Parse, chunk, embed and store in the background; the client polls the job
+    return submit_job(
+        file_path,
+        file.filename,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        tenant=tenant,
+        content_hash=content_hash,
+    )
 
-    # Save file
-    file_path = os.path.join(settings.upload_dir, file.filename)
-    with open(file_path, "wb") as f:
-        f.write(contents)
 
-    try:
-        # Parse document
-        parsed = parse_docx(file_path, file.filename)
-
-        # Chunk document
-        chunks = chunk_document(parsed, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-
-        # Add to vector store
-        add_chunks(chunks)
-
-        # Collect section names
-        sections = list({
-            s["text"] for s in parsed.sections if s["type"] == "heading"
-        })
-
-        doc_info = DocumentInfo(
-            filename=file.filename,
-            num_chunks=len(chunks),
-            num_tables=len(parsed.tables),
-            num_paragraphs=len(parsed.paragraphs),
-            sample_sections=sections[:10],
-        )
-        uploaded_documents.append(doc_info)
-
-        logger.info(
-            "Document uploaded: %s (%d chunks, %d tables, %d paragraphs)",
-            file.filename,
-            len(chunks),
-            len(parsed.tables),
-            len(parsed.paragraphs),
+@app.post("/api/upload/batch", response_model=BatchUploadResponse, status_code=202)
+async def upload_batch(
+    files: list[UploadFile] = File(...),
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    tenant: str = Depends(get_tenant),
+):
+    """Several documents at once, as files and/or ``.zip`` archives of a folder; one job each."""
+    _check_chunking(chunk_size, chunk_overlap)
+    upload_dir = _upload_dir(tenant)
+    os.makedirs(upload_dir, exist_ok=True)
+    max_bytes = settings.max_file_size_mb * 1024 * 1024
+
+    accepted: dict[str, str] = {}  # filename → content hash
+    skipped: list[SkippedFile] = []
+    for file in files:
+        name = Path(file.filename or "").name
+        if file_type(name) == ".zip":
+            archive_path = os.path.join(upload_dir, f".{uuid.uuid4().hex}.zip")
+            if await _spool_upload(file, archive_path, max_bytes) is None:
+                skipped.append(SkippedFile(filename=name, reason="Arkivet är för stort."))
+                continue
+            try:
+                await asyncio.to_thread(
+                    _extract_archive, archive_path, name, upload_dir, accepted, skipped
+                )
+            finally:
+                os.remove(archive_path)
+        elif not is_supported(name):
+            skipped.append(SkippedFile(filename=name, reason=_unsupported(name)))
+        elif name in accepted:
+            skipped.append(SkippedFile(filename=name, reason=_DUPLICATE))
+        elif len(accepted) >= settings.batch_max_files:
+            skipped.append(SkippedFile(filename=name, reason=_too_many()))
+        elif content_hash := await _spool_upload(file, os.path.join(upload_dir, name), max_bytes):
+            accepted[name] = content_hash
+        else:
+            skipped.append(SkippedFile(filename=name, reason="Filen är för stor."))
+
+    jobs = [
+        submit_job(
+            os.path.join(upload_dir, name),
+            name,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            tenant=tenant,
+            content_hash=content_hash,
         )
+        for name, content_hash in accepted.items()
+    ]
+    return BatchUploadResponse(jobs=jobs, skipped=skipped)
 
-        return doc_info
 
-    except Exception as e:
-        logger.exception("Failed to process document: %s", file.filename)
-        raise HTTPException(status_code=500, detail=f"Kunde inte bearbeta dokumentet: {e}")
+_DUPLICATE = "Samma filnamn finns redan i uppladdningen."
+
+
+def _too_many() -> str:
+    return f"För många filer i en uppladdning (max {settings.batch_max_files})."
+
+
+def _extract_archive(
+    archive_path: str,
+    archive_name: str,
+    upload_dir: str,
+    accepted: dict[str, str],
+    skipped: list[SkippedFile],
+) -> None:
+    """Unpack the supported documents of a zip flat into the upload directory."""
+    max_bytes = settings.max_file_size_mb * 1024 * 1024
+    try:
+        archive = zipfile.ZipFile(archive_path)
+    except zipfile.BadZipFile:
+        skipped.append(SkippedFile(filename=archive_name, reason="Arkivet kunde inte läsas."))
+        return
+    with archive:
+        for member in archive.infolist():
+            # Only the file name: no paths out of the upload directory
+            name = Path(member.filename).name
+            if member.is_dir() or member.filename.startswith("__MACOSX/") or name.startswith("."):
+                continue
+            label = f"{archive_name}/{member.filename}"
+            if not is_supported(name):
+                skipped.append(SkippedFile(filename=label, reason=_unsupported(name)))
+            elif name in accepted:
+                skipped.append(SkippedFile(filename=label, reason=_DUPLICATE))
+            elif len(accepted) >= settings.batch_max_files:
+                skipped.append(SkippedFile(filename=label, reason=_too_many()))
+            elif member.file_size > max_bytes:
+                skipped.append(SkippedFile(filename=label, reason="Filen är för stor."))
+            elif content_hash := _extract_member(
+                archive, member, os.path.join(upload_dir, name), max_bytes
+            ):
+                accepted[name] = content_hash
+            else:
+                skipped.append(SkippedFile(filename=label, reason="Filen är för stor."))
+
+
+def _extract_member(
+    archive: zipfile.ZipFile, member: zipfile.ZipInfo, file_path: str, max_bytes: int
+) -> str | None:
+    # The declared size is not trusted: stop once more than max_bytes come out
+    size = 0
+    digest = hashlib.sha256()
+    with archive.open(member) as source, open(file_path, "wb") as f:
+        while block := source.read(UPLOAD_BLOCK_SIZE):
+            size += len(block)
+            if size > max_bytes:
+                break
+            digest.update(block)
+            f.write(block)
+    if size > max_bytes:
+        os.remove(file_path)
+        return None
+    return digest.hexdigest()
+
+
+@app.get("/api/upload/jobs", response_model=list[IngestionJob])
+async def list_upload_jobs(tenant: str = Depends(get_tenant)):
+    return await asyncio.to_thread(list_jobs, tenant)
+
+
+@app.get("/api/upload/jobs/{job_id}", response_model=IngestionJob)
+async def get_upload_job(job_id: str, tenant: str = Depends(get_tenant)):
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None or job.tenant != tenant:
+        raise HTTPException(status_code=404, detail="Uppladdningsjobbet hittades inte.")
+    return job
+
+
+def _wants_timings(http_request: Request) -> bool:
+    return settings.stage_timings_header or http_request.headers.get("x-debug-timings") == "1"
 
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(
+    request: ChatRequest,
+    http_request: Request,
+    http_response: Response,
+    tenant: str = Depends(get_tenant),
+):
     try:
-        response = await generate_response(request)
+        with trace("chat") as current:
+            response = await generate_response(request, tenant)
+        if _wants_timings(http_request):
+            http_response.headers["Server-Timing"] = current.server_timing()
         return response
+    except (Overloaded, ProviderUnavailable) as e:
+        raise _rejected(e)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -137,18 +363,119 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Fel vid AI-generering: {e}")
 
 
+@app.post("/api/chat/stream")
+async def chat_stream(
+    request: ChatRequest, http_request: Request, tenant: str = Depends(get_tenant)
+):
+    """Server-sent events: ``sources``, then ``token`` events, then ``done`` (or ``error``)."""
+    try:
+        check_provider(request)
+    except (Overloaded, ProviderUnavailable) as e:
+        raise _rejected(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        _sse_events(request, tenant, _wants_timings(http_request)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _sse_events(request: ChatRequest, tenant: str, with_timings: bool):
+    try:
+        with trace("stream") as current:
+            async for event, payload in stream_response(request, tenant):
+                if event == "done" and with_timings:
+                    # Headers are long gone; the breakdown travels with the last event
+                    payload["stages"] = current.stages
+                yield _sse(event, payload)
+    except (Overloaded, ProviderUnavailable) as e:
+        yield _sse("error", {"detail": str(e), "retry_after": math.ceil(e.retry_after)})
+    except Exception as e:
+        logger.exception("Chat stream error")
+        yield _sse("error", {"detail": f"Fel vid AI-generering: {e}"})
+
+
+def _rejected(e: Overloaded | ProviderUnavailable) -> HTTPException:
+    """429 while queues are full, 503 while the provider's circuit is open."""
+    return HTTPException(
+        status_code=429 if isinstance(e, Overloaded) else 503,
+        detail=str(e),
+        headers={"Retry-After": str(math.ceil(e.retry_after))},
+    )
+
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+@app.get("/api/conversations/{conversation_id}", response_model=Conversation)
+async def get_conversation_endpoint(conversation_id: str, tenant: str = Depends(get_tenant)):
+    """Summary and unsummarized turns of a conversation."""
+    conversation = await asyncio.to_thread(get_conversation, tenant, conversation_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Konversationen hittades inte.")
+    return conversation
+
+
+@app.delete("/api/conversations/{conversation_id}")
+async def delete_conversation_endpoint(conversation_id: str, tenant: str = Depends(get_tenant)):
+    if not await asyncio.to_thread(delete_conversation, tenant, conversation_id):
+        raise HTTPException(status_code=404, detail="Konversationen hittades inte.")
+    return {"message": "Konversationen har tagits bort."}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Mätvärden är avstängda.")
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/api/traces", response_model=list[StageTrace])
+async def list_traces():
+    """Stage breakdowns of the most recent chat requests and ingestion jobs, newest first."""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Mätvärden är avstängda.")
+    return recent_traces()
+
+
+@app.get("/api/tenants", response_model=list[TenantStats])
+async def list_tenants():
+    """Documents and usage per tenant, and which tenant indexes this worker has open."""
+    # Lists every tenant id, and X-Tenant-ID is not authenticated: operators only
+    if not settings.tenant_listing_enabled:
+        raise HTTPException(status_code=404, detail="Tenantlistan är avstängd.")
+    return await asyncio.to_thread(tenant_stats)
+
+
 @app.get("/api/documents", response_model=list[DocumentInfo])
-async def list_documents():
-    return uploaded_documents
+async def list_documents(tenant: str = Depends(get_tenant)):
+    return await asyncio.to_thread(_documents, tenant)
+
+
+def _documents(tenant: str) -> list[DocumentInfo]:
+    documents = get_catalog().list_documents(tenant)
+    if not documents:
+        # Opening the index registers documents stored before the catalog existed
+        get_stats(tenant)
+        documents = get_catalog().list_documents(tenant)
+    return documents
+
+
+@app.get("/api/facets", response_model=Facets)
+async def list_facets(tenant: str = Depends(get_tenant)):
+    """Documents, sections and entry types the chat can be filtered on."""
+    return await asyncio.to_thread(get_facets, tenant)
 
 
 @app.delete("/api/documents")
-async def clear_documents():
-    uploaded_documents.clear()
-    clear_all()
+async def clear_documents(tenant: str = Depends(get_tenant)):
+    await clear_all(tenant)
 
-    # Clean upload directory
-    upload_path = Path(settings.upload_dir)
+    # Clean this tenant's upload directory
+    upload_path = Path(_upload_dir(tenant))
     if upload_path.exists():
         shutil.rmtree(upload_path)
         upload_path.mkdir(exist_ok=True)
@@ -156,6 +483,19 @@ async def clear_documents():
     return {"message": "Alla dokument har tagits bort."}
 
 
+@app.delete("/api/documents/{filename}")
+async def delete_document_endpoint(filename: str, tenant: str = Depends(get_tenant)):
+    known = await asyncio.to_thread(get_catalog().get_document, tenant, filename)
+    removed = await delete_document(filename, tenant)
+    if not removed and not known:
+        raise HTTPException(status_code=404, detail="Dokumentet hittades inte.")
+
+    file_path = Path(_upload_dir(tenant)) / Path(filename).name
+    file_path.unlink(missing_ok=True)
+
+    return {"message": f"{filename} har tagits bort.", "chunks_removed": removed}
+
+
 @app.get("/api/models")
 async def list_available_models():
     """List available models for both providers."""
@@ -170,15 +510,15 @@ async def list_available_models():
 
     # Try to fetch Ollama models
     try:
-        import httpx
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            resp = await client.get(f"{settings.ollama_base_url}/api/tags")
-            if resp.status_code == 200:
-                data = resp.json()
-                models["ollama"] = [
-                    {"id": m["name"], "name": m["name"]}
-                    for m in data.get("models", [])
-                ]
+        resp = await get_clients().ollama.get(
+            f"{settings.ollama_base_url}/api/tags", timeout=5.0
+        )
+        if resp.status_code == 200:
+            data = resp.json()
+            models["ollama"] = [
+                {"id": m["name"], "name": m["name"]}
+                for m in data.get("models", [])
+            ]
     except Exception:
         models["ollama"] = [
             {"id": "llama3", "name": "Llama 3 (standard)"},
@@ -1,4 +1,10 @@
-from pydantic import BaseModel
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+
+ChunkKind = Literal["paragraph", "table_entry", "window"]
+Provider = Literal["openai", "ollama"]
 
 
 class ChunkInfo(BaseModel):
@@ -7,6 +13,8 @@ class ChunkInfo(BaseModel):
     chunk_index: int
     section: str | None = None
     page: int | None = None
+    # "window": two adjacent paragraphs merged into one chunk
+    kind: ChunkKind = "paragraph"
 
 
 class SourceReference(BaseModel):
@@ -15,20 +23,65 @@ class SourceReference(BaseModel):
     section: str | None = None
     score: float
     chunk_index: int
+    chunk_id: str | None = None
+
+
+class SearchFilters(BaseModel):
+    """Restrict retrieval; each list matches any of its values, and all lists must match."""
+
+    sources: list[str] | None = None
+    sections: list[str] | None = None
+    kinds: list[ChunkKind] | None = None
 
 
 class ChatRequest(BaseModel):
     question: str
-    provider: str = "openai"  # "openai" or "ollama"
+    # Validated here: every provider gets its own gate, breaker and metric labels
+    provider: Provider = "openai"
     model: str | None = None
     temperature: float = 0.3
     top_k: int = 5
+    filters: SearchFilters | None = None
+    # Continue a server-side conversation (any client-chosen id); None = single question
+    conversation_id: str | None = Field(default=None, pattern=r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class GenerationTiming(BaseModel):
+    retrieval_ms: float
+    time_to_first_token_ms: float
+    generation_ms: float
+    total_ms: float
 
 
 class ChatResponse(BaseModel):
     answer: str
     sources: list[SourceReference]
     model_used: str
+    timing: GenerationTiming | None = None
+    # Estimated tokens sent to the LLM (system prompt + context + question); 0 if cached
+    prompt_tokens: int | None = None
+    cached: bool = False
+    # Answered from a table row by key lookup, without the LLM
+    direct: bool = False
+    conversation_id: str | None = None
+    # The follow-up rewritten into the standalone question used for retrieval
+    standalone_question: str | None = None
+    # Prompt tokens the provider served from its prompt cache, when it reports them
+    cached_prompt_tokens: int | None = None
+
+
+class ConversationTurn(BaseModel):
+    turn: int
+    question: str
+    answer: str
+
+
+class Conversation(BaseModel):
+    conversation_id: str
+    # Older turns, folded into a rolling summary
+    summary: str = ""
+    summarized_turns: int = 0
+    turns: list[ConversationTurn] = Field(default_factory=list)
 
 
 class UploadSettings(BaseModel):
@@ -42,10 +95,109 @@ class DocumentInfo(BaseModel):
     num_tables: int
     num_paragraphs: int
     sample_sections: list[str]
+    # indexing → ready | failed; a failed re-upload may leave a mix of old and new chunks
+    status: str = "ready"
+    # sha256 of the uploaded file
+    content_hash: str | None = None
+    stage_ms: dict[str, float] = Field(default_factory=dict)
+    error: str | None = None
+    updated_at: float | None = None
+
+
+class IndexResult(BaseModel):
+    added: int = 0
+    unchanged: int = 0
+    updated: int = 0
+    removed: int = 0
+
+
+class EmbeddingCacheStats(BaseModel):
+    entries: int
+    max_entries: int
+    hits: int
+    misses: int
+    hit_rate: float
+
+
+class AnswerCacheStats(BaseModel):
+    entries: int
+    hits: int
+    misses: int
+    hit_rate: float
+    latency_saved_ms: float
+
+
+class IngestionJob(BaseModel):
+    job_id: str
+    filename: str
+    tenant: str = "default"
+    # queued → parsing ⇄ embedding → storing → done | failed; parsing covers
+    # parse and chunk, which run as one step
+    status: str = "queued"
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_stored: int = 0
+    index: IndexResult | None = None
+    stage_ms: dict[str, float] = Field(default_factory=dict)
+    # Size of the uploaded file and how fast it was parsed and chunked
+    file_bytes: int = 0
+    parse_mb_per_s: float | None = None
+    error: str | None = None
+    document: DocumentInfo | None = None
+    created_at: float
+
+
+class SkippedFile(BaseModel):
+    filename: str
+    reason: str
+
+
+class BatchUploadResponse(BaseModel):
+    jobs: list[IngestionJob]
+    skipped: list[SkippedFile] = Field(default_factory=list)
 
 
 class HealthResponse(BaseModel):
     status: str
+    tenant: str = "default"
     documents_loaded: int
     total_chunks: int
+    vector_backend: str
     embedding_model: str
+    embedding_cache: EmbeddingCacheStats | None = None
+    answer_cache: AnswerCacheStats | None = None
+
+
+class TenantStats(BaseModel):
+    tenant: str
+    # Whether the tenant's index is open; chunks are only counted for open ones
+    loaded: bool
+    total_chunks: int | None = None
+    documents: int
+    corpus_version: int
+    queries: int
+    last_used: float | None = None
+
+
+class FacetValue(BaseModel):
+    value: str
+    count: int
+    # Sections are counted per document
+    source: str | None = None
+
+
+class Facets(BaseModel):
+    """What the corpus can be filtered on, with chunk counts."""
+
+    sources: list[FacetValue]
+    sections: list[FacetValue]
+    kinds: list[FacetValue]
+
+
+class StageTrace(BaseModel):
+    pipeline: str  # "chat", "stream" or "ingest"
+    started_at: float
+    total_ms: float
+    # Wall time per stage; concurrent stages overlap, so these may sum past total_ms
+    stages: dict[str, float]
+    error: str | None = None
@@ -0,0 +1,392 @@
+"""Parsers per file type, all yielding the section stream of ``iter_docx_sections``.
+
+``PARSERS`` maps a file extension to a function ``(file_path) -> Iterator[dict]``
+of ``heading``, ``paragraph`` and ``table_entry`` sections in document order,
+so chunking, embedding and storing do not depend on the format:
+
+- ``.docx``: streamed OOXML (``app.document``)
+- ``.html``/``.htm``: ``h1``–``h6`` are headings, block elements paragraphs;
+  table rows are paired with their header row like Word tables
+- ``.xlsx``: streamed sheet XML; each sheet is a heading and its rows table
+  entries (cell values as stored; dates stay serial numbers)
+- ``.pdf``: text extracted with ``pypdf``; lines in a larger font than the
+  page's body text are headings and a wider vertical gap ends a paragraph.
+  Tables have no structure in a PDF and come out as lines of text.
+
+``parse_to_spool`` runs parse → chunk for one file in a worker process and
+writes the chunks to a JSONL file that ``iter_spool`` streams back.
+"""
+
+import os
+import re
+import statistics
+import time
+import zipfile
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+
+from lxml import etree
+
+from app.chunking import iter_chunks
+from app.answer_entries import AnswerCollector
+from app.document import TableState, iter_docx_sections
+from app.models import ChunkInfo
+
+Parser = Callable[[str], Iterator[dict]]
+
+PARSERS: dict[str, Parser] = {}
+
+
+def register_parser(*extensions: str) -> Callable[[Parser], Parser]:
+    def register(parser: Parser) -> Parser:
+        for extension in extensions:
+            PARSERS[extension] = parser
+        return parser
+
+    return register
+
+
+def file_type(filename: str) -> str:
+    return Path(filename).suffix.lower()
+
+
+def is_supported(filename: str) -> bool:
+    return file_type(filename) in PARSERS
+
+
+def iter_sections(file_path: str, filename: str) -> Iterator[dict]:
+    parser = PARSERS.get(file_type(filename))
+    if parser is None:
+        raise ValueError(f"Filtypen stöds inte: {filename}")
+    return parser(file_path)
+
+
+register_parser(".docx")(iter_docx_sections)
+
+
+class SectionStats:
+    """Counts paragraphs, table entries and headings as sections stream past."""
+
+    def __init__(self, sections: Iterable[dict]) -> None:
+        self._sections = sections
+        self.paragraphs = 0
+        self.tables = 0
+        self.headings: list[str] = []
+
+    def __iter__(self) -> Iterator[dict]:
+        for section in self._sections:
+            if section["type"] == "paragraph":
+                self.paragraphs += 1
+            elif section["type"] == "table_entry":
+                self.tables += 1
+            elif section["type"] == "heading" and section["text"] not in self.headings:
+                if len(self.headings) < 10:
+                    self.headings.append(section["text"])
+            yield section
+
+
+# --- worker process ---
+
+
+def warm_worker() -> int:
+    """Run once per parse process at startup; unpickling it imports this module."""
+    return os.getpid()
+
+
+def parse_to_spool(
+    file_path: str,
+    filename: str,
+    spool_path: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    unit: str,
+    merge_windows: bool,
+) -> dict:
+    """Parse and chunk one file into ``spool_path`` (one chunk per line).
+
+    Returns the counts and the document's direct-answer entries.
+    """
+    started = time.perf_counter()
+    stats = SectionStats(iter_sections(file_path, filename))
+    answers = AnswerCollector()
+    chunks = 0
+    with open(spool_path, "w", encoding="utf-8") as spool:
+        for chunk in iter_chunks(
+            stats, filename, chunk_size, chunk_overlap, unit, merge_windows, answers
+        ):
+            spool.write(chunk.model_dump_json())
+            spool.write("\n")
+            chunks += 1
+    return {
+        "chunks": chunks,
+        "paragraphs": stats.paragraphs,
+        "tables": stats.tables,
+        "headings": stats.headings,
+        "answers": answers.entries,
+        "parse_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+def iter_spool(spool_path: str) -> Iterator[ChunkInfo]:
+    with open(spool_path, encoding="utf-8") as spool:
+        for line in spool:
+            yield ChunkInfo.model_validate_json(line)
+
+
+# --- HTML ---
+
+_HTML_HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+# Elements whose whole text is one paragraph
+_HTML_BLOCKS = {"p", "li", "dt", "dd", "pre", "blockquote", "figcaption", "caption", "address"}
+_HTML_SKIP = {"head", "script", "style", "noscript", "template", "nav", "svg", "iframe", "form"}
+_HTML_STRUCTURE = _HTML_HEADINGS | _HTML_BLOCKS | {"table", "div", "section", "article", "ul", "ol"}
+
+
+@register_parser(".html", ".htm")
+def iter_html_sections(file_path: str) -> Iterator[dict]:
+    from lxml import html as lxml_html
+
+    root = lxml_html.parse(file_path).getroot()
+    if root is None:
+        return
+    body = root.find("body")
+    state = {"heading": None, "tables": 0}
+    yield from _html_children(root if body is None else body, state)
+
+
+def _html_children(element: etree._Element, state: dict) -> Iterator[dict]:
+    # Loose text between block elements is a paragraph of its own
+    if text := _clean(element.text or ""):
+        yield {"type": "paragraph", "text": text, "heading": state["heading"]}
+    for child in element:
+        if isinstance(child.tag, str):
+            yield from _html_element(child, state)
+        if text := _clean(child.tail or ""):
+            yield {"type": "paragraph", "text": text, "heading": state["heading"]}
+
+
+def _html_element(element: etree._Element, state: dict) -> Iterator[dict]:
+    tag = element.tag.lower()
+    if tag in _HTML_SKIP:
+        return
+    if tag in _HTML_HEADINGS:
+        if text := _html_text(element):
+            state["heading"] = text
+            yield {"type": "heading", "text": text, "heading": text}
+    elif tag == "table":
+        table = TableState(state["tables"])
+        state["tables"] += 1
+        for row in _html_rows(element):
+            yield from table.add_cells(row, state["heading"])
+    elif tag in _HTML_BLOCKS or not any(
+        isinstance(d.tag, str) and d.tag.lower() in _HTML_STRUCTURE
+        for d in element.iterdescendants()
+    ):
+        if text := _html_text(element):
+            yield {"type": "paragraph", "text": text, "heading": state["heading"]}
+    else:
+        yield from _html_children(element, state)
+
+
+def _html_rows(table: etree._Element) -> Iterator[list[str]]:
+    """Cell texts of the table's own rows (not of tables nested in it); colspans repeat."""
+    for tr in table.iter("tr"):
+        if next(tr.iterancestors("table"), None) is not table:
+            continue
+        cells: list[str] = []
+        for cell in tr:
+            if isinstance(cell.tag, str) and cell.tag.lower() in ("td", "th"):
+                span = int(cell.get("colspan", "1")) if cell.get("colspan", "1").isdigit() else 1
+                cells.extend([_html_text(cell)] * max(span, 1))
+        if any(cells):
+            yield cells
+
+
+def _html_text(element: etree._Element) -> str:
+    for br in element.iter("br"):
+        br.tail = "\n" + (br.tail or "")
+    return _clean(element.text_content())
+
+
+def _clean(text: str) -> str:
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+# --- XLSX ---
+
+_S = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_CELL_REF_RE = re.compile(r"([A-Z]+)")
+
+
+@register_parser(".xlsx")
+def iter_xlsx_sections(file_path: str) -> Iterator[dict]:
+    """Each sheet is a heading; its rows go through the same header pairing as Word tables."""
+    with zipfile.ZipFile(file_path) as archive:
+        shared = _shared_strings(archive)
+        for table_index, (name, path) in enumerate(_sheets(archive)):
+            table = TableState(table_index)
+            started = False
+            with archive.open(path) as xml:
+                for _, row in etree.iterparse(xml, tag=f"{_S}row"):
+                    cells = _row_values(row, shared)
+                    row.clear()
+                    while row.getprevious() is not None:
+                        del row.getparent()[0]
+                    if not any(cells):
+                        continue
+                    if not started:
+                        started = True
+                        yield {"type": "heading", "text": name, "heading": name}
+                    if table.headers:
+                        # Rows may stop at their last non-empty cell
+                        cells = (cells + [""] * len(table.headers))[: len(table.headers)]
+                    yield from table.add_cells(cells, name)
+
+
+def _sheets(archive: zipfile.ZipFile) -> list[tuple[str, str]]:
+    """(name, part path) of every worksheet, in workbook order."""
+    workbook = etree.fromstring(archive.read("xl/workbook.xml"))
+    rels = etree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{_PKG_REL}Relationship")}
+    sheets = []
+    for sheet in workbook.iter(f"{_S}sheet"):
+        target = targets.get(sheet.get(f"{_REL}id"), "")
+        path = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+        if path in archive.NameToInfo:
+            sheets.append((sheet.get("name", ""), path))
+    return sheets
+
+
+def _shared_strings(archive: zipfile.ZipFile) -> list[str]:
+    if "xl/sharedStrings.xml" not in archive.NameToInfo:
+        return []
+    strings = []
+    with archive.open("xl/sharedStrings.xml") as xml:
+        for _, si in etree.iterparse(xml, tag=f"{_S}si"):
+            # Rich text runs, without the phonetic guides (rPh)
+            strings.append("".join(t.text or "" for t in si.iter(f"{_S}t")
+                                   if t.getparent().tag != f"{_S}rPh"))
+            si.clear()
+    return strings
+
+
+def _row_values(row: etree._Element, shared: list[str]) -> list[str]:
+    values: list[str] = []
+    for cell in row.iterchildren(f"{_S}c"):
+        match = _CELL_REF_RE.match(cell.get("r", ""))
+        column = _column_index(match.group(1)) if match else len(values)
+        values.extend([""] * (column - len(values)))
+        cell_type = cell.get("t")
+        if cell_type == "inlineStr":
+            text = "".join(t.text or "" for t in cell.iter(f"{_S}t"))
+        else:
+            value = cell.findtext(f"{_S}v") or ""
+            if cell_type == "s":
+                text = shared[int(value)] if value.isdigit() and int(value) < len(shared) else ""
+            elif cell_type == "b":
+                text = "SANT" if value == "1" else "FALSKT"
+            elif value.endswith(".0") and value[:-2].lstrip("-").isdigit():
+                text = value[:-2]
+            else:
+                text = value
+        values.append(text.strip())
+    while values and not values[-1]:
+        values.pop()
+    return values
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+# --- PDF ---
+
+# A line this much larger than the page's body text is a heading
+_PDF_HEADING_RATIO = 1.2
+_PDF_HEADING_MAX_CHARS = 120
+# A vertical gap this many times the usual line spacing ends a paragraph
+_PDF_PARAGRAPH_GAP = 1.5
+_SENTENCE_END_RE = re.compile(r"[.!?:;…]$")
+
+
+@register_parser(".pdf")
+def iter_pdf_sections(file_path: str) -> Iterator[dict]:
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise RuntimeError("PDF-stöd kräver paketet pypdf (pip install pypdf).") from e
+
+    heading = None
+    paragraph: list[str] = []
+
+    def flush() -> Iterator[dict]:
+        if paragraph:
+            yield {"type": "paragraph", "text": _join_lines(paragraph), "heading": heading}
+            paragraph.clear()
+
+    for page in PdfReader(file_path).pages:
+        lines = _pdf_lines(page)
+        if not lines:
+            continue
+        body = statistics.mode(size for _, size, _ in lines)
+        gaps = [a[0] - b[0] for a, b in zip(lines, lines[1:]) if a[0] > b[0]]
+        leading = statistics.median(gaps) if gaps else body * 1.2
+
+        # A paragraph continues onto the next page unless its sentence ended
+        if paragraph and _SENTENCE_END_RE.search(paragraph[-1]):
+            yield from flush()
+        previous_y = None
+        for y, size, text in lines:
+            if size >= body * _PDF_HEADING_RATIO and len(text) <= _PDF_HEADING_MAX_CHARS:
+                yield from flush()
+                heading = text
+                yield {"type": "heading", "text": text, "heading": heading}
+            else:
+                if previous_y is not None and previous_y - y > leading * _PDF_PARAGRAPH_GAP:
+                    yield from flush()
+                paragraph.append(text)
+            previous_y = y
+    yield from flush()
+
+
+def _pdf_lines(page) -> list[tuple[float, float, str]]:
+    """(baseline y, font size, text) of each line on the page, top to bottom as drawn."""
+    fragments: list[tuple[float, float, str]] = []
+
+    def visit(text, cm, tm, font_dict, font_size) -> None:
+        if not text or not text.strip():
+            return
+        scale = abs(tm[3] * cm[3]) or 1.0
+        y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+        for part in text.splitlines():
+            if part.strip():
+                fragments.append((y, round(font_size * scale, 1), part))
+
+    page.extract_text(visitor_text=visit)
+
+    lines: list[tuple[float, float, str]] = []
+    for y, size, text in fragments:
+        if lines and abs(lines[-1][0] - y) < size * 0.5:
+            last_y, last_size, last_text = lines[-1]
+            lines[-1] = (last_y, max(last_size, size), f"{last_text} {text}")
+        else:
+            lines.append((y, size, text))
+    return [(y, size, " ".join(text.split())) for y, size, text in lines]
+
+
+def _join_lines(lines: list[str]) -> str:
+    text = lines[0]
+    for line in lines[1:]:
+        # Undo end-of-line hyphenation: "löne-\nspecifikation"
+        if text.endswith("-") and len(text) > 1 and text[-2].isalpha() and line[:1].islower():
+            text = text[:-1] + line
+        else:
+            text = f"{text} {line}"
+    return text
+
@@ -0,0 +1,108 @@
+"""Long-lived, pooled HTTP clients for the OpenAI and Ollama APIs.
+
+Created once in the FastAPI lifespan and shared by embeddings, RAG and the
+API routes, so every question and upload reuses warm keep-alive connections
+instead of paying for a new TCP/TLS handshake.
+
+The ``openai`` package is imported with the first OpenAI client, not at
+startup: it takes about a third of a second, and Ollama-only deployments
+never need it.
+"""
+
+import asyncio
+import logging
+import sys
+from types import ModuleType
+from typing import TYPE_CHECKING
+
+import httpx
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderClients:
+    def __init__(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.http = httpx.AsyncClient(limits=_limits(), timeout=_timeout())
+        self._openai: "AsyncOpenAI | None" = None
+
+    @property
+    def ollama(self) -> httpx.AsyncClient:
+        return self.http
+
+    @property
+    def openai(self) -> "AsyncOpenAI":
+        # Created on first use: the API key may be missing when only Ollama is used
+        if self._openai is None:
+            from openai import AsyncOpenAI
+
+            self._openai = AsyncOpenAI(
+                api_key=settings.openai_api_key,
+                base_url=settings.openai_base_url or None,
+                timeout=_timeout(),
+                http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout()),
+            )
+        return self._openai
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+        if self._openai is not None:
+            await self._openai.close()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout)
+
+
+_clients: ProviderClients | None = None
+
+
+async def start_clients() -> ProviderClients:
+    global _clients
+    if _clients is not None:
+        await _clients.aclose()
+    _clients = ProviderClients()
+    logger.info(
+        "Provider clients started (max %d connections, %d keep-alive)",
+        settings.http_max_connections,
+        settings.http_max_keepalive_connections,
+    )
+    return _clients
+
+
+async def close_clients() -> None:
+    global _clients
+    if _clients is not None:
+        await _clients.aclose()
+        _clients = None
+        logger.info("Provider clients closed")
+
+
+def loaded_openai() -> ModuleType | None:
+    """The ``openai`` package once a client has imported it.
+
+    For error checks: before that, no exception can be an openai error.
+    """
+    return sys.modules.get("openai")
+
+
+def get_clients() -> ProviderClients:
+    global _clients
+    if _clients is None or _clients.loop is not asyncio.get_running_loop():
+        # Outside the app lifespan (scripts, benchmarks): pools are bound to the
+        # loop that created them, so a new asyncio.run() needs fresh ones
+        _clients = ProviderClients()
+    return _clients
@@ -1,13 +1,33 @@
-"""RAG pipeline — retrieval + LLM generation with source references."""
+"""RAG pipeline — retrieval + LLM generation with source references.
 
-import logging
+Requests with a ``conversation_id`` continue a conversation (see
+``app.conversations``): retrieval uses the follow-up rewritten as a
+standalone question, and the LLM gets the summary and last turns between
+the system prompt and the new context.
+"""
 
-import httpx
-from openai import OpenAI
+import asyncio
+import json
+import logging
+import time
+from collections.abc import AsyncIterator
+from typing import TYPE_CHECKING
 
+from app.admission import Priority, admit, chat_provider, get_gate
+from app.answer_cache import AnswerKey, get_answer_cache
 from app.config import settings
-from app.models import ChatRequest, ChatResponse, SourceReference
-from app.vectorstore import search
+from app.context import select_context
+from app.conversations import Complete, History, load_history, remember, standalone_question
+from app.direct_answers import DirectAnswer, find_direct_answer
+from app.embeddings import embed_query
+from app.models import ChatRequest, ChatResponse, GenerationTiming, SourceReference
+from app.providers import get_clients
+from app.telemetry import PROVIDER_FALLBACKS, provider_call, record_usage, span
+from app.tokens import estimate_tokens
+from app.vectorstore import DEFAULT_TENANT, get_corpus_version, search, where_for
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 logger = logging.getLogger(__name__)
 
@@ -27,86 +47,570 @@ FORMAT FÖR SVAR:
 - Om flera källor stödjer svaret, nämn alla"""
 
 
+NO_DOCUMENTS_ANSWER = (
+    "Inga dokument har laddats upp ännu. Ladda upp ett Word-dokument för att börja."
+)
+
+NO_MATCHES_ANSWER = (
+    "Inga avsnitt matchar de valda filtren. Ta bort eller ändra filtren och fråga igen."
+)
+
+
+def _empty_answer(request: ChatRequest) -> str:
+    return NO_MATCHES_ANSWER if where_for(request.filters) else NO_DOCUMENTS_ANSWER
+
+
+def format_source(i: int, src: SourceReference) -> str:
+    section_info = f" | Avsnitt: {src.section}" if src.section else ""
+    text = src.chunk_text
+    if src.section:
+        # The header already names the section; drop the chunker's heading lines
+        text = text.replace(f"[Avsnitt: {src.section}]\n", "")
+    return (
+        f"[Källa {i}] (Fil: {src.source}{section_info} | Relevans: {src.score:.0%})\n"
+        f"{text}\n"
+    )
+
+
 def build_context(sources: list[SourceReference]) -> str:
-    parts = []
-    for i, src in enumerate(sources, 1):
-        section_info = f" | Avsnitt: {src.section}" if src.section else ""
-        parts.append(
-            f"[Källa {i}] (Fil: {src.source}{section_info} | Relevans: {src.score:.0%})\n"
-            f"{src.chunk_text}\n"
+    return "\n---\n".join(format_source(i, src) for i, src in enumerate(sources, 1))
+
+
+def build_user_message(question: str, sources: list[SourceReference]) -> str:
+    context = build_context(sources)
+    return (
+        f"KONTEXT FRÅN DOKUMENT:\n{context}\n\n"
+        f"ANVÄNDARENS FRÅGA:\n{question}"
+    )
+
+
+def check_provider(request: ChatRequest) -> None:
+    """Fail fast on configuration errors before a stream is opened."""
+    if request.provider == "openai":
+        _openai_client()
+    # Streams can't turn into a 429/503 once they have started
+    get_gate(chat_provider(request.provider), "chat").check()
+
+
+def _route(request: ChatRequest) -> ChatRequest:
+    """The request, moved to the other provider while its own circuit is open.
+
+    Sheds it before retrieval when that provider's queue is already full.
+    """
+    provider = chat_provider(request.provider)
+    get_gate(provider, "chat").check()
+    if provider == request.provider:
+        return request
+    PROVIDER_FALLBACKS.labels(request.provider, provider).inc()
+    logger.warning("%s unavailable, answering with %s", request.provider, provider)
+    # The requested model belongs to the other provider
+    return request.model_copy(update={"provider": provider, "model": None})
+
+
+def _model_for(request: ChatRequest) -> str:
+    if request.provider == "openai":
+        return request.model or settings.openai_model
+    return request.model or settings.ollama_model
+
+
+def _answer_key(
+    request: ChatRequest, sources: list[SourceReference], tenant: str
+) -> AnswerKey:
+    chunk_ids = frozenset(s.chunk_id or f"{s.source}#{s.chunk_index}" for s in sources)
+    return (tenant, request.provider, _model_for(request), request.temperature, chunk_ids)
+
+
+async def _retrieve(
+    request: ChatRequest, tenant: str = DEFAULT_TENANT, query: str | None = None
+) -> tuple[list[float], list[SourceReference]]:
+    query = query or request.question
+    with span("embed_query"):
+        query_embedding = await embed_query(query)
+    where = where_for(request.filters)
+    budget = settings.context_token_budget
+    if not budget:
+        sources = await search(
+            query,
+            top_k=request.top_k,
+            query_embedding=query_embedding,
+            where=where,
+            tenant=tenant,
+        )
+        return query_embedding, sources
+
+    # Over-fetch so chunks dropped as duplicates are replaced by distinct ones
+    candidates = await search(
+        query,
+        top_k=request.top_k + settings.context_overfetch,
+        query_embedding=query_embedding,
+        where=where,
+        tenant=tenant,
+    )
+    with span("select_context"):
+        sources = select_context(candidates, request.top_k, budget, format_source)
+    logger.info(
+        "Context: %d sources from %d retrieved chunks (budget %d tokens)",
+        len(sources), len(candidates), budget,
+    )
+    return query_embedding, sources
+
+
+async def _direct_answer(request: ChatRequest, tenant: str) -> DirectAnswer | None:
+    if not settings.direct_answers_enabled:
+        return None
+    # In a thread: reads the catalog, and rebuilds the index after an upload
+    with span("direct_answer"):
+        return await asyncio.to_thread(
+            find_direct_answer, request.question, tenant, request.filters
         )
-    return "\n---\n".join(parts)
 
 
-async def generate_response(request: ChatRequest) -> ChatResponse:
+async def _history(request: ChatRequest, tenant: str) -> History | None:
+    if not request.conversation_id:
+        return None
+    return await asyncio.to_thread(load_history, tenant, request.conversation_id)
+
+
+async def _query(request: ChatRequest, history: History | None) -> str:
+    """What to retrieve with: the question, or the follow-up made standalone."""
+    if history is None:
+        return request.question
+    return await standalone_question(request.question, history, _completer(request))
+
+
+async def _remember(
+    request: ChatRequest, tenant: str, history: History | None, answer: str
+) -> None:
+    if history is not None:
+        # The summary is written after the answer has been sent; questions go first
+        completer = _completer(request, Priority.BACKGROUND)
+        await remember(tenant, history, request.question, answer, completer)
+
+
+def _completer(request: ChatRequest, priority: Priority = Priority.INTERACTIVE) -> Complete:
+    """Short deterministic completions (rewrites, summaries) with the request's model."""
+
+    async def complete(messages: list[dict], max_tokens: int) -> str:
+        call = _call_openai if request.provider == "openai" else _call_ollama
+        answer, _ = await call(
+            messages,
+            request,
+            max_tokens=max_tokens,
+            temperature=0.0,
+            operation="conversation",
+            priority=priority,
+        )
+        return answer
+
+    return complete
+
+
+def _answer_cache(history: History | None):
+    # An answer to a follow-up depends on the turns before it
+    if history is not None and (history.turns or history.summary):
+        return None
+    return get_answer_cache()
+
+
+def _conversation_fields(
+    request: ChatRequest, query: str | None = None
+) -> dict[str, str | None]:
+    return {
+        "conversation_id": request.conversation_id,
+        "standalone_question": query if query and query != request.question else None,
+    }
+
+
+def _prompt_tokens(messages: list[dict]) -> int:
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+
+async def generate_response(
+    request: ChatRequest, tenant: str = DEFAULT_TENANT
+) -> ChatResponse:
+    started = time.perf_counter()
+    history = await _history(request, tenant)
+
+    direct = await _direct_answer(request, tenant)
+    if direct:
+        finished = time.perf_counter()
+        timing = GenerationTiming(
+            retrieval_ms=_ms(started, finished),
+            time_to_first_token_ms=_ms(started, finished),
+            generation_ms=0.0,
+            total_ms=_ms(started, finished),
+        )
+        _log_timing("direct", timing, streamed=False)
+        await _remember(request, tenant, history, direct.answer)
+        return ChatResponse(
+            answer=direct.answer,
+            sources=[direct.source],
+            model_used="direct",
+            timing=timing,
+            prompt_tokens=0,
+            direct=True,
+            **_conversation_fields(request),
+        )
+
+    request = _route(request)
     # Retrieve relevant chunks
-    sources = search(request.question, top_k=request.top_k)
+    query = await _query(request, history)
+    query_embedding, sources = await _retrieve(request, tenant, query)
+    retrieved = time.perf_counter()
 
     if not sources:
         return ChatResponse(
-            answer="Inga dokument har laddats upp ännu. Ladda upp ett Word-dokument för att börja.",
+            answer=_empty_answer(request),
             sources=[],
             model_used="none",
+            **_conversation_fields(request, query),
         )
 
-    context = build_context(sources)
+    cache = _answer_cache(history)
+    key = _answer_key(request, sources, tenant)
+    corpus_version = await get_corpus_version(tenant)
+    if cache:
+        with span("answer_cache"):
+            cached = cache.lookup(query_embedding, key, corpus_version)
+        if cached:
+            finished = time.perf_counter()
+            timing = GenerationTiming(
+                retrieval_ms=_ms(started, retrieved),
+                time_to_first_token_ms=_ms(started, finished),
+                generation_ms=0.0,
+                total_ms=_ms(started, finished),
+            )
+            _log_timing(cached.model_used, timing, streamed=False, cached=True)
+            await _remember(request, tenant, history, cached.answer)
+            return ChatResponse(
+                answer=cached.answer,
+                sources=sources,
+                model_used=cached.model_used,
+                timing=timing,
+                prompt_tokens=0,
+                cached=True,
+                **_conversation_fields(request, query),
+            )
 
-    user_message = (
-        f"KONTEXT FRÅN DOKUMENT:\n{context}\n\n"
-        f"ANVÄNDARENS FRÅGA:\n{request.question}"
+    messages = _messages(build_user_message(request.question, sources), history)
+    prompt_tokens = _prompt_tokens(messages)
+
+    usage: dict[str, int] = {}
+    if request.provider == "openai":
+        answer, model_used = await _call_openai(messages, request, usage=usage)
+    elif request.provider == "ollama":
+        answer, model_used = await _call_ollama(messages, request)
+    else:
+        raise ValueError(f"Okänd leverantör: {request.provider}")
+
+    # Without streaming the first token reaches the user with the last one
+    finished = time.perf_counter()
+    timing = GenerationTiming(
+        retrieval_ms=_ms(started, retrieved),
+        time_to_first_token_ms=_ms(started, finished),
+        generation_ms=_ms(retrieved, finished),
+        total_ms=_ms(started, finished),
     )
+    _log_timing(model_used, timing, streamed=False, prompt_tokens=prompt_tokens)
+
+    response = ChatResponse(
+        answer=answer,
+        sources=sources,
+        model_used=model_used,
+        timing=timing,
+        prompt_tokens=prompt_tokens,
+        cached_prompt_tokens=usage.get("cached_prompt_tokens"),
+        **_conversation_fields(request, query),
+    )
+    if cache:
+        cache.store(query_embedding, key, response, timing.generation_ms, corpus_version)
+    await _remember(request, tenant, history, answer)
+    return response
+
 
+async def stream_response(
+    request: ChatRequest, tenant: str = DEFAULT_TENANT
+) -> AsyncIterator[tuple[str, dict]]:
+    """Yield ``(event, payload)`` pairs: ``sources`` first, then ``token``s, then ``done``."""
+    started = time.perf_counter()
+    history = await _history(request, tenant)
+
+    direct = await _direct_answer(request, tenant)
+    if direct:
+        yield "sources", {"sources": [direct.source.model_dump()]}
+        yield "token", {"text": direct.answer}
+        finished = time.perf_counter()
+        timing = GenerationTiming(
+            retrieval_ms=_ms(started, finished),
+            time_to_first_token_ms=_ms(started, finished),
+            generation_ms=0.0,
+            total_ms=_ms(started, finished),
+        )
+        _log_timing("direct", timing, streamed=True)
+        await _remember(request, tenant, history, direct.answer)
+        yield "done", {
+            "model_used": "direct",
+            "timing": timing.model_dump(),
+            "prompt_tokens": 0,
+            "cached": False,
+            "direct": True,
+            **_conversation_fields(request),
+        }
+        return
+
+    request = _route(request)
+    query = await _query(request, history)
+    query_embedding, sources = await _retrieve(request, tenant, query)
+    retrieved = time.perf_counter()
+
+    yield "sources", {"sources": [s.model_dump() for s in sources]}
+
+    if not sources:
+        yield "token", {"text": _empty_answer(request)}
+        yield "done", {"model_used": "none", "timing": None, **_conversation_fields(request, query)}
+        return
+
+    cache = _answer_cache(history)
+    key = _answer_key(request, sources, tenant)
+    corpus_version = await get_corpus_version(tenant)
+    if cache:
+        with span("answer_cache"):
+            cached = cache.lookup(query_embedding, key, corpus_version)
+        if cached:
+            yield "token", {"text": cached.answer}
+            finished = time.perf_counter()
+            timing = GenerationTiming(
+                retrieval_ms=_ms(started, retrieved),
+                time_to_first_token_ms=_ms(started, finished),
+                generation_ms=0.0,
+                total_ms=_ms(started, finished),
+            )
+            _log_timing(cached.model_used, timing, streamed=True, cached=True)
+            await _remember(request, tenant, history, cached.answer)
+            yield "done", {
+                "model_used": cached.model_used,
+                "timing": timing.model_dump(),
+                "prompt_tokens": 0,
+                "cached": True,
+                **_conversation_fields(request, query),
+            }
+            return
+
+    messages = _messages(build_user_message(request.question, sources), history)
+    prompt_tokens = _prompt_tokens(messages)
+
+    model_used = _model_for(request)
+    usage: dict[str, int] = {}
     if request.provider == "openai":
-        answer, model_used = await _call_openai(user_message, request)
+        tokens = _stream_openai(messages, request, usage)
     elif request.provider == "ollama":
-        answer, model_used = await _call_ollama(user_message, request)
+        tokens = _stream_ollama(messages, request)
     else:
         raise ValueError(f"Okänd leverantör: {request.provider}")
 
-    return ChatResponse(answer=answer, sources=sources, model_used=model_used)
+    parts: list[str] = []
+    first_token: float | None = None
+    async for text in tokens:
+        if first_token is None:
+            first_token = time.perf_counter()
+        parts.append(text)
+        yield "token", {"text": text}
+
+    finished = time.perf_counter()
+    timing = GenerationTiming(
+        retrieval_ms=_ms(started, retrieved),
+        time_to_first_token_ms=_ms(started, first_token or finished),
+        generation_ms=_ms(retrieved, finished),
+        total_ms=_ms(started, finished),
+    )
+    _log_timing(model_used, timing, streamed=True, prompt_tokens=prompt_tokens)
 
+    answer = "".join(parts)
+    if cache:
+        response = ChatResponse(
+            answer=answer,
+            sources=sources,
+            model_used=model_used,
+            timing=timing,
+            prompt_tokens=prompt_tokens,
+        )
+        cache.store(query_embedding, key, response, timing.generation_ms, corpus_version)
+    await _remember(request, tenant, history, answer)
+
+    yield "done", {
+        "model_used": model_used,
+        "timing": timing.model_dump(),
+        "prompt_tokens": prompt_tokens,
+        "cached": False,
+        "cached_prompt_tokens": usage.get("cached_prompt_tokens"),
+        **_conversation_fields(request, query),
+    }
 
-async def _call_openai(user_message: str, request: ChatRequest) -> tuple[str, str]:
+
+def _ms(start: float, end: float) -> float:
+    return round((end - start) * 1000, 1)
+
+
+def _log_timing(
+    model: str,
+    timing: GenerationTiming,
+    streamed: bool,
+    cached: bool = False,
+    prompt_tokens: int = 0,
+) -> None:
+    logger.info(
+        "Chat %s (%s%s): ~%d prompt tokens, retrieval %.0f ms, first token %.0f ms, "
+        "generation %.0f ms, total %.0f ms",
+        model,
+        "stream" if streamed else "blocking",
+        ", cached" if cached else "",
+        prompt_tokens,
+        timing.retrieval_ms,
+        timing.time_to_first_token_ms,
+        timing.generation_ms,
+        timing.total_ms,
+    )
+
+
+def _messages(user_message: str, history: History | None = None) -> list[dict]:
+    # Stable prefix first, so provider prompt caches serve it on every follow-up
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        *(history.messages() if history else []),
+        {"role": "user", "content": user_message},
+    ]
+
+
+def _openai_client() -> "AsyncOpenAI":
     if not settings.openai_api_key:
         raise ValueError(
             "OpenAI API-nyckel saknas. Ange OPENAI_API_KEY i .env-filen eller välj Ollama."
         )
+    return get_clients().openai
+
+
+def _record_openai_usage(usage, operation: str, out: dict[str, int] | None) -> None:
+    # Prompt-cache hits are reported as part of the prompt tokens
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None)
+    record_usage("openai", operation, usage.prompt_tokens, usage.completion_tokens, cached)
+    if out is not None and cached is not None:
+        out["cached_prompt_tokens"] = cached
+
 
+async def _call_openai(
+    messages: list[dict],
+    request: ChatRequest,
+    usage: dict[str, int] | None = None,
+    max_tokens: int = 2000,
+    temperature: float | None = None,
+    operation: str = "chat",
+    priority: Priority = Priority.INTERACTIVE,
+) -> tuple[str, str]:
     model = request.model or settings.openai_model
-    client = OpenAI(api_key=settings.openai_api_key)
-
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_message},
-        ],
-        temperature=request.temperature,
-        max_tokens=2000,
-    )
+
+    client = _openai_client()
+    async with admit("openai", "chat", priority):
+        with provider_call("openai", operation):
+            response = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=request.temperature if temperature is None else temperature,
+                max_tokens=max_tokens,
+            )
+    if response.usage:
+        _record_openai_usage(response.usage, operation, usage)
 
     return response.choices[0].message.content, model
 
 
-async def _call_ollama(user_message: str, request: ChatRequest) -> tuple[str, str]:
-    model = request.model or settings.ollama_model
-    url = f"{settings.ollama_base_url}/api/chat"
+async def _stream_openai(
+    messages: list[dict], request: ChatRequest, usage: dict[str, int] | None = None
+) -> AsyncIterator[str]:
+    model = request.model or settings.openai_model
+
+    client = _openai_client()
+    # The slot is held until the last token
+    async with admit("openai", "chat"):
+        with provider_call("openai", "chat"):
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=request.temperature,
+                max_tokens=2000,
+                stream=True,
+                # Usage arrives in a final chunk without choices
+                stream_options={"include_usage": True},
+            )
+            async for chunk in stream:
+                if chunk.usage:
+                    _record_openai_usage(chunk.usage, "chat", usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
 
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": user_message},
-        ],
-        "stream": False,
-        "options": {
-            "temperature": request.temperature,
-        },
+def _ollama_payload(
+    messages: list[dict],
+    request: ChatRequest,
+    stream: bool,
+    max_tokens: int | None = None,
+    temperature: float | None = None,
+) -> dict:
+    options: dict = {
+        "temperature": request.temperature if temperature is None else temperature,
+    }
+    if max_tokens:
+        options["num_predict"] = max_tokens
+    return {
+        "model": request.model or settings.ollama_model,
+        "messages": messages,
+        "stream": stream,
+        "options": options,
     }
 
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        response = await client.post(url, json=payload)
-        response.raise_for_status()
-        data = response.json()
+
+async def _call_ollama(
+    messages: list[dict],
+    request: ChatRequest,
+    max_tokens: int | None = None,
+    temperature: float | None = None,
+    operation: str = "chat",
+    priority: Priority = Priority.INTERACTIVE,
+) -> tuple[str, str]:
+    # Ollama reuses its KV cache for a repeated prefix but does not report it
+    model = request.model or settings.ollama_model
+    url = f"{settings.ollama_base_url}/api/chat"
+    payload = _ollama_payload(messages, request, False, max_tokens, temperature)
+
+    async with admit("ollama", "chat", priority):
+        with provider_call("ollama", operation):
+            response = await get_clients().ollama.post(url, json=payload)
+            response.raise_for_status()
+    data = response.json()
+    record_usage("ollama", operation, data.get("prompt_eval_count"), data.get("eval_count"))
 
     return data["message"]["content"], model
+
+
+async def _stream_ollama(messages: list[dict], request: ChatRequest) -> AsyncIterator[str]:
+    url = f"{settings.ollama_base_url}/api/chat"
+    payload = _ollama_payload(messages, request, stream=True)
+
+    # Ollama streams newline-delimited JSON objects; the last one carries the usage
+    async with admit("ollama", "chat"):
+        with provider_call("ollama", "chat"):
+            async with get_clients().ollama.stream("POST", url, json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    content = data.get("message", {}).get("content")
+                    if content:
+                        yield content
+                    if data.get("done"):
+                        record_usage(
+                            "ollama", "chat",
+                            data.get("prompt_eval_count"), data.get("eval_count"),
+                        )
+                        break
@@ -0,0 +1,216 @@
+"""Index snapshots: a tenant's indexed documents in one file, for hosts without a persistent disk.
+
+On a host whose disk starts empty at every deploy or restart (Render's free
+plan), every document would otherwise be parsed and embedded again before
+the first answer. A snapshot is a zip archive of what that produces:
+
+- ``manifest.json``: format, embedding provider, model and dimensions,
+  metadata version, vector dimension and chunk count;
+- ``documents.json``: the catalog's ready documents with their chunk ids
+  and direct-answer entries;
+- ``chunks.jsonl``: id, text and metadata of every chunk, in vector order;
+- ``vectors.f16``: the unit-normalized embeddings as little-endian
+  float16, half the size of float32 at no measurable cost in ranking;
+- ``lexical.npz``: the BM25 index, when hybrid search is on.
+
+``SNAPSHOT_URL`` (a path, or an http(s) URL of an object store) is restored
+at startup when the tenant has no documents; a tenant that has some is
+left alone. Snapshots are made with the same embedding model they are
+restored under, which the manifest is checked against.
+
+    cd backend
+    python -m app.snapshot export snapshot.zip
+    python -m app.snapshot restore https://bucket.example.com/snapshot.zip
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from collections.abc import Iterator
+
+import httpx
+import numpy as np
+
+from app.catalog import get_catalog
+from app.config import settings
+from app.vectorstore import (
+    DEFAULT_TENANT,
+    METADATA_VERSION,
+    RowBatch,
+    export_rows,
+    lexical_index_path,
+    restore_index,
+)
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 1
+_BATCH = 1000
+_VECTOR_DTYPE = np.dtype("<f2")
+
+
+def _embedding_model() -> str:
+    if settings.embedding_provider == "openai":
+        return settings.openai_embedding_model
+    return settings.ollama_embedding_model
+
+
+def export_snapshot(path: str, tenant: str = DEFAULT_TENANT) -> int:
+    """Write the tenant's ready documents to ``path``; returns the number of chunks."""
+    registry = get_catalog().export_registry(tenant)
+    ids = [chunk_id for chunk_ids in registry["chunks"].values() for chunk_id in chunk_ids]
+    count, dim = 0, 0
+    tmp = path + ".tmp"
+    with (
+        zipfile.ZipFile(tmp, "w") as archive,
+        # A zip takes one member at a time; the texts are spooled and added after
+        tempfile.TemporaryFile() as chunks,
+    ):
+        # Stored, not deflated: float16 noise does not compress
+        with archive.open(zipfile.ZipInfo("vectors.f16"), "w", force_zip64=True) as vectors:
+            for rows in export_rows(tenant, ids, _BATCH):
+                if not rows:
+                    continue
+                matrix = np.asarray([emb for _, _, _, emb in rows], dtype=np.float32)
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                dim = matrix.shape[1]
+                vectors.write(matrix.astype(_VECTOR_DTYPE).tobytes())
+                for chunk_id, text, meta, _ in rows:
+                    line = {"id": chunk_id, "text": text, "metadata": meta}
+                    chunks.write(json.dumps(line, ensure_ascii=False).encode() + b"\n")
+                count += len(rows)
+        chunks.seek(0)
+        info = zipfile.ZipInfo("chunks.jsonl")
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, "w", force_zip64=True) as member:
+            shutil.copyfileobj(chunks, member)
+        archive.writestr(
+            "documents.json", json.dumps(registry, ensure_ascii=False), zipfile.ZIP_DEFLATED
+        )
+        lexical = lexical_index_path(tenant)
+        if settings.hybrid_search and os.path.exists(lexical):
+            archive.write(lexical, "lexical.npz")
+        manifest = {
+            "format": FORMAT,
+            "tenant": tenant,
+            "embedding_provider": settings.embedding_provider,
+            "embedding_model": _embedding_model(),
+            "embedding_dimensions": settings.embedding_dimensions,
+            "metadata_version": METADATA_VERSION,
+            "dim": dim,
+            "count": count,
+            "created_at": time.time(),
+        }
+        archive.writestr("manifest.json", json.dumps(manifest, indent=2))
+    os.replace(tmp, path)
+    logger.info("Exported %d chunks of tenant %s to %s", count, tenant, path)
+    return count
+
+
+async def restore_snapshot(source: str, tenant: str = DEFAULT_TENANT) -> int | None:
+    """Load a snapshot from a path or an http(s) URL into an empty tenant.
+
+    Returns the number of chunks restored, or None if the tenant already has
+    documents. Raises ``ValueError`` if the snapshot was made with another
+    embedding model or metadata version.
+    """
+    started = time.perf_counter()
+    downloaded = None
+    if source.startswith(("http://", "https://")):
+        downloaded = await asyncio.to_thread(_download, source)
+    try:
+        with zipfile.ZipFile(downloaded or source) as archive:
+            manifest = json.loads(archive.read("manifest.json"))
+            _check(manifest)
+            registry = json.loads(archive.read("documents.json"))
+            with tempfile.TemporaryDirectory() as workdir:
+                lexical = None
+                if settings.hybrid_search and "lexical.npz" in archive.namelist():
+                    lexical = archive.extract("lexical.npz", workdir)
+                count = await restore_index(
+                    tenant, _batches(archive, manifest["dim"]), registry, lexical
+                )
+    finally:
+        if downloaded:
+            os.unlink(downloaded)
+    if count is not None:
+        logger.info(
+            "Restored %d chunks of tenant %s from %s in %.2f s",
+            count, tenant, source, time.perf_counter() - started,
+        )
+    return count
+
+
+def _check(manifest: dict) -> None:
+    expected = {
+        "format": FORMAT,
+        "embedding_provider": settings.embedding_provider,
+        "embedding_model": _embedding_model(),
+        "embedding_dimensions": settings.embedding_dimensions,
+        "metadata_version": METADATA_VERSION,
+    }
+    for key, value in expected.items():
+        if manifest.get(key) != value:
+            raise ValueError(
+                f"Snapshot has {key}={manifest.get(key)!r}, this server {value!r}"
+            )
+
+
+def _batches(archive: zipfile.ZipFile, dim: int) -> Iterator[RowBatch]:
+    row_bytes = dim * _VECTOR_DTYPE.itemsize
+    with archive.open("chunks.jsonl") as chunks, archive.open("vectors.f16") as vectors:
+        while True:
+            rows = [json.loads(line) for _, line in zip(range(_BATCH), chunks)]
+            if not rows:
+                return
+            data = vectors.read(row_bytes * len(rows))
+            matrix = np.frombuffer(data, dtype=_VECTOR_DTYPE).reshape(len(rows), dim)
+            yield (
+                [row["id"] for row in rows],
+                [row["text"] for row in rows],
+                matrix.astype(np.float32),
+                [row["metadata"] for row in rows],
+            )
+
+
+def _download(url: str) -> str:
+    fd, path = tempfile.mkstemp(suffix=".zip")
+    try:
+        with os.fdopen(fd, "wb") as f, httpx.stream("GET", url, timeout=60.0) as response:
+            response.raise_for_status()
+            for block in response.iter_bytes(1 << 20):
+                f.write(block)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write a tenant's index to a snapshot file")
+    export.add_argument("path")
+    export.add_argument("--tenant", default=DEFAULT_TENANT)
+    restore = commands.add_parser("restore", help="load a snapshot into an empty tenant")
+    restore.add_argument("source", help="path or http(s) URL")
+    restore.add_argument("--tenant", default=DEFAULT_TENANT)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "export":
+        export_snapshot(args.path, args.tenant)
+    else:
+        count = asyncio.run(restore_snapshot(args.source, args.tenant))
+        if count is None:
+            parser.exit(1, f"Tenant {args.tenant} already has documents; nothing restored\n")
+
+
+if __name__ == "__main__":
+    main()
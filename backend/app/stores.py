@@ -0,0 +1,569 @@
+"""Vector store backends behind one small interface.
+
+``vectorstore.py`` owns ids, batching, incremental indexing and the corpus
+version; a backend only stores ``(id, text, embedding, metadata)`` rows and
+answers nearest-neighbour queries. All methods are synchronous and are
+called from worker threads.
+
+- ``ChromaStore``: ChromaDB PersistentClient with an HNSW index, or a
+  Chroma server when several processes share the store
+- ``NumpyStore``: normalized float32 matrix in a memory-mapped file, exact
+  top-k with one matrix-vector product and ``argpartition``; fast and
+  small for corpora up to a few hundred thousand chunks. Optionally
+  searches int8 or sign-bit codes first and reranks the best candidates
+  with the float32 rows, so only the codes need to stay in memory
+
+Both accept the same metadata filter syntax (a subset of Chroma's
+``where``): ``{"field": value}``, ``{"field": {"$eq" | "$ne" | "$in" |
+"$nin": ...}}`` and ``{"$and" | "$or": [filter, ...]}``.
+"""
+
+import json
+import logging
+import mmap
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Any
+from urllib.parse import urlsplit
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Where = dict[str, Any]
+# (id, text, metadata, cosine similarity)
+Hit = tuple[str, str, dict, float]
+
+
+class VectorStore(ABC):
+    name: str
+
+    @abstractmethod
+    def count(self) -> int: ...
+
+    @abstractmethod
+    def get_metadata(self, where: Where) -> dict[str, dict]:
+        """Metadata of every row matching ``where``, keyed by id."""
+
+    @abstractmethod
+    def get(self, ids: list[str]) -> list[tuple[str, str, dict, list[float]]]:
+        """``(id, text, metadata, embedding)`` for the ids that exist, in input order."""
+
+    @abstractmethod
+    def upsert(
+        self,
+        ids: list[str],
+        texts: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict],
+    ) -> None: ...
+
+    @abstractmethod
+    def update_metadata(self, ids: list[str], metadatas: list[dict]) -> None: ...
+
+    @abstractmethod
+    def delete(self, ids: list[str]) -> None: ...
+
+    @abstractmethod
+    def query(self, embedding: list[float], top_k: int, where: Where | None = None) -> list[Hit]:
+        """Best ``top_k`` rows by cosine similarity, best first."""
+
+    @abstractmethod
+    def clear(self) -> None: ...
+
+    def flush(self) -> None:
+        """Persist pending writes (no-op for backends that write through)."""
+
+
+# --- Chroma ---
+
+
+class ChromaStore(VectorStore):
+    name = "chroma"
+    COLLECTION_NAME = "documents"
+
+    def __init__(
+        self, persist_dir: str, collection_name: str = COLLECTION_NAME, server_url: str = ""
+    ) -> None:
+        import chromadb
+
+        if server_url:
+            url = urlsplit(server_url)
+            self._client = chromadb.HttpClient(
+                host=url.hostname,
+                port=url.port or (443 if url.scheme == "https" else 8000),
+                ssl=url.scheme == "https",
+            )
+        else:
+            # Embedded: the HNSW index lives in this process and does not see
+            # other processes' writes
+            self._client = chromadb.PersistentClient(path=persist_dir)
+        self.collection_name = collection_name
+        self._collection = None
+        # Only one worker thread may create the collection
+        self._lock = threading.Lock()
+
+    def _get_collection(self):
+        with self._lock:
+            if self._collection is None:
+                self._collection = self._client.get_or_create_collection(
+                    name=self.collection_name,
+                    metadata={"hnsw:space": "cosine"},
+                )
+            return self._collection
+
+    def count(self) -> int:
+        return self._get_collection().count()
+
+    def get_metadata(self, where: Where) -> dict[str, dict]:
+        found = self._get_collection().get(where=_chroma_where(where), include=["metadatas"])
+        return dict(zip(found["ids"], found["metadatas"]))
+
+    def get(self, ids) -> list[tuple[str, str, dict, list[float]]]:
+        if not ids:
+            return []
+        found = self._get_collection().get(
+            ids=ids, include=["documents", "metadatas", "embeddings"]
+        )
+        by_id = {
+            chunk_id: (chunk_id, doc, meta, list(embedding))
+            for chunk_id, doc, meta, embedding in zip(
+                found["ids"], found["documents"], found["metadatas"], found["embeddings"]
+            )
+        }
+        return [by_id[i] for i in ids if i in by_id]
+
+    def upsert(self, ids, texts, embeddings, metadatas) -> None:
+        collection = self._get_collection()
+
+        # Add in batches
+        batch_size = 100
+        for i in range(0, len(ids), batch_size):
+            end = min(i + batch_size, len(ids))
+            collection.upsert(
+                ids=ids[i:end],
+                documents=texts[i:end],
+                embeddings=embeddings[i:end],
+                metadatas=metadatas[i:end],
+            )
+
+    def update_metadata(self, ids, metadatas) -> None:
+        collection = self._get_collection()
+        batch_size = 500
+        for i in range(0, len(ids), batch_size):
+            collection.update(ids=ids[i : i + batch_size], metadatas=metadatas[i : i + batch_size])
+
+    def delete(self, ids) -> None:
+        collection = self._get_collection()
+        batch_size = 500
+        for i in range(0, len(ids), batch_size):
+            collection.delete(ids=ids[i : i + batch_size])
+
+    def query(self, embedding, top_k, where=None) -> list[Hit]:
+        # Callers cap top_k at count(); Chroma would clamp it too, with a warning
+        results = self._get_collection().query(
+            query_embeddings=[embedding],
+            n_results=top_k,
+            where=_chroma_where(where),
+            include=["documents", "metadatas", "distances"],
+        )
+        if not results or not results["documents"]:
+            return []
+        # Cosine distance → similarity
+        return [
+            (chunk_id, doc, meta, 1.0 - distance)
+            for chunk_id, doc, meta, distance in zip(
+                results["ids"][0],
+                results["documents"][0],
+                results["metadatas"][0],
+                results["distances"][0],
+            )
+        ]
+
+    def clear(self) -> None:
+        with self._lock:
+            try:
+                self._client.delete_collection(self.collection_name)
+            except Exception:
+                pass
+            self._collection = None
+
+
+def _chroma_where(where: Where | None) -> Where | None:
+    # Chroma wants exactly one top-level key; several fields mean "all of them"
+    if not where:
+        return None
+    if len(where) == 1:
+        return where
+    return {"$and": [{key: cond} for key, cond in where.items()]}
+
+
+# --- NumPy ---
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+# Codes scored per step of the quantized pass: small enough that the
+# float32 temporaries stay in cache, which keeps int8 as fast as float32
+_SCORE_BLOCK_ITEMS = 1 << 17
+# Rows encoded per step when the codes are rebuilt
+_ENCODE_ROWS = 4096
+
+
+def _open_map(path: str, dtype: Any, capacity: int, width: int = 0) -> np.memmap:
+    """Map ``path`` as ``capacity`` rows (of ``width`` items), growing the file in place."""
+    itemsize = np.dtype(dtype).itemsize
+    with open(path, "ab") as f:
+        if f.tell() < capacity * max(width, 1) * itemsize:
+            f.truncate(capacity * max(width, 1) * itemsize)
+    shape = (capacity, width) if width else (capacity,)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+
+class NumpyStore(VectorStore):
+    """Exact cosine search over a memory-mapped, L2-normalized float32 matrix.
+
+    Files in ``directory``: ``vectors.f32`` (capacity × dim, grown by
+    doubling) and ``rows.json`` (dim, ids, texts, metadatas). Vector
+    writes go straight to the map; ``flush()`` persists the rows file.
+    Deletes move the last row into the hole so the live rows stay dense.
+
+    With ``quantization`` "int8" (one byte per dimension and a scale per
+    row) or "binary" (one sign bit per dimension) a query first scores
+    those codes, kept in ``codes.<quantization>``, then ranks the best
+    ``top_k × rerank_factor`` rows by their exact cosine. Scores returned
+    are always exact. Codes are rebuilt from the vectors when missing.
+    """
+
+    name = "numpy"
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, directory: str, quantization: str = "none", rerank_factor: int = 4) -> None:
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(
+                f"Unknown vector quantization: {quantization} "
+                f"(expected one of {', '.join(QUANTIZATIONS)})"
+            )
+        self._dir = directory
+        self._quantization = quantization
+        self._rerank_factor = max(rerank_factor, 1)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._codes_path = os.path.join(directory, f"codes.{quantization}")
+        self._scales_path = os.path.join(directory, "scales.f32")
+        self._rows_path = os.path.join(directory, "rows.json")
+        self._lock = threading.RLock()
+        self._ids: list[str] = []
+        self._texts: list[str] = []
+        self._metadatas: list[dict] = []
+        self._row_of: dict[str, int] = {}
+        self._dim = 0
+        self._vectors: np.memmap | None = None
+        # Quantized copy of the vectors (scales only for int8)
+        self._codes: np.memmap | None = None
+        self._scales: np.memmap | None = None
+        # Metadata columns as integer codes for vectorized filters, rebuilt lazily
+        self._columns: dict[str, tuple[np.ndarray, dict[Any, int]]] = {}
+        self._dirty = False
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # -- persistence --
+
+    def _load(self) -> None:
+        if not os.path.exists(self._rows_path):
+            return
+        with open(self._rows_path, encoding="utf-8") as f:
+            rows = json.load(f)
+        self._ids, self._texts, self._metadatas = rows["ids"], rows["texts"], rows["metadatas"]
+        self._dim = rows["dim"]
+        self._row_of = {chunk_id: i for i, chunk_id in enumerate(self._ids)}
+        if self._dim:
+            capacity = os.path.getsize(self._vectors_path) // (4 * self._dim)
+            self._open_maps(capacity)
+            if self._quantization != "none" and rows.get("quantization") != self._quantization:
+                logger.info(
+                    "Building %s codes for %d vectors in %s",
+                    self._quantization, len(self._ids), self._dir,
+                )
+                for start in range(0, len(self._ids), _ENCODE_ROWS):
+                    end = min(start + _ENCODE_ROWS, len(self._ids))
+                    self._encode(np.arange(start, end), np.asarray(self._vectors[start:end]))
+                self._dirty = True
+        logger.info("Loaded %d vectors (dim %d) from %s", len(self._ids), self._dim, self._dir)
+
+    def _open_maps(self, capacity: int) -> None:
+        self._vectors = _open_map(self._vectors_path, np.float32, capacity, self._dim)
+        if self._quantization != "none" and hasattr(mmap, "MADV_RANDOM"):
+            # Reranking reads a few scattered rows; readahead would page in their neighbours
+            self._vectors._mmap.madvise(mmap.MADV_RANDOM)
+        if self._quantization == "int8":
+            self._codes = _open_map(self._codes_path, np.int8, capacity, self._dim)
+            self._scales = _open_map(self._scales_path, np.float32, capacity)
+        elif self._quantization == "binary":
+            self._codes = _open_map(self._codes_path, np.uint8, capacity, (self._dim + 7) // 8)
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            for mapped in (self._vectors, self._codes, self._scales):
+                if mapped is not None:
+                    mapped.flush()
+            tmp = self._rows_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "dim": self._dim,
+                        "quantization": self._quantization,
+                        "ids": self._ids,
+                        "texts": self._texts,
+                        "metadatas": self._metadatas,
+                    },
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp, self._rows_path)
+            self._dirty = False
+
+    def _ensure_capacity(self, rows: int) -> None:
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(self.INITIAL_CAPACITY, capacity)
+        while new_capacity < rows:
+            new_capacity *= 2
+        for mapped in (self._vectors, self._codes, self._scales):
+            if mapped is not None:
+                mapped.flush()
+        self._vectors = self._codes = self._scales = None
+        # Growing the files keeps existing rows in place — no copy
+        self._open_maps(new_capacity)
+
+    def _encode(self, rows: np.ndarray, matrix: np.ndarray) -> None:
+        if self._quantization == "int8":
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._codes[rows] = np.rint(matrix / scales[:, None]).astype(np.int8)
+            self._scales[rows] = scales
+        elif self._quantization == "binary":
+            self._codes[rows] = np.packbits(matrix > 0, axis=1)
+
+    # -- reads --
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def get_metadata(self, where: Where) -> dict[str, dict]:
+        with self._lock:
+            rows = np.flatnonzero(self._mask(where))
+            return {self._ids[i]: self._metadatas[i] for i in rows}
+
+    def get(self, ids) -> list[tuple[str, str, dict, list[float]]]:
+        with self._lock:
+            rows = [self._row_of[i] for i in ids if i in self._row_of]
+            return [
+                (self._ids[r], self._texts[r], self._metadatas[r], self._vectors[r].tolist())
+                for r in rows
+            ]
+
+    def query(self, embedding, top_k, where=None) -> list[Hit]:
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query /= norm
+
+        with self._lock:
+            n = len(self._ids)
+            if n == 0 or top_k <= 0:
+                return []
+            if query.shape[0] != self._dim:
+                raise ValueError(
+                    f"Query has dimension {query.shape[0]}, index has {self._dim}"
+                )
+
+            if where:
+                rows = np.flatnonzero(self._mask(where))
+                if rows.size == 0:
+                    return []
+            else:
+                rows = None
+
+            depth = top_k * self._rerank_factor
+            if self._codes is not None and depth < (n if rows is None else rows.size):
+                approximate = self._approximate_scores(query, rows, n)
+                candidates = np.argpartition(-approximate, depth - 1)[:depth]
+                rows = np.sort(candidates if rows is None else rows[candidates])
+            scores = self._vectors[:n] @ query if rows is None else self._vectors[rows] @ query
+
+            k = min(top_k, scores.shape[0])
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            positions = best if rows is None else rows[best]
+            return [
+                (self._ids[i], self._texts[i], self._metadatas[i], float(scores[j]))
+                for i, j in zip(positions.tolist(), best.tolist())
+            ]
+
+    def _approximate_scores(
+        self, query: np.ndarray, rows: np.ndarray | None, n: int
+    ) -> np.ndarray:
+        """Scores from the codes, higher is closer; binary ones are negated Hamming distances."""
+        codes = self._codes[:n] if rows is None else self._codes[rows]
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        step = max(1, _SCORE_BLOCK_ITEMS // codes.shape[1])
+        if self._quantization == "int8":
+            scales = self._scales[:n] if rows is None else self._scales[rows]
+            for start in range(0, codes.shape[0], step):
+                block = slice(start, start + step)
+                scores[block] = (codes[block].astype(np.float32) @ query) * scales[block]
+        else:
+            bits = np.packbits(query > 0)
+            for start in range(0, codes.shape[0], step):
+                block = slice(start, start + step)
+                scores[block] = -np.bitwise_count(codes[block] ^ bits).sum(axis=1, dtype=np.int32)
+        return scores
+
+    def _mask(self, where: Where) -> np.ndarray:
+        n = len(self._ids)
+        mask = np.ones(n, dtype=bool)
+        for key, cond in where.items():
+            if key == "$and":
+                for sub in cond:
+                    mask &= self._mask(sub)
+            elif key == "$or":
+                any_mask = np.zeros(n, dtype=bool)
+                for sub in cond:
+                    any_mask |= self._mask(sub)
+                mask &= any_mask
+            else:
+                mask &= self._match(self._column(key), cond)
+        return mask
+
+    @staticmethod
+    def _match(column: tuple[np.ndarray, dict[Any, int]], cond: Any) -> np.ndarray:
+        # Values are compared as integer codes; a value not in the column has none
+        codes, code_of = column
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        (op, value), = cond.items()
+        if op in ("$eq", "$ne"):
+            match = codes == code_of.get(value, -1)
+        elif op in ("$in", "$nin"):
+            wanted = [code_of[v] for v in value if v in code_of]
+            match = np.isin(codes, wanted) if wanted else np.zeros(len(codes), dtype=bool)
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+        return ~match if op in ("$ne", "$nin") else match
+
+    def _column(self, key: str) -> tuple[np.ndarray, dict[Any, int]]:
+        column = self._columns.get(key)
+        if column is None:
+            code_of: dict[Any, int] = {}
+            codes = np.fromiter(
+                (code_of.setdefault(m.get(key), len(code_of)) for m in self._metadatas),
+                dtype=np.int32,
+                count=len(self._metadatas),
+            )
+            column = self._columns[key] = (codes, code_of)
+        return column
+
+    def upsert(self, ids, texts, embeddings, metadatas) -> None:
+        if not ids:
+            return
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+
+        with self._lock:
+            if not self._dim:
+                self._dim = matrix.shape[1]
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(
+                    f"Embedding dimension {matrix.shape[1]} does not match the index ({self._dim}). "
+                    "Clear the index after switching embedding model."
+                )
+            self._ensure_capacity(len(self._ids) + len(ids))
+
+            rows = []
+            for chunk_id, text, meta, vector in zip(ids, texts, metadatas, matrix):
+                row = self._row_of.get(chunk_id)
+                if row is None:
+                    row = len(self._ids)
+                    self._row_of[chunk_id] = row
+                    self._ids.append(chunk_id)
+                    self._texts.append(text)
+                    self._metadatas.append(meta)
+                else:
+                    self._texts[row] = text
+                    self._metadatas[row] = meta
+                self._vectors[row] = vector
+                rows.append(row)
+            self._encode(np.asarray(rows), matrix)
+            self._columns.clear()
+            self._dirty = True
+
+    def update_metadata(self, ids, metadatas) -> None:
+        with self._lock:
+            for chunk_id, meta in zip(ids, metadatas):
+                row = self._row_of.get(chunk_id)
+                if row is not None:
+                    self._metadatas[row] = meta
+            self._columns.clear()
+            self._dirty = True
+
+    def delete(self, ids) -> None:
+        with self._lock:
+            for chunk_id in ids:
+                row = self._row_of.pop(chunk_id, None)
+                if row is None:
+                    continue
+                last = len(self._ids) - 1
+                if row != last:
+                    # Move the last row into the hole
+                    moved = self._ids[last]
+                    self._ids[row] = moved
+                    self._texts[row] = self._texts[last]
+                    self._metadatas[row] = self._metadatas[last]
+                    self._vectors[row] = self._vectors[last]
+                    if self._codes is not None:
+                        self._codes[row] = self._codes[last]
+                    if self._scales is not None:
+                        self._scales[row] = self._scales[last]
+                    self._row_of[moved] = row
+                self._ids.pop()
+                self._texts.pop()
+                self._metadatas.pop()
+            self._columns.clear()
+            self._dirty = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ids, self._texts, self._metadatas = [], [], []
+            self._row_of = {}
+            self._columns.clear()
+            self._dim = 0
+            self._vectors = self._codes = self._scales = None
+            # Codes of every quantization, also ones left from an earlier setting
+            codes = [os.path.join(self._dir, f"codes.{q}") for q in QUANTIZATIONS]
+            for path in (self._vectors_path, self._scales_path, self._rows_path, *codes):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._dirty = False
+
+
+def create_store(
+    backend: str,
+    chroma_dir: str,
+    numpy_dir: str,
+    collection_name: str = ChromaStore.COLLECTION_NAME,
+    chroma_server_url: str = "",
+    quantization: str = "none",
+    rerank_factor: int = 4,
+) -> VectorStore:
+    if backend == "chroma":
+        if quantization != "none":
+            logger.warning("Vector quantization is only supported by the numpy backend; ignored")
+        return ChromaStore(chroma_dir, collection_name, chroma_server_url)
+    if backend == "numpy":
+        return NumpyStore(numpy_dir, quantization, rerank_factor)
+    raise ValueError(f"Unknown vector backend: {backend}")
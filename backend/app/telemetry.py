@@ -0,0 +1,235 @@
+"""Prometheus metrics and per-request stage timings.
+
+Every pipeline stage runs inside ``span(stage)``. Its wall time is observed
+in the ``rag_stage_seconds`` histogram, labelled with the pipeline (``chat``,
+``stream``, ``ingest``) and the stage, and — when the code runs inside a
+``trace()`` — added to that request's stage breakdown. Breakdowns of recent
+requests are kept for ``/api/traces``; ``/api/chat`` can also return its own
+in a ``Server-Timing`` header. Provider calls additionally count requests,
+errors by status and the token usage the provider reports; ingestion counts
+the bytes and time spent parsing per file format. Micro-batched question
+embeddings record their batch sizes and the time they waited for a batch;
+``sum - count`` of the batch-size histogram is the requests saved.
+
+Stages may overlap (the vector and BM25 legs of a hybrid search run
+concurrently, embedding batches are sent in parallel), so a breakdown can
+add up to more than the request's total.
+"""
+
+import time
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.config import settings
+from app.providers import loaded_openai
+
+_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Wall time per pipeline stage", ["pipeline", "stage"], buckets=_BUCKETS
+)
+STAGE_ERRORS = Counter(
+    "rag_stage_errors_total", "Pipeline stages that raised", ["pipeline", "stage", "error"]
+)
+PROVIDER_REQUESTS = Counter(
+    "rag_provider_requests_total",
+    "Requests to the LLM/embedding providers by outcome",
+    ["provider", "operation", "status"],
+)
+PROVIDER_SECONDS = Histogram(
+    "rag_provider_request_seconds",
+    "Provider request latency (streams: until the last token)",
+    ["provider", "operation"],
+    buckets=_BUCKETS,
+)
+PROVIDER_TOKENS = Counter(
+    "rag_provider_tokens_total",
+    "Token usage reported by the providers",
+    ["provider", "operation", "kind"],
+)
+QUERY_BATCH_SIZE = Histogram(
+    "rag_query_embed_batch_size",
+    "Question embeddings per micro-batched request",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+QUERY_BATCH_WAIT = Histogram(
+    "rag_query_embed_batch_wait_seconds",
+    "Time a question embedding waited for its micro-batch to be sent",
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+DIRECT_ANSWERS = Counter(
+    "rag_direct_answers_total",
+    "Questions checked against the direct-answer index, by outcome",
+    ["outcome"],
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "rag_admission_queue_depth",
+    "Provider requests waiting for a slot",
+    ["provider", "operation", "priority"],
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "rag_admission_in_flight", "Provider requests holding a slot", ["provider", "operation"]
+)
+ADMISSION_WAIT = Histogram(
+    "rag_admission_wait_seconds",
+    "Time a provider request waited for a slot",
+    ["provider", "operation", "priority"],
+    buckets=_BUCKETS,
+)
+ADMISSION_SHED = Counter(
+    "rag_admission_shed_total",
+    "Provider requests rejected before being sent",
+    ["provider", "operation", "reason"],
+)
+CIRCUIT_STATE = Gauge(
+    "rag_circuit_state", "Provider circuit breaker: 0 closed, 1 half-open, 2 open", ["provider"]
+)
+PROVIDER_FALLBACKS = Counter(
+    "rag_provider_fallbacks_total",
+    "Chat requests sent to the other provider while one's circuit was open",
+    ["from_provider", "to_provider"],
+)
+TENANTS_LOADED = Gauge("rag_tenants_loaded", "Tenant indexes currently open")
+TENANT_EVICTIONS = Counter(
+    "rag_tenant_evictions_total", "Tenant indexes closed to free memory", ["reason"]
+)
+PARSE_BYTES = Counter("rag_parse_bytes_total", "Bytes of uploaded files parsed", ["format"])
+PARSE_SECONDS = Counter(
+    "rag_parse_seconds_total", "Time spent parsing and chunking uploads", ["format"]
+)
+HTTP_SECONDS = Histogram(
+    "rag_http_request_seconds",
+    "API request latency (streams: until the response starts)",
+    ["method", "route", "status"],
+    buckets=_BUCKETS,
+)
+
+
+class Trace:
+    """Stage timings of one request or ingestion job."""
+
+    def __init__(self, pipeline: str) -> None:
+        self.pipeline = pipeline
+        self.started_at = time.time()
+        self.stages: dict[str, float] = {}
+        self.total_ms = 0.0
+        self.error: str | None = None
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = round(self.stages.get(stage, 0.0) + seconds * 1000, 2)
+
+    def server_timing(self) -> str:
+        """``Server-Timing`` header value, shown per request in browser dev tools."""
+        parts = [f"{stage};dur={ms}" for stage, ms in self.stages.items()]
+        parts.append(f"total;dur={self.total_ms}")
+        return ", ".join(parts)
+
+    def as_dict(self) -> dict:
+        return {
+            "pipeline": self.pipeline,
+            "started_at": self.started_at,
+            "total_ms": self.total_ms,
+            "stages": dict(self.stages),
+            "error": self.error,
+        }
+
+
+_current: ContextVar[Trace | None] = ContextVar("trace", default=None)
+_recent: deque[dict] = deque(maxlen=settings.trace_history)
+
+
+@contextmanager
+def trace(pipeline: str) -> Iterator[Trace]:
+    """Collect the stage timings of everything run in this context (incl. ``to_thread``)."""
+    current = Trace(pipeline)
+    token = _current.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.total_ms = round((time.perf_counter() - started) * 1000, 2)
+        _recent.append(current.as_dict())
+        try:
+            _current.reset(token)
+        except ValueError:
+            # A stream closed from another context (client disconnect)
+            pass
+
+
+def current_trace() -> Trace | None:
+    return _current.get()
+
+
+def recent_traces() -> list[dict]:
+    """Newest first."""
+    return list(reversed(_recent))
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    current = _current.get()
+    pipeline = current.pipeline if current else "background"
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.labels(pipeline, stage, type(e).__name__).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(pipeline, stage).observe(elapsed)
+        if current is not None:
+            current.add(stage, elapsed)
+
+
+@contextmanager
+def provider_call(provider: str, operation: str) -> Iterator[None]:
+    """Time one provider request as stage ``provider_<operation>`` and count its outcome."""
+    started = time.perf_counter()
+    status = "cancelled"
+    try:
+        with span(f"provider_{operation}"):
+            yield
+        status = "ok"
+    except Exception as e:
+        status = error_status(e)
+        raise
+    finally:
+        PROVIDER_REQUESTS.labels(provider, operation, status).inc()
+        PROVIDER_SECONDS.labels(provider, operation).observe(time.perf_counter() - started)
+
+
+def record_usage(
+    provider: str,
+    operation: str,
+    prompt_tokens: int | None,
+    completion_tokens: int | None = None,
+    cached_prompt_tokens: int | None = None,
+) -> None:
+    if prompt_tokens:
+        PROVIDER_TOKENS.labels(provider, operation, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        PROVIDER_TOKENS.labels(provider, operation, "completion").inc(completion_tokens)
+    # Included in "prompt"; served from the provider's prompt cache
+    if cached_prompt_tokens:
+        PROVIDER_TOKENS.labels(provider, operation, "cached_prompt").inc(cached_prompt_tokens)
+
+
+def error_status(exc: Exception) -> str:
+    """HTTP status for provider errors, otherwise the exception type."""
+    openai = loaded_openai()
+    if isinstance(exc, httpx.HTTPStatusError) or (
+        openai is not None and isinstance(exc, openai.APIStatusError)
+    ):
+        return str(exc.response.status_code)
+    return type(exc).__name__
@@ -1,113 +1,823 @@
-"""ChromaDB vector store for document chunks."""
+"""Vector store for document chunks (ChromaDB or an in-process NumPy index).
 
+Every tenant has its own vector store and BM25 index — a separate Chroma
+collection or NumPy directory — so a search, delete or clear only ever
+touches that tenant's chunks, and a small tenant's query cost does not grow
+with the other tenants' corpora. A tenant's index is opened on first use
+and closed again when idle (see ``_lease`` and ``evict_idle_tenants``).
+
+Writes take the tenant's cross-process write lock and end by recording the
+chunk ids and a new corpus version in the catalog; an open index older than
+the catalog's version (written by another worker) is reloaded on next use.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import json
 import logging
-import uuid
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import IO
 
-import chromadb
+import numpy as np
 
+from app.admission import Priority
+from app.catalog import get_catalog, write_lock
 from app.config import settings
 from app.embeddings import embed_texts, embed_query
-from app.models import ChunkInfo, SourceReference
+from app.lexical import BM25Index, reciprocal_rank_fusion
+from app.models import ChunkInfo, FacetValue, Facets, IndexResult, SearchFilters, SourceReference
+from app.stores import ChromaStore, VectorStore, Where, create_store
+from app.telemetry import TENANT_EVICTIONS, TENANTS_LOADED, span
 
 logger = logging.getLogger(__name__)
 
-_client: chromadb.ClientAPI | None = None
-_collection: chromadb.Collection | None = None
+DEFAULT_TENANT = "default"
 
-COLLECTION_NAME = "documents"
+# Filters whose allowed chunk ids are kept per tenant, for BM25
+_ALLOWED_CACHE_SIZE = 64
 
+# Also a valid Chroma collection name once prefixed: [A-Za-z0-9_-], alphanumeric at both ends
+_TENANT_RE = re.compile(r"[A-Za-z0-9](?:[A-Za-z0-9_-]{0,46}[A-Za-z0-9])?")
 
-def _get_collection() -> chromadb.Collection:
-    global _client, _collection
-    if _collection is None:
-        _client = chromadb.PersistentClient(path=settings.chroma_persist_dir)
-        _collection = _client.get_or_create_collection(
-            name=COLLECTION_NAME,
-            metadata={"hnsw:space": "cosine"},
-        )
-    return _collection
 
+def is_valid_tenant(tenant: str) -> bool:
+    return _TENANT_RE.fullmatch(tenant) is not None
 
-def add_chunks(chunks: list[ChunkInfo]) -> int:
-    if not chunks:
-        return 0
 
-    collection = _get_collection()
-    texts = [c.text for c in chunks]
-    embeddings = embed_texts(texts)
+def tenant_dir(tenant: str) -> str:
+    """Directory for a tenant's files; the default tenant keeps the top-level paths."""
+    return os.path.join(settings.tenants_dir, tenant)
 
-    ids = [str(uuid.uuid4()) for _ in chunks]
-    metadatas = [
-        {
-            "source": c.source,
-            "chunk_index": c.chunk_index,
-            "section": c.section or "",
-        }
-        for c in chunks
-    ]
-
-    # Add in batches
-    batch_size = 100
-    for i in range(0, len(ids), batch_size):
-        end = min(i + batch_size, len(ids))
-        collection.add(
-            ids=ids[i:end],
-            documents=texts[i:end],
-            embeddings=embeddings[i:end],
-            metadatas=metadatas[i:end],
-        )
 
-    logger.info("Added %d chunks to vector store", len(chunks))
-    return len(chunks)
+def lexical_index_path(tenant: str) -> str:
+    if tenant == DEFAULT_TENANT:
+        return settings.lexical_index_path
+    return os.path.join(tenant_dir(tenant), "lexical_index.npz")
 
 
-def search(query: str, top_k: int = 5) -> list[SourceReference]:
-    collection = _get_collection()
+class _TenantIndex:
+    """One tenant's vector store and BM25 index, opened on first access."""
 
-    if collection.count() == 0:
-        return []
+    def __init__(self, tenant: str, version: int) -> None:
+        self.tenant = tenant
+        # Catalog corpus version the files were loaded at
+        self.version = version
+        self.leases = 0
+        self.last_used = time.monotonic()
+        self._store: VectorStore | None = None
+        self._lexical: BM25Index | None = None
+        # Store calls run in worker threads; only one of them may open the store
+        self._lock = threading.Lock()
+        # Derived from the metadata at one corpus version: (version, value)
+        self._allowed: OrderedDict[str, tuple[int, set[str]]] = OrderedDict()
+        self._facets: tuple[int, Facets] | None = None
 
-    query_embedding = embed_query(query)
+    @property
+    def store(self) -> VectorStore:
+        with self._lock:
+            if self._store is None:
+                if self.tenant == DEFAULT_TENANT:
+                    collection, numpy_dir = ChromaStore.COLLECTION_NAME, settings.numpy_index_dir
+                else:
+                    collection = f"tenant-{self.tenant}"
+                    numpy_dir = os.path.join(tenant_dir(self.tenant), "numpy_index")
+                self._store = create_store(
+                    settings.vector_backend,
+                    chroma_dir=settings.chroma_persist_dir,
+                    numpy_dir=numpy_dir,
+                    collection_name=collection,
+                    chroma_server_url=settings.chroma_server_url,
+                    quantization=settings.vector_quantization,
+                    rerank_factor=settings.quantization_rerank_factor,
+                )
+                logger.info("Opened %s index of tenant %s", self._store.name, self.tenant)
+                if self._store.count() and not get_catalog().chunk_count(self.tenant):
+                    _backfill_catalog(self.tenant, self._store)
+            return self._store
+
+    @property
+    def lexical(self) -> BM25Index:
+        store = self.store
+        with self._lock:
+            if self._lexical is None:
+                self._lexical = BM25Index(lexical_index_path(self.tenant))
+                if self._lexical.count() != store.count():
+                    _rebuild_lexical(store, self._lexical)
+            return self._lexical
+
+    def count(self) -> int:
+        return self.store.count()
+
+    def count_if_open(self) -> int | None:
+        with self._lock:
+            store = self._store
+        return store.count() if store is not None else None
+
+    def close(self) -> None:
+        # Writes are flushed as they complete; this only catches an interrupted job
+        with self._lock:
+            if self._store is not None:
+                self._store.flush()
+            if self._lexical is not None:
+                self._lexical.flush()
+            self._store = self._lexical = None
+
+    def reload(self, version: int) -> None:
+        """Reopen the files on next access; searches already running keep the old ones."""
+        with self._lock:
+            self._store = self._lexical = None
+            self.version = version
+
+    def allowed_ids(self, where: Where) -> set[str]:
+        """Ids of the chunks matching a filter, cached until the corpus changes."""
+        key = repr(where)
+        version = self.version
+        with self._lock:
+            cached = self._allowed.get(key)
+            if cached is not None and cached[0] == version:
+                self._allowed.move_to_end(key)
+                return cached[1]
+        allowed = set(self.store.get_metadata(where))
+        with self._lock:
+            self._allowed[key] = (version, allowed)
+            self._allowed.move_to_end(key)
+            while len(self._allowed) > _ALLOWED_CACHE_SIZE:
+                self._allowed.popitem(last=False)
+        return allowed
+
+    def facets(self) -> Facets:
+        version = self.version
+        with self._lock:
+            if self._facets is not None and self._facets[0] == version:
+                return self._facets[1]
+        facets = _count_facets(self.store.get_metadata({}).values())
+        with self._lock:
+            self._facets = (version, facets)
+        return facets
+
+
+@dataclass
+class _TenantUsage:
+    """Per-tenant counters of this process; kept while the index is closed and reopened."""
+
+    queries: int = 0
+    last_used: float | None = None
+
+
+# Open indexes, least recently used first
+_indexes: OrderedDict[str, _TenantIndex] = OrderedDict()
+_usage: dict[str, _TenantUsage] = {}
+_registry_lock = threading.Lock()
+
+
+@contextmanager
+def _lease(tenant: str, version: int | None = None) -> Iterator[_TenantIndex]:
+    """Use one tenant's index; an index is never closed while leased.
+
+    ``version`` is the tenant's corpus version in the catalog. Callers on the
+    event loop read it first with ``get_corpus_version``; otherwise it is read here.
+    """
+    if version is None:
+        version = get_catalog().corpus_version(tenant)
+    with _registry_lock:
+        index = _indexes.get(tenant)
+        if index is None:
+            index = _indexes[tenant] = _TenantIndex(tenant, version)
+        elif index.version != version:
+            logger.info("Tenant %s changed in another worker, reloading its index", tenant)
+            index.reload(version)
+        _indexes.move_to_end(tenant)
+        index.leases += 1
+        evicted = _evict(time.monotonic())
+    for idle in evicted:
+        idle.close()
+    try:
+        yield index
+    finally:
+        with _registry_lock:
+            index.leases -= 1
+            index.last_used = time.monotonic()
+            _usage.setdefault(tenant, _TenantUsage()).last_used = time.time()
+
+
+def _evict(now: float) -> list[_TenantIndex]:
+    """Unregister idle indexes, then the least recently used over the cap (lock held)."""
+    evicted = []
+    for tenant, index in list(_indexes.items()):
+        if index.leases:
+            continue
+        if now - index.last_used > settings.tenant_idle_seconds:
+            reason = "idle"
+        elif len(_indexes) > settings.tenant_max_loaded:
+            reason = "capacity"
+        else:
+            continue
+        del _indexes[tenant]
+        evicted.append(index)
+        TENANT_EVICTIONS.labels(reason).inc()
+        logger.info("Closed index of tenant %s (%s)", tenant, reason)
+    TENANTS_LOADED.set(len(_indexes))
+    return evicted
+
+
+def evict_idle_tenants() -> int:
+    """Close indexes nobody has used for ``tenant_idle_seconds``; returns how many."""
+    with _registry_lock:
+        evicted = _evict(time.monotonic())
+    for index in evicted:
+        index.close()
+    return len(evicted)
+
+
+async def run_tenant_sweeper() -> None:
+    """Evict idle tenants periodically, so memory is freed without further traffic."""
+    interval = max(1.0, min(60.0, settings.tenant_idle_seconds / 2))
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(evict_idle_tenants)
+
+
+def _backfill_catalog(tenant: str, store: VectorStore) -> None:
+    """Register the documents of a store indexed before the catalog existed."""
+    chunk_ids: dict[str, list[str]] = {}
+    for chunk_id, meta in store.get_metadata({}).items():
+        chunk_ids.setdefault(meta.get("source", "unknown"), []).append(chunk_id)
+    get_catalog().backfill(tenant, chunk_ids)
+
+
+def _rebuild_lexical(store: VectorStore, lexical: BM25Index) -> None:
+    """Index existing chunks, e.g. a corpus built before the lexical index existed."""
+    lexical.clear()
+    ids = list(store.get_metadata({}))
+    for i in range(0, len(ids), 1000):
+        rows = store.get(ids[i : i + 1000])
+        lexical.add([r[0] for r in rows], [r[1] for r in rows])
+    lexical.flush()
+    logger.info("Rebuilt BM25 index from %d stored chunks", len(ids))
 
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=min(top_k, collection.count()),
-        include=["documents", "metadatas", "distances"],
-    )
 
-    sources: list[SourceReference] = []
-    if results and results["documents"]:
-        for doc, meta, distance in zip(
-            results["documents"][0],
-            results["metadatas"][0],
-            results["distances"][0],
-        ):
-            # Cosine distance → similarity
-            similarity = 1.0 - distance
-            sources.append(SourceReference(
-                chunk_text=doc,
-                source=meta.get("source", "unknown"),
-                section=meta.get("section") or None,
-                score=round(similarity, 4),
-                chunk_index=meta.get("chunk_index", 0),
-            ))
-
-    return sources
-
-
-def get_stats() -> dict:
-    collection = _get_collection()
+class _ChunkIdAssigner:
+    """Deterministic ids from source + content; repeated texts get an occurrence suffix."""
+
+    def __init__(self) -> None:
+        self._seen: dict[str, int] = {}
+
+    def __call__(self, chunk: ChunkInfo) -> str:
+        digest = hashlib.sha256(f"{chunk.source}\x00{chunk.text}".encode("utf-8")).hexdigest()[:32]
+        occurrence = self._seen.get(digest, 0)
+        self._seen[digest] = occurrence + 1
+        return f"{digest}-{occurrence}" if occurrence else digest
+
+
+def chunk_ids(chunks: list[ChunkInfo]) -> list[str]:
+    assign = _ChunkIdAssigner()
+    return [assign(c) for c in chunks]
+
+
+# Bumped when _metadata gains a field (or ingestion derives something new from
+# the chunks, like direct answers), so re-uploading an unchanged file refreshes it
+METADATA_VERSION = 3
+
+
+def _metadata(chunk: ChunkInfo) -> dict:
     return {
-        "total_chunks": collection.count(),
+        "source": chunk.source,
+        "chunk_index": chunk.chunk_index,
+        "section": chunk.section or "",
+        "kind": chunk.kind,
     }
 
 
-def clear_all() -> None:
-    global _collection
-    client = chromadb.PersistentClient(path=settings.chroma_persist_dir)
-    try:
-        client.delete_collection(COLLECTION_NAME)
-    except Exception:
-        pass
-    _collection = None
-    logger.info("Vector store cleared")
+def _next_batch(chunks: Iterator[ChunkInfo], size: int) -> list[ChunkInfo]:
+    return list(itertools.islice(chunks, size))
+
+
+async def add_chunks(
+    chunks: Iterable[ChunkInfo],
+    on_progress: Callable[[str, int], None] | None = None,
+    executor: Executor | None = None,
+    tenant: str = DEFAULT_TENANT,
+    answers: dict[str, list[dict]] | None = None,
+) -> IndexResult:
+    """Index chunks idempotently: only new content is embedded, vanished chunks are removed.
+
+    ``chunks`` may be a lazy generator (e.g. straight from the streaming DOCX
+    parser); it is pulled one batch at a time on ``executor`` (default: the
+    loop's thread pool), so parsing and embedding proceed batch by batch.
+    Every source present is treated as the complete new version of that
+    document. ``on_progress(stage, chunks_done)`` runs after each parsing,
+    embedding and storing step. ``answers`` (direct-answer entries per
+    source) are committed with the chunk ids; its lists may fill up while
+    ``chunks`` is consumed.
+
+    Parsing and embedding run without the tenant's write lock, so other
+    uploads and deletions of the tenant proceed meanwhile. Each batch is
+    spooled to temporary files (texts and metadata as JSON lines, new
+    embeddings as float32) and read back one batch at a time when the store
+    is written under the lock, so memory stays flat in the document's size.
+    """
+    with tempfile.TemporaryFile() as rows, tempfile.TemporaryFile() as vectors:
+        prepared = _Prepared(chunk_ids={}, rows=rows, vectors=vectors)
+        with _lease(tenant, await get_corpus_version(tenant)) as index:
+            await _prepare_chunks(index, prepared, chunks, on_progress, executor)
+        if on_progress:
+            # Waiting for the lock counts as storing
+            on_progress("storing", 0)
+        async with write_lock(tenant):
+            # Leased again: another worker may have written since
+            with _lease(tenant, await get_corpus_version(tenant)) as index:
+                result = await _store_prepared(index, prepared, on_progress)
+                changed = bool(result.added or result.updated or result.removed)
+                index.version = await asyncio.to_thread(
+                    get_catalog().commit_chunks, tenant, prepared.chunk_ids, changed, answers
+                )
+    logger.info(
+        "Indexed %d chunks for tenant %s: %d added, %d unchanged (%d moved), %d removed",
+        prepared.count,
+        tenant,
+        result.added,
+        result.unchanged,
+        result.updated,
+        result.removed,
+    )
+    return result
+
+
+@dataclass
+class _Prepared:
+    """Chunks of an upload, embedded where new, spooled until written to the store."""
+
+    # Chunk ids per source, in document order
+    chunk_ids: dict[str, list[str]]
+    # One JSON line per chunk: id, text, metadata and whether it was embedded
+    rows: IO[bytes]
+    # float32 embeddings of the embedded chunks, in row order
+    vectors: IO[bytes]
+    count: int = 0
+    dim: int = 0
+
+    def write(
+        self, batch: list[tuple[str, str, dict]], new: set[str], embeddings: np.ndarray
+    ) -> None:
+        for chunk_id, text, meta in batch:
+            line = {"id": chunk_id, "text": text, "metadata": meta, "embedded": chunk_id in new}
+            self.rows.write(json.dumps(line, ensure_ascii=False).encode() + b"\n")
+        if len(embeddings):
+            self.dim = embeddings.shape[1]
+            self.vectors.write(embeddings.tobytes())
+        self.count += len(batch)
+
+    def batches(self, size: int) -> Iterator[tuple[list[dict], np.ndarray]]:
+        """The spooled rows and the embeddings of those that were embedded, ``size`` at a time."""
+        self.rows.seek(0)
+        self.vectors.seek(0)
+        while rows := [json.loads(line) for line in itertools.islice(self.rows, size)]:
+            embedded = sum(row["embedded"] for row in rows)
+            data = self.vectors.read(embedded * self.dim * 4)
+            # Copied: the store normalizes in place
+            matrix = np.frombuffer(data, dtype=np.float32).reshape(embedded, self.dim)
+            yield rows, matrix.copy()
+
+
+async def _prepare_chunks(
+    index: _TenantIndex,
+    prepared: _Prepared,
+    chunks: Iterable[ChunkInfo],
+    on_progress: Callable[[str, int], None] | None,
+    executor: Executor | None,
+) -> None:
+    existing: set[str] = set()
+    known_sources: set[str] = set()
+    assign_id = _ChunkIdAssigner()
+    stream = iter(chunks)
+    done = 0
+    loop = asyncio.get_running_loop()
+
+    while True:
+        # Executor threads don't inherit the context, so the span is taken here
+        with span("parse_chunk"):
+            batch = await loop.run_in_executor(
+                executor, _next_batch, stream, settings.ingest_batch_size
+            )
+        if not batch:
+            break
+        if on_progress:
+            on_progress("parsing", done + len(batch))
+
+        new_sources = {c.source for c in batch} - known_sources
+        if new_sources:
+            with span("store_lookup"):
+                existing.update(
+                    await asyncio.to_thread(_existing_metadata, index, sorted(new_sources))
+                )
+            known_sources |= new_sources
+
+        rows = [(assign_id(c), c.text, _metadata(c)) for c in batch]
+        for chunk, (chunk_id, _, _) in zip(batch, rows):
+            prepared.chunk_ids.setdefault(chunk.source, []).append(chunk_id)
+        new = [(chunk_id, text) for chunk_id, text, _ in rows if chunk_id not in existing]
+        embeddings = np.empty((0, 0), dtype=np.float32)
+        if new:
+            with span("embed"):
+                embeddings = np.asarray(
+                    await embed_texts([text for _, text in new], priority=Priority.BACKGROUND),
+                    dtype=np.float32,
+                )
+        await asyncio.to_thread(prepared.write, rows, {chunk_id for chunk_id, _ in new}, embeddings)
+        done += len(batch)
+        if on_progress:
+            on_progress("embedding", done)
+
+
+async def _store_prepared(
+    index: _TenantIndex,
+    prepared: _Prepared,
+    on_progress: Callable[[str, int], None] | None,
+) -> IndexResult:
+    existing: dict[str, dict] = {}
+    if prepared.chunk_ids:
+        with span("store_lookup"):
+            existing = await asyncio.to_thread(
+                _existing_metadata, index, sorted(prepared.chunk_ids)
+            )
+
+    result = IndexResult()
+    stored = 0
+    batches = prepared.batches(settings.ingest_batch_size)
+    while batch := await asyncio.to_thread(next, batches, None):
+        rows, embeddings = batch
+        write = [row for row in rows if row["embedded"]]
+        # Removed by another writer since they were looked up
+        missing = [row for row in rows if not row["embedded"] and row["id"] not in existing]
+        if missing:
+            with span("embed"):
+                texts = [row["text"] for row in missing]
+                more = np.asarray(
+                    await embed_texts(texts, priority=Priority.BACKGROUND), dtype=np.float32
+                )
+            write += missing
+            embeddings = np.concatenate([embeddings, more]) if len(embeddings) else more
+        if write:
+            # The store is synchronous — keep it off the event loop
+            with span("store_upsert"):
+                await asyncio.to_thread(
+                    _store_chunks,
+                    index,
+                    [row["id"] for row in write],
+                    [row["text"] for row in write],
+                    embeddings,
+                    [row["metadata"] for row in write],
+                )
+            result.added += sum(1 for row in write if row["id"] not in existing)
+
+        # Position changed but content didn't — metadata update, no re-embedding
+        moved = [
+            row for row in rows
+            if not row["embedded"] and row["id"] in existing
+            and existing[row["id"]] != row["metadata"]
+        ]
+        if moved:
+            with span("store_update"):
+                await asyncio.to_thread(
+                    index.store.update_metadata,
+                    [row["id"] for row in moved],
+                    [row["metadata"] for row in moved],
+                )
+        result.updated += len(moved)
+        stored += len(rows)
+        if on_progress:
+            on_progress("storing", stored)
+    result.unchanged = prepared.count - result.added
+
+    stale = list(existing.keys() - {i for ids in prepared.chunk_ids.values() for i in ids})
+    if stale:
+        with span("store_delete"):
+            await asyncio.to_thread(_delete_ids, index, stale)
+    result.removed = len(stale)
+    with span("store_flush"):
+        await asyncio.to_thread(_flush, index)
+    if on_progress:
+        on_progress("storing", prepared.count)
+    return result
+
+
+def _existing_metadata(index: _TenantIndex, sources: list[str]) -> dict[str, dict]:
+    where = {"source": sources[0]} if len(sources) == 1 else {"source": {"$in": sources}}
+    return index.store.get_metadata(where)
+
+
+def _store_chunks(
+    index: _TenantIndex,
+    ids: list[str],
+    texts: list[str],
+    embeddings: np.ndarray,
+    metadatas: list[dict],
+) -> None:
+    index.store.upsert(ids, texts, embeddings, metadatas)
+    if settings.hybrid_search:
+        index.lexical.add(ids, texts)
+
+
+def _delete_ids(index: _TenantIndex, ids: list[str]) -> None:
+    index.store.delete(ids)
+    if settings.hybrid_search:
+        index.lexical.remove(ids)
+
+
+def _flush(index: _TenantIndex) -> None:
+    index.store.flush()
+    if settings.hybrid_search:
+        index.lexical.flush()
+
+
+def _delete_and_flush(index: _TenantIndex, ids: list[str]) -> None:
+    _delete_ids(index, ids)
+    _flush(index)
+
+
+async def delete_document(source: str, tenant: str = DEFAULT_TENANT) -> int:
+    """Remove one document and every chunk of it; returns the number of chunks removed."""
+    async with write_lock(tenant):
+        with _lease(tenant, await get_corpus_version(tenant)) as index:
+            ids = list(await asyncio.to_thread(_existing_metadata, index, [source]))
+            if ids:
+                await asyncio.to_thread(_delete_and_flush, index, ids)
+            index.version = await asyncio.to_thread(
+                get_catalog().remove_document, tenant, source
+            )
+    if ids:
+        logger.info("Removed %d chunks of %s from tenant %s", len(ids), source, tenant)
+    return len(ids)
+
+
+async def search(
+    query: str,
+    top_k: int = 5,
+    query_embedding: list[float] | None = None,
+    where: Where | None = None,
+    tenant: str = DEFAULT_TENANT,
+) -> list[SourceReference]:
+    """Best chunks for a question, optionally restricted by a metadata filter.
+
+    With ``hybrid_search`` the vector and BM25 rankings (``hybrid_candidates``
+    deep each) are merged by reciprocal rank fusion, so exact terms like
+    ORSAK codes surface even when their embedding is not the closest.
+    ``score`` is always the cosine similarity to the question.
+    """
+    _usage.setdefault(tenant, _TenantUsage()).queries += 1
+    with _lease(tenant, await get_corpus_version(tenant)) as index:
+        return await _search(index, query, top_k, query_embedding, where)
+
+
+async def _search(
+    index: _TenantIndex,
+    query: str,
+    top_k: int,
+    query_embedding: list[float] | None,
+    where: Where | None,
+) -> list[SourceReference]:
+    # The first query of a tenant opens its index, so count off the event loop
+    count = await asyncio.to_thread(index.count)
+    store = index.store
+    if count == 0:
+        return []
+
+    if query_embedding is None:
+        query_embedding = await embed_query(query)
+
+    if not settings.hybrid_search:
+        hits = await asyncio.to_thread(
+            _vector_search, store, query_embedding, min(top_k, count), where
+        )
+        return [_reference(*hit) for hit in hits]
+
+    depth = min(max(top_k, settings.hybrid_candidates), count)
+    hits, lexical_ids = await asyncio.gather(
+        asyncio.to_thread(_vector_search, store, query_embedding, depth, where),
+        asyncio.to_thread(_lexical_search, index, query, depth, where),
+    )
+    fused = reciprocal_rank_fusion(
+        [[hit[0] for hit in hits], lexical_ids], k=settings.hybrid_rrf_k
+    )[:top_k]
+
+    by_id = {hit[0]: hit for hit in hits}
+    lexical_only = [chunk_id for chunk_id in fused if chunk_id not in by_id]
+    if lexical_only:
+        query_vector = _normalized(query_embedding)
+        with span("store_get"):
+            rows = await asyncio.to_thread(store.get, lexical_only)
+        for chunk_id, text, meta, embedding in rows:
+            score = float(_normalized(embedding) @ query_vector)
+            by_id[chunk_id] = (chunk_id, text, meta, score)
+
+    return [_reference(*by_id[chunk_id]) for chunk_id in fused if chunk_id in by_id]
+
+
+def _vector_search(
+    store: VectorStore, query_embedding: list[float], top_k: int, where: Where | None
+) -> list[tuple[str, str, dict, float]]:
+    with span("vector_query"):
+        return store.query(query_embedding, top_k, where)
+
+
+def _lexical_search(
+    index: _TenantIndex, query: str, top_k: int, where: Where | None
+) -> list[str]:
+    with span("lexical_query"):
+        allowed = index.allowed_ids(where) if where else None
+        return [chunk_id for chunk_id, _ in index.lexical.search(query, top_k, allowed)]
+
+
+def where_for(filters: SearchFilters | None) -> Where | None:
+    """Store filter for a request's filters; fields left empty do not restrict."""
+    if filters is None:
+        return None
+    conditions = []
+    for key, values in (
+        ("source", filters.sources),
+        ("section", filters.sections),
+        ("kind", filters.kinds),
+    ):
+        if values:
+            values = list(dict.fromkeys(values))
+            conditions.append({key: values[0] if len(values) == 1 else {"$in": values}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def get_facets(tenant: str = DEFAULT_TENANT) -> Facets:
+    """Chunk counts per document, section and entry type, for the search filters."""
+    with _lease(tenant) as index:
+        return index.facets()
+
+
+def _count_facets(metadatas: Iterable[dict]) -> Facets:
+    sources: Counter[str] = Counter()
+    sections: Counter[tuple[str, str]] = Counter()
+    kinds: Counter[str] = Counter()
+    for meta in metadatas:
+        source = meta.get("source", "unknown")
+        sources[source] += 1
+        if meta.get("section"):
+            sections[meta["section"], source] += 1
+        # Chunks indexed before entry types existed carry no kind
+        if meta.get("kind"):
+            kinds[meta["kind"]] += 1
+    return Facets(
+        sources=[FacetValue(value=v, count=n) for v, n in sorted(sources.items())],
+        sections=[
+            FacetValue(value=section, count=n, source=source)
+            for (section, source), n in sorted(sections.items(), key=lambda i: (i[0][1], i[0][0]))
+        ],
+        kinds=[FacetValue(value=v, count=n) for v, n in sorted(kinds.items())],
+    )
+
+
+def _normalized(vector: list[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+def _reference(chunk_id: str, text: str, meta: dict, score: float) -> SourceReference:
+    return SourceReference(
+        chunk_text=text,
+        source=meta.get("source", "unknown"),
+        section=meta.get("section") or None,
+        score=round(score, 4),
+        chunk_index=meta.get("chunk_index", 0),
+        chunk_id=chunk_id,
+    )
+
+
+def open_tenant(tenant: str = DEFAULT_TENANT) -> int:
+    """Open the tenant's indexes now rather than in its first search; returns its chunk count."""
+    with _lease(tenant) as index:
+        if settings.hybrid_search:
+            index.lexical
+        return index.count()
+
+
+# -- snapshots (app.snapshot) --
+
+
+def export_rows(
+    tenant: str, ids: list[str], batch_size: int = 1000
+) -> Iterator[list[tuple[str, str, dict, list[float]]]]:
+    """``(id, text, metadata, embedding)`` of the given chunks, in batches."""
+    with _lease(tenant) as index:
+        if settings.hybrid_search:
+            # Written out in full, so a snapshot can ship it as is
+            index.lexical.flush()
+        for i in range(0, len(ids), batch_size):
+            yield index.store.get(ids[i : i + batch_size])
+
+
+# (ids, texts, embeddings, metadatas)
+RowBatch = tuple[list[str], list[str], np.ndarray, list[dict]]
+
+
+async def restore_index(
+    tenant: str,
+    batches: Iterable[RowBatch],
+    registry: dict,
+    lexical_file: str | None = None,
+) -> int | None:
+    """Fill a tenant that has no documents from a snapshot; None if it has some.
+
+    ``lexical_file`` is a BM25 index of exactly these chunks; without it the
+    BM25 index is rebuilt from the restored texts.
+    """
+    async with write_lock(tenant):
+        with _lease(tenant, await get_corpus_version(tenant)) as index:
+            if await asyncio.to_thread(_has_documents, index):
+                return None
+            count = await asyncio.to_thread(_restore, index, batches, lexical_file)
+            index.version = await asyncio.to_thread(
+                get_catalog().import_registry, tenant, registry
+            )
+    return count
+
+
+def _has_documents(index: _TenantIndex) -> bool:
+    return bool(index.count() or get_catalog().chunk_count(index.tenant))
+
+
+def _restore(index: _TenantIndex, batches: Iterable[RowBatch], lexical_file: str | None) -> int:
+    count = 0
+    for ids, texts, embeddings, metadatas in batches:
+        index.store.upsert(ids, texts, embeddings, metadatas)
+        count += len(ids)
+    index.store.flush()
+    if settings.hybrid_search:
+        with index._lock:
+            index._lexical = None
+        path = lexical_index_path(index.tenant)
+        if lexical_file:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            shutil.copyfile(lexical_file, path)
+        # Loads the copied file, or rebuilds from the store if its count differs
+        index.lexical
+    return count
+
+
+async def get_corpus_version(tenant: str = DEFAULT_TENANT) -> int:
+    # In a thread: the catalog may be busy with another thread's or worker's write
+    return await asyncio.to_thread(get_catalog().corpus_version, tenant)
+
+
+def get_stats(tenant: str = DEFAULT_TENANT) -> dict:
+    with _lease(tenant) as index:
+        return {
+            "total_chunks": index.count(),
+            "backend": index.store.name,
+        }
+
+
+def tenant_stats() -> list[dict]:
+    """Every tenant with documents or used since startup; chunks only for open indexes."""
+    catalog = get_catalog()
+    documents = catalog.document_counts()
+    with _registry_lock:
+        usage = dict(_usage)
+        loaded = dict(_indexes)
+    stats = []
+    for tenant in sorted(documents.keys() | usage.keys() | loaded.keys()):
+        counters = usage.get(tenant, _TenantUsage())
+        index = loaded.get(tenant)
+        stats.append({
+            "tenant": tenant,
+            "loaded": index is not None,
+            "total_chunks": index.count_if_open() if index is not None else None,
+            "documents": documents.get(tenant, 0),
+            "corpus_version": catalog.corpus_version(tenant),
+            "queries": counters.queries,
+            "last_used": counters.last_used,
+        })
+    return stats
+
+
+async def clear_all(tenant: str = DEFAULT_TENANT) -> None:
+    async with write_lock(tenant):
+        with _lease(tenant, await get_corpus_version(tenant)) as index:
+            await asyncio.to_thread(_clear, index)
+            index.version = await asyncio.to_thread(get_catalog().clear_tenant, tenant)
+    logger.info("Vector store of tenant %s cleared", tenant)
+
+
+def _clear(index: _TenantIndex) -> None:
+    index.store.clear()
+    if settings.hybrid_search:
+        index.lexical.clear()
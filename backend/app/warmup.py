@@ -0,0 +1,78 @@
+"""Startup work, so the first question after a cold start is not the one paying for it.
+
+Run from the app lifespan before the server accepts requests:
+
+1. restore ``snapshot_url`` into the default tenant if it has no documents
+   (see ``app.snapshot``);
+2. open the default tenant's vector store, BM25 index, direct-answer index
+   and the embedding cache, which would otherwise load on the first search;
+3. import the OpenAI SDK and create its client, which is otherwise deferred
+   to the first OpenAI request;
+4. with ``warmup_parse_pool`` set, start the document parse processes
+   (``ingest_parse_processes``), which otherwise start inside the first
+   upload; off by default, since it delays every cold start and most see
+   no upload;
+5. with ``warmup_question`` set, embed and search it once, which connects
+   to the embedding provider.
+
+Nothing here is required: a step that fails is logged and startup goes on.
+The timings are in ``/api/traces`` under the ``startup`` pipeline.
+"""
+
+import asyncio
+import contextlib
+import importlib
+import logging
+from collections.abc import Iterator
+
+from app.config import settings
+from app.direct_answers import get_index
+from app.embedding_cache import get_embedding_cache
+from app.embeddings import embed_query
+from app.ingestion import start_parse_pool
+from app.providers import get_clients
+from app.snapshot import restore_snapshot
+from app.telemetry import span, trace
+from app.vectorstore import DEFAULT_TENANT, open_tenant, search
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.contextmanager
+def _step(stage: str) -> Iterator[None]:
+    """One timed warm-up step; an error is logged and startup goes on."""
+    try:
+        with span(stage):
+            yield
+    except Exception:
+        logger.exception("Warm-up step %s failed", stage)
+
+
+async def warm_up() -> None:
+    with trace("startup"):
+        if settings.snapshot_url:
+            with _step("restore_snapshot"):
+                if await restore_snapshot(settings.snapshot_url) is None:
+                    logger.info("Index already has documents; snapshot not restored")
+
+        if not settings.warmup_enabled:
+            return
+        count = 0
+        with _step("open_indexes"):
+            count = await asyncio.to_thread(open_tenant, DEFAULT_TENANT)
+        with _step("open_direct_answers"):
+            await asyncio.to_thread(get_index, DEFAULT_TENANT)
+        with _step("open_embedding_cache"):
+            await asyncio.to_thread(get_embedding_cache)
+        if settings.openai_api_key:
+            with _step("openai_client"):
+                await asyncio.to_thread(importlib.import_module, "openai")
+                get_clients().openai
+        if settings.warmup_parse_pool:
+            with _step("parse_pool"):
+                await start_parse_pool()
+        if settings.warmup_question and count:
+            with _step("warmup_question"):
+                embedding = await embed_query(settings.warmup_question)
+                await search(settings.warmup_question, query_embedding=embedding)
+        logger.info("Warmed up: %d chunks in the default index", count)
@@ -0,0 +1,285 @@
+"""Admission control under load: shedding, priorities and provider fallback.
+
+Three scenarios against the fake provider, each run with the old behaviour
+(no limits, first come first served, no circuit breaker) and with the new:
+
+- saturation: questions arrive through ``generate_response`` at ``--rate``
+  per second, twice what a provider serving ``--capacity`` chat requests at
+  once can answer. Without limits every request is sent and waits inside
+  the provider. With limits, those beyond ``--queue`` waiting ones are shed
+  at once as ``Overloaded`` (HTTP 429). Reports the share answered and
+  shed, answer latency p50/p99 and how long a shed request took to learn it.
+- ingestion: ``--users`` callers embed questions while a large document is
+  embedded in the background (``Priority.BACKGROUND``). Reports question
+  embedding latency with first-come-first-served and with priorities, and
+  how long the ingestion took.
+- outage: OpenAI chat answers 503 while Ollama is up. Reports the share of
+  questions answered, time to answer or error p50, and the requests sent
+  to the failing provider, without a breaker, with a breaker, and with a
+  breaker and fallback to Ollama.
+
+    cd backend
+    python -m benchmarks.admission
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+from benchmarks.synthetic_docx import generate_handbook
+
+UNLIMITED = 100_000
+
+
+def _configure(**overrides) -> None:
+    from app import admission
+    from app.config import settings
+
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    # Breakers outlive event loops; gates and schedulers don't
+    admission._breakers.clear()
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))]
+
+
+async def _ingest(path: str) -> list[str]:
+    from app.chunking import iter_chunks
+    from app.document import iter_docx_sections
+    from app.providers import close_clients, start_clients
+    from app.vectorstore import add_chunks
+
+    await start_clients()
+    await add_chunks(iter_chunks(iter_docx_sections(path), "handbok.docx"))
+    texts = [c.text for c in iter_chunks(iter_docx_sections(path), "handbok.docx")]
+    await close_clients()
+    return texts
+
+
+async def _saturation(args: argparse.Namespace, questions: list[str]) -> dict:
+    from app.admission import Overloaded
+    from app.models import ChatRequest
+    from app.providers import close_clients, start_clients
+    from app.rag import generate_response
+
+    await start_clients()
+    answered, shed = [], []
+
+    async def ask(question: str) -> None:
+        start = time.perf_counter()
+        try:
+            await generate_response(ChatRequest(question=question, provider="ollama"))
+            answered.append(time.perf_counter() - start)
+        except Overloaded:
+            shed.append(time.perf_counter() - start)
+
+    tasks = []
+    total = int(args.rate * args.seconds)
+    for i in range(total):
+        tasks.append(asyncio.create_task(ask(questions[i % len(questions)])))
+        await asyncio.sleep(1 / args.rate)
+    await asyncio.gather(*tasks)
+    await close_clients()
+    return {
+        "answered": len(answered) / total,
+        "shed": len(shed) / total,
+        "p50": statistics.median(answered) * 1000 if answered else float("nan"),
+        "p99": _percentile(answered, 0.99) * 1000,
+        "shed_p50": statistics.median(shed) * 1000 if shed else float("nan"),
+    }
+
+
+async def _ingestion(args: argparse.Namespace, texts: list[str]) -> dict:
+    from app.admission import Priority
+    from app.embeddings import embed_query, embed_texts
+    from app.providers import close_clients, start_clients
+
+    await start_clients()
+    latencies: list[float] = []
+    ingesting = True
+
+    async def ingest() -> float:
+        nonlocal ingesting
+        start = time.perf_counter()
+        await embed_texts(texts, priority=Priority.BACKGROUND)
+        ingesting = False
+        return time.perf_counter() - start
+
+    async def user(n: int) -> None:
+        await asyncio.sleep(0.05)
+        i = 0
+        while ingesting:
+            start = time.perf_counter()
+            await embed_query(f"Vad gäller för regel {n}-{i}?")
+            latencies.append(time.perf_counter() - start)
+            i += 1
+            await asyncio.sleep(args.think_ms / 1000)
+
+    ingest_seconds, *_ = await asyncio.gather(ingest(), *(user(n) for n in range(args.users)))
+    await close_clients()
+    return {
+        "questions": len(latencies),
+        "p50": statistics.median(latencies) * 1000,
+        "p99": _percentile(latencies, 0.99) * 1000,
+        "ingest": ingest_seconds,
+    }
+
+
+async def _outage(args: argparse.Namespace, questions: list[str], fake) -> dict:
+    from app.models import ChatRequest
+    from app.providers import close_clients, start_clients
+    from app.rag import generate_response
+
+    await start_clients()
+    fake.state.down.add("openai")
+    before = fake.state.calls["unavailable"]
+    answered, durations = 0, []
+
+    async def user(n: int) -> None:
+        nonlocal answered
+        for i in range(args.outage_questions):
+            start = time.perf_counter()
+            try:
+                await generate_response(
+                    ChatRequest(question=questions[(n * 31 + i) % len(questions)], provider="openai")
+                )
+                answered += 1
+            except Exception:
+                # ProviderUnavailable, or the provider's own 503 after the client's retries
+                pass
+            durations.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(user(n) for n in range(args.outage_users)))
+    fake.state.down.discard("openai")
+    await close_clients()
+    return {
+        "answered": answered / len(durations),
+        "p50": statistics.median(durations) * 1000,
+        "sent": fake.state.calls["unavailable"] - before,
+    }
+
+
+def _run(args: argparse.Namespace, workdir: str, fake) -> None:
+    path = os.path.join(workdir, "handbok.docx")
+    facts = generate_handbook(path, pages=args.pages)
+    questions = [f"Vad gäller enligt {f.key}?" for f in facts if f.kind == "paragraph"]
+    texts = asyncio.run(_ingest(path))
+
+    print(
+        f"Saturation: {args.rate:.0f} questions/s for {args.seconds:.0f} s, provider serves "
+        f"{args.capacity} at once × {args.latency_ms:.0f} ms "
+        f"(≈{args.capacity / args.latency_ms * 1000:.0f}/s)"
+    )
+    print(
+        f"  {'admission':<34} {'answered':>8} {'shed':>6} {'p50 ms':>7} {'p99 ms':>7} "
+        f"{'shed after ms':>13}"
+    )
+    unlimited = dict(
+        provider_chat_max_in_flight=UNLIMITED, provider_max_queue=UNLIMITED, provider_queue_timeout=0
+    )
+    limited = dict(
+        provider_chat_max_in_flight=args.capacity,
+        provider_max_queue=args.queue,
+        provider_queue_timeout=10.0,
+    )
+    for label, limits in (("none", unlimited), (f"{args.capacity} in flight, queue {args.queue}", limited)):
+        # Chat is the bottleneck here, not the question embeddings
+        _configure(embedding_max_in_flight=64, **limits)
+        r = asyncio.run(_saturation(args, questions))
+        print(
+            f"  {label:<34} {r['answered']:>8.0%} {r['shed']:>6.0%} {r['p50']:>7.0f} "
+            f"{r['p99']:>7.0f} {r['shed_p50']:>13.1f}"
+        )
+    _configure(provider_chat_max_in_flight=16, provider_max_queue=64, provider_queue_timeout=10.0)
+
+    print(
+        f"\nQuestions during ingestion: {len(texts)} chunks in batches of "
+        f"{args.batch_items}, {args.users} users, {args.embed_max_in_flight} embedding requests "
+        f"in flight"
+    )
+    print(f"  {'order':<34} {'questions':>9} {'p50 ms':>7} {'p99 ms':>7} {'ingest s':>8}")
+    for label, prioritize in (("first come, first served", False), ("questions first", True)):
+        _configure(
+            admission_priority=prioritize,
+            embedding_batch_max_items=args.batch_items,
+            embedding_max_in_flight=args.embed_max_in_flight,
+        )
+        r = asyncio.run(_ingestion(args, texts))
+        print(
+            f"  {label:<34} {r['questions']:>9} {r['p50']:>7.1f} {r['p99']:>7.1f} "
+            f"{r['ingest']:>8.2f}"
+        )
+    _configure(admission_priority=True, embedding_batch_max_items=512)
+
+    print(
+        f"\nOpenAI down (503 after {args.latency_ms:.0f} ms), Ollama up: "
+        f"{args.outage_users} users × {args.outage_questions} questions"
+    )
+    print(f"  {'breaker':<34} {'answered':>8} {'p50 ms':>7} {'sent to openai':>14}")
+    for label, threshold, fallback in (
+        ("none", 0, False),
+        ("breaker", 5, False),
+        ("breaker + fallback to Ollama", 5, True),
+    ):
+        _configure(breaker_failure_threshold=threshold, provider_fallback=fallback)
+        r = asyncio.run(_outage(args, questions, fake))
+        print(f"  {label:<34} {r['answered']:>8.0%} {r['p50']:>7.0f} {r['sent']:>14}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--capacity", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=80.0)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--queue", type=int, default=16)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--think-ms", type=float, default=20.0)
+    parser.add_argument("--batch-items", type=int, default=16)
+    parser.add_argument("--embed-max-in-flight", type=int, default=4)
+    parser.add_argument("--outage-users", type=int, default=4)
+    parser.add_argument("--outage-questions", type=int, default=10)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    fake = create_app(
+        latency_ms=args.latency_ms, token_ms=0, embed_item_ms=1.0, chat_capacity=args.capacity
+    )
+    fake_port = free_port()
+    serve_in_thread(fake, fake_port)
+    workdir = tempfile.mkdtemp(prefix="admission-")
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "EMBEDDING_PROVIDER": "ollama",
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "VECTOR_BACKEND": "numpy",
+        "NUMPY_INDEX_DIR": os.path.join(workdir, "numpy"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical.npz"),
+        "TENANTS_DIR": os.path.join(workdir, "tenants"),
+        "CATALOG_PATH": os.path.join(workdir, "catalog.sqlite3"),
+        "ANSWER_CACHE_ENABLED": "false",
+        "DIRECT_ANSWERS_ENABLED": "false",
+        "ANONYMIZED_TELEMETRY": "False",
+    })
+    try:
+        _run(args, workdir, fake)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Load benchmark: /api/chat throughput vs. number of concurrent users.
+
+Runs the backend and a fake provider (see fake_provider.py) on local ports
+and fires concurrent chat requests. With non-blocking provider calls the
+throughput should grow roughly linearly with concurrency until the fake
+provider latency is no longer the bottleneck.
+
+    cd backend
+    python -m benchmarks.chat_load --provider ollama --latency-ms 100
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import logging
+
+import httpx
+
+from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+
+
+async def _run_level(base_url: str, provider: str, users: int, requests_per_user: int) -> dict:
+    latencies: list[float] = []
+
+    async def user(client: httpx.AsyncClient, n: int) -> None:
+        for i in range(requests_per_user):
+            start = time.perf_counter()
+            resp = await client.post(
+                f"{base_url}/api/chat",
+                json={"question": f"När betalas lönen ut? ({n}-{i})", "provider": provider},
+            )
+            resp.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    async with httpx.AsyncClient(timeout=300.0) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(user(client, n) for n in range(users)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "users": users,
+        "requests": len(latencies),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--provider", choices=["openai", "ollama"], default="ollama")
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--users", default="1,2,4,8,16,32")
+    parser.add_argument("--requests-per-user", type=int, default=5)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    fake_port = free_port()
+    serve_in_thread(create_app(latency_ms=args.latency_ms), fake_port)
+
+    workdir = tempfile.mkdtemp(prefix="chat-load-")
+    os.environ.update({
+        "EMBEDDING_PROVIDER": args.provider,
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "CHROMA_PERSIST_DIR": os.path.join(workdir, "chroma"),
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "ANONYMIZED_TELEMETRY": "False",
+        "CATALOG_PATH": os.path.join(workdir, "catalog.sqlite3"),
+    })
+
+    # Import after the environment is set so Settings picks it up
+    from app.main import app
+    from app.models import ChunkInfo
+    from app.providers import close_clients, start_clients
+    from app.vectorstore import add_chunks
+
+    chunks = [
+        ChunkInfo(
+            text=f"Lönen betalas ut den 25:e varje månad. Avsnitt {i} om OB-tillägg och semester.",
+            source="handbok.docx",
+            chunk_index=i,
+            section=f"Avsnitt {i % 10}",
+        )
+        for i in range(200)
+    ]
+
+    async def seed() -> None:
+        await start_clients()
+        try:
+            await add_chunks(chunks)
+        finally:
+            await close_clients()
+
+    asyncio.run(seed())
+
+    backend_port = free_port()
+    serve_in_thread(app, backend_port)
+    base_url = f"http://127.0.0.1:{backend_port}"
+
+    print(f"provider={args.provider} fake latency={args.latency_ms:.0f} ms")
+    print(f"{'users':>6} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for users in (int(u) for u in args.users.split(",")):
+        r = asyncio.run(_run_level(base_url, args.provider, users, args.requests_per_user))
+        print(f"{r['users']:>6} {r['requests']:>9} {r['rps']:>8.1f} {r['p50_ms']:>8.0f} {r['p95_ms']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Chunking speed and chunk-size predictability: word-sliced (before) vs. sentence-aware.
+
+Parses a synthetic handbook with long paragraphs once, then times only the
+chunking of its sections. Sizes are reported in both characters and
+estimated tokens; "over" counts chunks larger than the configured size in
+the configured unit, "embed tok" is the total tokens that would be sent to
+the embedding model.
+
+    cd backend
+    python -m benchmarks.chunking --pages 10000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic_docx import generate_handbook
+
+# (label, unit, chunk_size, chunk_overlap, merge_windows)
+STRATEGIES = [
+    ("word-sliced 500/50", "legacy", 500, 50, True),
+    ("chars 500/50", "chars", 500, 50, False),
+    ("chars 500/50 +windows", "chars", 500, 50, True),
+    ("chars 1000/100", "chars", 1000, 100, False),
+    ("tokens 128/16", "tokens", 128, 16, False),
+    ("tokens 256/32", "tokens", 256, 32, False),
+]
+
+
+def _legacy_chunks(sections, source, chunk_size, chunk_overlap):
+    """The chunker before sizes had a unit: ``chunk_size`` words per split piece."""
+    from app.models import ChunkInfo
+
+    chunks, previous, current_section = [], None, None
+
+    def add(text, section=None):
+        chunks.append(ChunkInfo(text=text, source=source, chunk_index=len(chunks), section=section))
+        return chunks[-1]
+
+    for section in sections:
+        if section["type"] == "heading":
+            current_section = section["text"]
+        elif section["type"] == "paragraph":
+            text = section["text"]
+            words = text.split()
+            if len(text) <= chunk_size:
+                pieces = [text]
+            else:
+                pieces, start = [], 0
+                while start < len(words):
+                    pieces.append(" ".join(words[start : start + chunk_size]))
+                    start += chunk_size - chunk_overlap
+            for piece in pieces:
+                heading = f"[Avsnitt: {current_section}]\n" if current_section else ""
+                chunk = add(heading + piece, current_section)
+                # Every chunk under a heading starts with "[", so windows only existed without one
+                if chunk.text.startswith("["):
+                    continue
+                if previous is not None and len(previous.text) + 1 + len(chunk.text) <= chunk_size * 2:
+                    add(previous.text + "\n" + chunk.text)
+                previous = chunk
+        elif section["type"] == "table_entry":
+            header = section.get("header", "")
+            text = f"[{header}] {section['text']}" if header else section["text"]
+            add(text, current_section)
+    return chunks
+
+
+def _percentile(values: list[int], q: float) -> int:
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=10_000)
+    parser.add_argument("--long-paragraph-every", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3, help="best of n runs")
+    args = parser.parse_args()
+
+    from app.chunking import iter_chunks
+    from app.document import iter_docx_sections
+    from app.tokens import estimate_tokens
+
+    path = os.path.join(tempfile.mkdtemp(prefix="chunking-"), "handbok.docx")
+    generate_handbook(path, pages=args.pages, long_paragraph_every=args.long_paragraph_every)
+    sections = list(iter_docx_sections(path))
+    paragraphs = [s["text"] for s in sections if s["type"] == "paragraph"]
+    print(
+        f"{args.pages} pages: {len(sections)} sections, {len(paragraphs)} paragraphs "
+        f"(p50 {_percentile([len(p) for p in paragraphs], 0.5)} / "
+        f"max {max(len(p) for p in paragraphs)} chars)"
+    )
+    print(
+        f"  {'strategy':<22} {'ms':>7} {'chunks':>8}   {'chars p50/p95/max':>18}   "
+        f"{'tokens p50/p95/max':>18} {'over':>6} {'embed tok':>10}"
+    )
+
+    for label, unit, size, overlap, windows in STRATEGIES:
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            if unit == "legacy":
+                chunks = _legacy_chunks(sections, "handbok.docx", size, overlap)
+            else:
+                chunks = list(iter_chunks(sections, "handbok.docx", size, overlap, unit, windows))
+            best = min(best, time.perf_counter() - start)
+
+        chars = [len(c.text) for c in chunks]
+        tokens = [estimate_tokens(c.text) for c in chunks]
+        measured = tokens if unit == "tokens" else chars
+        over = sum(m > size for m in measured)
+        print(
+            f"  {label:<22} {best * 1000:>7.0f} {len(chunks):>8}   "
+            f"{_percentile(chars, 0.5):>6}/{_percentile(chars, 0.95):>5}/{max(chars):>5}   "
+            f"{_percentile(tokens, 0.5):>6}/{_percentile(tokens, 0.95):>5}/{max(tokens):>5} "
+            f"{over:>6} {sum(tokens):>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
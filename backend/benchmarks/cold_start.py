@@ -0,0 +1,205 @@
+"""Cold start: process start → first successful ``/api/chat`` on a host with an empty disk.
+
+Each scenario starts ``uvicorn app.main:app`` in a subprocess, in a fresh
+working directory (all ``data/`` paths are relative to it), against the
+fake provider with OpenAI chat and embeddings, and measures the time until
+``/api/health`` answers and until the first ``/api/chat`` returns sources:
+
+- fresh disk, re-upload: what an ephemeral host did before snapshots —
+  upload the handbook again and wait for its job before asking;
+- warm disk: a restart with the index files still on disk;
+- snapshot, no warm-up: ``SNAPSHOT_URL`` is a file, ``WARMUP_ENABLED=false``;
+- snapshot: the same with warm-up (indexes and OpenAI client opened in the
+  lifespan);
+- snapshot, parse pool: also ``WARMUP_PARSE_POOL=true``, which starts the
+  parse processes before serving;
+- snapshot over HTTP: the snapshot downloaded from an HTTP server standing
+  in for an object store.
+
+The snapshot is exported from the re-upload scenario's data with
+``python -m app.snapshot export``. Each scenario runs ``--runs`` times;
+the medians are reported, with the first request's own latency.
+
+    cd backend
+    python -m benchmarks.cold_start --pages 300 --backend numpy
+"""
+
+import argparse
+import functools
+import http.server
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+from benchmarks.synthetic_docx import generate_handbook
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUESTION = {"question": "Vad gäller enligt regel 12?", "provider": "openai"}
+
+
+def _size_mb(path: str) -> float:
+    if os.path.isfile(path):
+        return os.path.getsize(path) / (1024 * 1024)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total / (1024 * 1024)
+
+
+def _env(fake_port: int, backend: str, **overrides: str) -> dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": BACKEND_DIR,
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "EMBEDDING_PROVIDER": "openai",
+        "VECTOR_BACKEND": backend,
+        "ANONYMIZED_TELEMETRY": "False",
+    })
+    env.update(overrides)
+    return env
+
+
+def _wait(client: httpx.Client, method: str, url: str, deadline: float, **kwargs) -> httpx.Response:
+    while True:
+        try:
+            response = client.request(method, url, **kwargs)
+            if response.status_code == 200:
+                return response
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{method} {url} did not succeed")
+        time.sleep(0.01)
+
+
+def _start(workdir: str, env: dict[str, str], upload: str | None = None) -> dict:
+    """Start the server in ``workdir``; returns seconds to health, to first answer, its latency."""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = started + 600
+        with httpx.Client(timeout=60.0) as client:
+            _wait(client, "GET", f"{base}/api/health", deadline)
+            health = time.monotonic() - started
+            if upload:
+                with open(upload, "rb") as f:
+                    job = client.post(f"{base}/api/upload", files={"file": f}).json()
+                while job["status"] not in ("done", "failed"):
+                    time.sleep(0.05)
+                    job = client.get(f"{base}/api/upload/jobs/{job['job_id']}").json()
+                if job["status"] != "done":
+                    raise RuntimeError(f"Upload failed: {job.get('error')}")
+            asked = time.monotonic()
+            response = _wait(client, "POST", f"{base}/api/chat", deadline, json=QUESTION)
+            if not response.json()["sources"]:
+                raise RuntimeError("First answer has no sources")
+            answered = time.monotonic()
+    finally:
+        process.terminate()
+        process.wait()
+    return {"health": health, "answer": answered - started, "first": answered - asked}
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+
+def _serve_directory(directory: str) -> tuple[http.server.ThreadingHTTPServer, int]:
+    """A static file server standing in for an object store."""
+    handler = functools.partial(_QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_address[1]
+
+
+def _run(args: argparse.Namespace, workdir: str, fake_port: int) -> None:
+    docx = os.path.join(workdir, "handbok.docx")
+    generate_handbook(docx, pages=args.pages)
+    snapshot = os.path.join(workdir, "snapshot.zip")
+    store, port = _serve_directory(workdir)
+
+    def fresh(name: str) -> str:
+        path = os.path.join(workdir, name)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return path
+
+    scenarios = [
+        ("fresh disk, re-upload", {}),
+        ("warm disk", {}),
+        ("snapshot, no warm-up", {"SNAPSHOT_URL": snapshot, "WARMUP_ENABLED": "false"}),
+        ("snapshot", {"SNAPSHOT_URL": snapshot}),
+        ("snapshot, parse pool", {"SNAPSHOT_URL": snapshot, "WARMUP_PARSE_POOL": "true"}),
+        ("snapshot over HTTP", {"SNAPSHOT_URL": f"http://127.0.0.1:{port}/snapshot.zip"}),
+    ]
+    results: dict[str, list[dict]] = {label: [] for label, _ in scenarios}
+    for run in range(args.runs):
+        for label, overrides in scenarios:
+            env = _env(fake_port, args.backend, **overrides)
+            if label == "fresh disk, re-upload":
+                data = fresh("uploaded")
+                results[label].append(_start(data, env, upload=docx))
+                if run == 0:
+                    subprocess.run(
+                        [sys.executable, "-m", "app.snapshot", "export", snapshot],
+                        cwd=data, env=env, check=True, capture_output=True,
+                    )
+            elif label == "warm disk":
+                results[label].append(_start(os.path.join(workdir, "uploaded"), env))
+            else:
+                results[label].append(_start(fresh("restored"), env))
+    store.shutdown()
+
+    index_mb = _size_mb(os.path.join(workdir, "uploaded", "data"))
+    print(
+        f"{args.pages} pages, {args.backend} backend, {args.runs} runs; index on disk "
+        f"{index_mb:.1f} MB, snapshot {_size_mb(snapshot):.1f} MB"
+    )
+    print(f"  {'start':<24} {'health s':>8} {'answer s':>8} {'first request ms':>16}")
+    for label, runs in results.items():
+        print(
+            f"  {label:<24} {statistics.median(r['health'] for r in runs):>8.2f} "
+            f"{statistics.median(r['answer'] for r in runs):>8.2f} "
+            f"{statistics.median(r['first'] for r in runs) * 1000:>16.0f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--backend", choices=["numpy", "chroma"], default="numpy")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--embed-item-ms", type=float, default=1.0)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    fake = create_app(latency_ms=args.latency_ms, token_ms=0, embed_item_ms=args.embed_item_ms)
+    fake_port = free_port()
+    serve_in_thread(fake, fake_port)
+    workdir = tempfile.mkdtemp(prefix="cold-start-")
+    try:
+        _run(args, workdir, fake_port)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
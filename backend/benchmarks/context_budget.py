@@ -0,0 +1,90 @@
+"""Prompt size vs. recall: plain top-k context vs. de-duplicated, budgeted context.
+
+Ingests a synthetic handbook (with and without headings, and with merged
+paragraph windows — the worst case for duplication),
+asks one question per planted fact and reports, per strategy, the mean
+estimated prompt tokens and how often the fact reaches the prompt.
+
+    cd backend
+    python -m benchmarks.context_budget --pages 200
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+
+from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+from benchmarks.synthetic_docx import generate_handbook
+
+# (label, top_k, token budget; 0 = plain top-k)
+STRATEGIES = [
+    ("plain k=5", 5, 0),
+    ("plain k=10", 10, 0),
+    ("select k=5", 5, 1500),
+    ("select k=10", 10, 1500),
+    ("select k=10/600", 10, 600),
+]
+
+
+async def _run(pages: int, questions: int, headings: bool) -> None:
+    from app.config import settings
+    from app.chunking import iter_chunks
+    from app.document import iter_docx_sections
+    from app.models import ChatRequest
+    from app.providers import close_clients
+    from app.rag import _messages, _prompt_tokens, _retrieve, build_user_message
+    from app.vectorstore import add_chunks, clear_all
+
+    await clear_all()
+    path = os.path.join(tempfile.mkdtemp(prefix="context-"), "handbok.docx")
+    facts = generate_handbook(path, pages=pages, heading_every_pages=3 if headings else 0)
+    await add_chunks(iter_chunks(iter_docx_sections(path), "handbok.docx", merge_windows=True))
+
+    asked = random.Random(1).sample(facts, min(questions, len(facts)))
+    print(f"{'with' if headings else 'without'} headings, {len(asked)} questions")
+    for label, top_k, budget in STRATEGIES:
+        settings.context_token_budget = budget
+        tokens, sources_sent, found = [], [], 0
+        for fact in asked:
+            question = f"Vad betyder {fact.key}?" if fact.kind == "table_entry" else f"Vad gäller enligt {fact.key}?"
+            _, sources = await _retrieve(ChatRequest(question=question, top_k=top_k))
+            tokens.append(_prompt_tokens(_messages(build_user_message(question, sources))))
+            sources_sent.append(len(sources))
+            found += any(fact.found_in(s.chunk_text) for s in sources)
+        print(
+            f"  {label:<16} prompt tokens {statistics.mean(tokens):>6.0f}  "
+            f"sources {statistics.mean(sources_sent):>4.1f}  recall {found / len(asked):.0%}"
+        )
+    await close_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--questions", type=int, default=150)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    fake_port = free_port()
+    serve_in_thread(create_app(latency_ms=0), fake_port)
+    workdir = tempfile.mkdtemp(prefix="context-budget-")
+    os.environ.update({
+        "EMBEDDING_PROVIDER": "ollama",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "VECTOR_BACKEND": "numpy",
+        "NUMPY_INDEX_DIR": os.path.join(workdir, "numpy"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical.npz"),
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "CATALOG_PATH": os.path.join(workdir, "catalog.sqlite3"),
+    })
+
+    for headings in (True, False):
+        asyncio.run(_run(args.pages, args.questions, headings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Multi-turn conversations: follow-up retrieval and prompt tokens per turn.
+
+Each conversation alternates a question about a planted rule ("Vad gäller
+enligt regel 12?") with a follow-up that only makes sense after it ("Och
+vad innebär det i praktiken?"). It runs through ``generate_response`` with
+the OpenAI provider against the fake provider, in three modes:
+
+- single questions: no ``conversation_id``, as before conversations existed;
+- conversation without rewriting the follow-up (``CONVERSATION_CONDENSE=false``);
+- conversation: follow-ups rewritten into standalone questions.
+
+Reports how often a follow-up's sources hold the rule it refers to, its
+latency, and the prompt tokens per answer, of which the provider's prompt
+cache served how many, plus the tokens the rewrites and summaries cost.
+The fake provider counts tokens as words and caches whole messages (see
+``fake_provider``); ``--answer-words`` pads its answers to a realistic
+length.
+
+    cd backend
+    python -m benchmarks.conversations --pages 300 --conversations 20 --turns 12
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+
+from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+from benchmarks.synthetic_docx import generate_handbook
+
+FOLLOW_UPS = [
+    "Och vad innebär det i praktiken?",
+    "Kan du citera det exakt?",
+    "Gäller det även vid deltid?",
+]
+
+MODES = [
+    ("single questions", False, False),
+    ("conversation, no rewrite", True, False),
+    ("conversation", True, True),
+]
+
+
+async def _run_mode(args, facts, fake, with_conversation: bool, condense: bool) -> dict:
+    from app.conversations import _tasks
+    from app.config import settings
+    from app.models import ChatRequest
+    from app.rag import generate_response
+
+    settings.conversation_condense = condense
+    rng = random.Random(0)
+    found, latencies = 0, []
+    per_turn: dict[int, list[tuple[int, int]]] = {}
+    usage_before = len(fake.state.chat_usage)
+    follow_ups = 0
+
+    for _ in range(args.conversations):
+        conversation_id = uuid.uuid4().hex if with_conversation else None
+        fact = None
+        for turn in range(1, args.turns + 1):
+            follow_up = turn % 2 == 0
+            if follow_up:
+                question = rng.choice(FOLLOW_UPS)
+            else:
+                fact = rng.choice(facts)
+                question = f"Vad gäller enligt {fact.key}?"
+            start = time.perf_counter()
+            response = await generate_response(
+                ChatRequest(question=question, provider="openai", conversation_id=conversation_id)
+            )
+            elapsed = (time.perf_counter() - start) * 1000
+            if follow_up:
+                follow_ups += 1
+                latencies.append(elapsed)
+                found += any(fact.found_in(s.chunk_text) for s in response.sources)
+            kind, prompt, cached = fake.state.chat_usage[-1]
+            if kind == "answer":
+                per_turn.setdefault(turn, []).append((prompt, cached))
+            # Let a pending summary finish, as it would between a user's turns
+            while _tasks:
+                await asyncio.sleep(0.001)
+
+    usage = fake.state.chat_usage[usage_before:]
+    answers = [(p, c) for kind, p, c in usage if kind == "answer"]
+    return {
+        "found": found / max(follow_ups, 1),
+        "p50": statistics.median(latencies),
+        "prompt": statistics.mean(p for p, _ in answers),
+        "cached": statistics.mean(c for _, c in answers),
+        "aux": sum(p for kind, p, _ in usage if kind != "answer") / len(answers),
+        "per_turn": per_turn,
+    }
+
+
+async def _run(args: argparse.Namespace, workdir: str, fake) -> None:
+    from app.chunking import iter_chunks
+    from app.document import iter_docx_sections
+    from app.providers import close_clients, start_clients
+    from app.vectorstore import add_chunks
+
+    await start_clients()
+    path = os.path.join(workdir, "handbok.docx")
+    facts = [f for f in generate_handbook(path, pages=args.pages) if f.kind == "paragraph"]
+    await add_chunks(iter_chunks(iter_docx_sections(path), "handbok.docx"))
+
+    print(
+        f"{args.pages} pages, {args.conversations} conversations × {args.turns} turns, "
+        f"answers ~{args.answer_words} words, prompt cache from {args.cache_min_tokens} tokens"
+    )
+    print(
+        f"  {'mode':<26} {'follow-up found':>15} {'p50 ms':>7} {'prompt':>7} "
+        f"{'cached':>7} {'rewrite+summary':>16}"
+    )
+    conversation = None
+    for label, with_conversation, condense in MODES:
+        r = await _run_mode(args, facts, fake, with_conversation, condense)
+        print(
+            f"  {label:<26} {r['found']:>15.0%} {r['p50']:>7.1f} {r['prompt']:>7.0f} "
+            f"{r['cached']:>7.0f} {r['aux']:>16.0f}"
+        )
+        conversation = r
+
+    print("\nPrompt tokens per turn (conversation)")
+    print(f"  {'turn':>4} {'prompt':>7} {'cached':>7} {'uncached':>9}")
+    for turn, usage in sorted(conversation["per_turn"].items()):
+        prompt = statistics.mean(p for p, _ in usage)
+        cached = statistics.mean(c for _, c in usage)
+        print(f"  {turn:>4} {prompt:>7.0f} {cached:>7.0f} {prompt - cached:>9.0f}")
+    await close_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--conversations", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--answer-words", type=int, default=150)
+    parser.add_argument("--cache-min-tokens", type=int, default=1024)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    fake = create_app(
+        latency_ms=args.latency_ms,
+        token_ms=0,
+        answer_words=args.answer_words,
+        prompt_cache_min_tokens=args.cache_min_tokens,
+    )
+    fake_port = free_port()
+    serve_in_thread(fake, fake_port)
+    workdir = tempfile.mkdtemp(prefix="conversations-")
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "EMBEDDING_PROVIDER": "openai",
+        "VECTOR_BACKEND": "numpy",
+        "NUMPY_INDEX_DIR": os.path.join(workdir, "numpy"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical.npz"),
+        "TENANTS_DIR": os.path.join(workdir, "tenants"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "CATALOG_PATH": os.path.join(workdir, "catalog.sqlite3"),
+        "ANSWER_CACHE_ENABLED": "false",
+        "ANONYMIZED_TELEMETRY": "False",
+    })
+    try:
+        asyncio.run(_run(args, workdir, fake))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
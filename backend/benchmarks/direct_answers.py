@@ -0,0 +1,118 @@
+"""ORSAK lookups answered from the direct-answer index vs. retrieval + LLM.
+
+Ingests a synthetic handbook the way an upload does (table rows become
+direct-answer entries) and asks ``/api/chat``-style questions through
+``generate_response``: "Vad betyder ORSAK-…?" for planted table facts,
+and "Vad gäller enligt regel …?" for paragraph facts, which must still go
+to the LLM. Runs with direct answers off and on, against fake providers
+with ``--latency-ms`` per request. Reports the share answered directly,
+how often the answer holds the planted explanation, latency p50/p99 and
+the prompt tokens sent.
+
+    cd backend
+    python -m benchmarks.direct_answers --pages 500
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+from benchmarks.synthetic_docx import generate_handbook
+
+
+def _question(fact) -> str:
+    if fact.kind == "table_entry":
+        return f"Vad betyder {fact.key}?"
+    return f"Vad gäller enligt {fact.key}?"
+
+
+async def _run(args: argparse.Namespace, workdir: str) -> None:
+    from app.chunking import iter_chunks
+    from app.config import settings
+    from app.answer_entries import AnswerCollector
+    from app.document import iter_docx_sections
+    from app.models import ChatRequest
+    from app.providers import close_clients, start_clients
+    from app.rag import generate_response
+    from app.vectorstore import add_chunks
+
+    await start_clients()
+    path = os.path.join(workdir, "handbok.docx")
+    facts = generate_handbook(path, pages=args.pages)
+    collector = AnswerCollector()
+    chunks = iter_chunks(iter_docx_sections(path), "handbok.docx", on_table_entry=collector)
+    await add_chunks(chunks, answers={"handbok.docx": collector.entries})
+
+    rng = random.Random(0)
+    by_kind = {kind: [f for f in facts if f.kind == kind] for kind in ("table_entry", "paragraph")}
+    print(
+        f"{args.pages} pages, {len(collector.entries)} direct-answer entries, "
+        f"LLM/embedding latency {args.latency_ms:.0f} ms"
+    )
+    print(
+        f"  {'questions':<10} {'direct answers':<15} {'direct':>7} {'correct':>8} "
+        f"{'p50 ms':>7} {'p99 ms':>7} {'prompt tok':>10}"
+    )
+    for kind, label in (("table_entry", "ORSAK"), ("paragraph", "regel")):
+        asked = rng.sample(by_kind[kind], min(args.queries, len(by_kind[kind])))
+        for enabled in (False, True):
+            settings.direct_answers_enabled = enabled
+            latencies, direct, correct, tokens = [], 0, 0, []
+            for fact in asked:
+                start = time.perf_counter()
+                response = await generate_response(
+                    ChatRequest(question=_question(fact), provider="ollama")
+                )
+                latencies.append((time.perf_counter() - start) * 1000)
+                direct += response.direct
+                correct += response.direct and fact.text in response.answer
+                tokens.append(response.prompt_tokens or 0)
+            latencies.sort()
+            print(
+                f"  {label:<10} {'on' if enabled else 'off':<15} {direct / len(asked):>7.0%} "
+                f"{correct / max(direct, 1):>8.0%} {statistics.median(latencies):>7.1f} "
+                f"{latencies[int(0.99 * (len(latencies) - 1))]:>7.1f} "
+                f"{statistics.mean(tokens):>10.0f}"
+            )
+    await close_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    fake_port = free_port()
+    serve_in_thread(create_app(latency_ms=args.latency_ms, token_ms=0), fake_port)
+    workdir = tempfile.mkdtemp(prefix="direct-")
+    os.environ.update({
+        "EMBEDDING_PROVIDER": "ollama",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "VECTOR_BACKEND": "numpy",
+        "NUMPY_INDEX_DIR": os.path.join(workdir, "numpy"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical.npz"),
+        "TENANTS_DIR": os.path.join(workdir, "tenants"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "CATALOG_PATH": os.path.join(workdir, "catalog.sqlite3"),
+        # Every question should reach the LLM when it is not answered directly
+        "ANSWER_CACHE_ENABLED": "false",
+        "ANONYMIZED_TELEMETRY": "False",
+    })
+    try:
+        asyncio.run(_run(args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
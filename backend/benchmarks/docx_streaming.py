@@ -0,0 +1,143 @@
+"""Peak memory and wall time of DOCX ingestion: python-docx vs. materialized vs. streaming.
+
+Each mode runs in its own subprocess so peak RSS is measured in isolation:
+
+- ``python-docx``: load the document object model and walk paragraphs and tables
+  (what ``parse_docx`` used to do)
+- ``materialized``: ``parse_docx`` + ``chunk_document`` into lists
+- ``streaming``: ``iter_docx_sections`` → ``iter_chunks`` consumed in
+  ``ingest_batch_size`` batches, as the upload pipeline does
+- ``indexed``: the same stream through ``add_chunks`` — embedded by the
+  fake provider (``--dim`` dimensions) and written to a NumPy index — so
+  the peak covers embed and store too
+
+    cd backend
+    python -m benchmarks.docx_streaming --pages 10000
+    python -m benchmarks.docx_streaming --pages 2000 --modes streaming,indexed
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_docx import generate_handbook
+
+MODES = ["python-docx", "materialized", "streaming", "indexed"]
+
+
+def _index(path: str, dim: int) -> int:
+    """``add_chunks`` into a NumPy index in a temporary directory; returns the chunk count."""
+    from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+
+    port = free_port()
+    serve_in_thread(create_app(latency_ms=0, dim=dim, token_ms=0), port)
+    workdir = tempfile.mkdtemp(prefix="docx-index-")
+    os.environ.update({
+        "EMBEDDING_PROVIDER": "ollama",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{port}",
+        "VECTOR_BACKEND": "numpy",
+        "NUMPY_INDEX_DIR": os.path.join(workdir, "numpy"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical.npz"),
+        "CATALOG_PATH": os.path.join(workdir, "catalog.sqlite3"),
+        "EMBEDDING_CACHE_ENABLED": "false",
+    })
+
+    from app.chunking import iter_chunks
+    from app.document import iter_docx_sections
+    from app.providers import close_clients, start_clients
+    from app.vectorstore import add_chunks
+
+    async def run() -> int:
+        await start_clients()
+        stream = iter_chunks(iter_docx_sections(path), os.path.basename(path))
+        result = await add_chunks(stream)
+        await close_clients()
+        return result.added
+
+    try:
+        return asyncio.run(run())
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _worker(mode: str, path: str, dim: int) -> dict:
+    start = time.perf_counter()
+    chunks = 0
+
+    if mode == "python-docx":
+        from docx import Document
+
+        doc = Document(path)
+        texts = [p.text for p in doc.paragraphs]
+        cells = [[c.text for c in row.cells] for t in doc.tables for row in t.rows]
+        chunks = len(texts) + len(cells)
+
+    elif mode == "materialized":
+        from app.chunking import chunk_document
+        from app.document import parse_docx
+
+        parsed = parse_docx(path, os.path.basename(path))
+        chunks = len(chunk_document(parsed))
+
+    elif mode == "indexed":
+        chunks = _index(path, dim)
+
+    else:
+        from app.chunking import iter_chunks
+        from app.config import settings
+        from app.document import iter_docx_sections
+
+        stream = iter_chunks(iter_docx_sections(path), os.path.basename(path))
+        while batch := list(itertools.islice(stream, settings.ingest_batch_size)):
+            chunks += len(batch)
+
+    return {
+        "mode": mode,
+        "chunks": chunks,
+        "seconds": round(time.perf_counter() - start, 2),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=10_000)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--dim", type=int, default=1536, help="embedding dimensions (indexed)")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(_worker(*args.worker, args.dim)))
+        return
+
+    path = os.path.join(tempfile.mkdtemp(prefix="docx-bench-"), f"handbook-{args.pages}.docx")
+    start = time.perf_counter()
+    generate_handbook(path, pages=args.pages)
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    print(f"{args.pages} pages, {size_mb:.1f} MB docx, generated in {time.perf_counter() - start:.1f} s")
+
+    print(f"{'mode':<14} {'chunks':>9} {'seconds':>8} {'peak RSS MB':>12}")
+    for mode in args.modes.split(","):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.docx_streaming", "--worker", mode, path,
+             "--dim", str(args.dim)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{r['mode']:<14} {r['chunks']:>9} {r['seconds']:>8} {r['peak_rss_mb']:>12}")
+
+
+if __name__ == "__main__":
+    main()
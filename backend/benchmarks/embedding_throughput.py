@@ -0,0 +1,111 @@
+"""Embedding throughput: sequential batches vs. the concurrent scheduler.
+
+Embeds a synthetic corpus through ``embed_texts`` against the fake provider,
+whose embedding latency is ``latency_ms`` per request plus ``item_ms`` per
+text, once per configuration. ``--rate-limit-every n`` makes every n-th
+request fail with 429 + Retry-After to exercise backoff.
+
+    cd backend
+    python -m benchmarks.embedding_throughput --provider openai --texts 20000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+
+from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+
+# (label, max_in_flight, batch_max_tokens, batch_max_items)
+CONFIGS = [
+    ("sequential, 512/batch", 1, 10**9, 512),
+    ("2 in flight", 2, 16_000, 512),
+    ("4 in flight", 4, 16_000, 512),
+    ("8 in flight", 8, 16_000, 512),
+]
+
+_WORDS = (
+    "lön arbetsgivare medarbetare avtal ersättning timme månad utbetalning beräknas "
+    "enligt gäller schema period semesterdagar sjuklön övertid skatteavdrag"
+).split()
+
+
+def _corpus(n: int, chars: int) -> list[str]:
+    rng = random.Random(0)
+    texts = []
+    for i in range(n):
+        words: list[str] = [f"stycke {i}"]
+        while sum(len(w) + 1 for w in words) < chars:
+            words.append(rng.choice(_WORDS))
+        texts.append(" ".join(words))
+    return texts
+
+
+async def _run(texts: list[str], provider: str) -> tuple[float, int]:
+    from app import embeddings
+    from app.admission import Priority
+
+    start = time.perf_counter()
+    # As an upload does: bulk embeddings must not be shed like a question's
+    vectors = await embeddings.embed_texts(texts, provider=provider, priority=Priority.BACKGROUND)
+    elapsed = time.perf_counter() - start
+    assert len(vectors) == len(texts)
+    return elapsed, embeddings._get_scheduler(provider).retries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--provider", choices=["openai", "ollama"], default="openai")
+    parser.add_argument("--texts", type=int, default=20_000)
+    parser.add_argument("--chars", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=100.0)
+    parser.add_argument("--item-ms", type=float, default=2.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    fake = create_app(
+        latency_ms=args.latency_ms,
+        embed_item_ms=args.item_ms,
+        rate_limit_every=args.rate_limit_every,
+        # Small vectors keep the in-process fake server from becoming the bottleneck
+        dim=8,
+    )
+    fake_port = free_port()
+    serve_in_thread(fake, fake_port)
+
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        # Measure the provider path, not the cache
+        "EMBEDDING_CACHE_ENABLED": "false",
+    })
+
+    # Import after the environment is set so Settings picks it up
+    from app.config import settings
+
+    texts = _corpus(args.texts, args.chars)
+    print(f"{len(texts)} texts of ~{args.chars} chars, {args.provider}, "
+          f"{args.latency_ms:.0f} ms + {args.item_ms} ms/text per request")
+    print(f"{'config':<24} {'seconds':>8} {'texts/s':>9} {'requests':>9} {'peak':>5} {'retries':>8}")
+
+    for label, in_flight, max_tokens, max_items in CONFIGS:
+        settings.embedding_max_in_flight = in_flight
+        settings.embedding_batch_max_tokens = max_tokens
+        settings.embedding_batch_max_items = max_items
+        fake.state.calls["embed"] = 0
+        fake.state.embed_peak_in_flight = 0
+
+        # A fresh loop per config also gives a fresh scheduler
+        elapsed, retries = asyncio.run(_run(texts, args.provider))
+        print(
+            f"{label:<24} {elapsed:>8.2f} {len(texts) / elapsed:>9.0f} "
+            f"{fake.state.calls['embed']:>9} {fake.state.embed_peak_in_flight:>5} {retries:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""Deterministic local stand-in for the OpenAI and Ollama HTTP APIs.
+
+Serves the endpoints the backend uses (embeddings, chat completions, model
+list) with a configurable artificial latency, so benchmarks can run offline
+and measure the backend itself rather than a remote provider.
+
+Chat completions recognise the conversation prompts: a follow-up rewrite
+returns the previous question followed by the follow-up, a summary lists
+the questions asked. The OpenAI endpoint reports prompt-cache hits the way
+OpenAI does (``prompt_tokens_details.cached_tokens``), counted here in
+whole messages: the longest message prefix sent before, if it is at least
+``prompt_cache_min_tokens``, rounded down to 128-token steps.
+
+``chat_capacity`` models a provider that slows down under load: at most
+that many chat requests are served at once, the rest wait inside the
+provider. Adding ``"openai"`` or ``"ollama"`` to ``app.state.down`` makes
+that provider's chat endpoint answer 503 after ``latency_ms``.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import json
+import math
+import re
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+# Dimensions hashed together; every block uses its own hash
+_BLOCK_DIM = 64
+
+
+def fake_embedding(text: str, dim: int = 64) -> list[float]:
+    """Hashing-trick bag of words — similar texts get similar vectors.
+
+    Each block of 64 dimensions is a separate hashing of the words, so the
+    first n dimensions are an embedding of their own (like a Matryoshka
+    model's). Block 0 is salted with zeros, the same as no salt.
+    """
+    vec = [0.0] * dim
+    for word in _WORD_RE.findall(text.lower()):
+        for block in range(0, dim, _BLOCK_DIM):
+            salt = (block // _BLOCK_DIM).to_bytes(16, "little")
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8, salt=salt).digest()
+            bucket = block + int.from_bytes(digest[:4], "little") % min(_BLOCK_DIM, dim - block)
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vec[bucket] += sign
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def fake_token_count(text: str) -> int:
+    return len(_WORD_RE.findall(text))
+
+
+def fake_answer(user_message: str) -> str:
+    if "FÖLJDFRÅGA:" in user_message:
+        history, follow_up = user_message.rsplit("FÖLJDFRÅGA:", 1)
+        asked = [line[11:] for line in history.splitlines() if line.startswith("Användare: ")]
+        return f"{asked[-1] if asked else ''} {follow_up.strip()}".strip()
+    if "SAMTAL ATT SAMMANFATTA:" in user_message:
+        asked = [line[11:] for line in user_message.splitlines() if line.startswith("Användare: ")]
+        return "Användaren har frågat: " + "; ".join(asked)
+    question = user_message.rsplit("FRÅGA:", 1)[-1].strip()
+    return f"Enligt dokumentet gäller följande för frågan: {question[:200]}"
+
+
+def fake_kind(user_message: str) -> str:
+    if "FÖLJDFRÅGA:" in user_message:
+        return "condense"
+    if "SAMTAL ATT SAMMANFATTA:" in user_message:
+        return "summary"
+    return "answer"
+
+
+def create_app(
+    latency_ms: float = 50.0,
+    dim: int = 64,
+    token_ms: float = 5.0,
+    embed_item_ms: float = 0.0,
+    rate_limit_every: int = 0,
+    retry_after: float = 0.2,
+    prompt_cache_min_tokens: int = 1024,
+    answer_words: int = 0,
+    chat_capacity: int = 0,
+) -> FastAPI:
+    """``latency_ms`` is paid before the first token/response, ``token_ms`` per streamed token.
+
+    Embedding requests additionally take ``embed_item_ms`` per input text, and
+    with ``rate_limit_every=n`` every n-th one is rejected with 429 and
+    ``Retry-After: retry_after``. Answers are padded to ``answer_words``
+    words with words of the prompt. ``app.state.chat_usage`` records
+    ``(kind, prompt_tokens, cached_tokens)`` of every chat request.
+    """
+    app = FastAPI(title="Fake LLM provider")
+    app.state.calls = {"embed": 0, "chat": 0, "rate_limited": 0, "unavailable": 0}
+    app.state.chat_usage = []
+    # Digest of every message prefix sent → its tokens
+    app.state.prompt_prefixes = {}
+    app.state.embed_in_flight = 0
+    app.state.embed_peak_in_flight = 0
+    app.state.down = set()
+    delay = latency_ms / 1000.0
+    capacity = asyncio.Semaphore(chat_capacity) if chat_capacity > 0 else None
+
+    @contextlib.asynccontextmanager
+    async def _chat_slot():
+        if capacity is None:
+            yield
+            return
+        async with capacity:
+            yield
+
+    async def _unavailable(provider: str) -> JSONResponse | None:
+        if provider not in app.state.down:
+            return None
+        app.state.calls["unavailable"] += 1
+        await asyncio.sleep(delay)
+        return JSONResponse(
+            {"error": {"message": "Service unavailable", "type": "server_error"}},
+            status_code=503,
+        )
+
+    def _last_user(messages: list[dict]) -> str:
+        return next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+
+    def _answer(messages: list[dict]) -> str:
+        user_message = _last_user(messages)
+        answer = fake_answer(user_message)
+        words = answer.split(" ")
+        if fake_kind(user_message) != "answer" or len(words) >= answer_words:
+            return answer
+        filler = _WORD_RE.findall(user_message) or ["text"]
+        words += [filler[i % len(filler)] for i in range(answer_words - len(words))]
+        return " ".join(words)
+
+    def _cached_tokens(messages: list[dict]) -> int:
+        digest, tokens, cached = hashlib.sha256(), 0, 0
+        for message in messages:
+            digest.update(json.dumps(message, sort_keys=True, ensure_ascii=False).encode())
+            tokens += fake_token_count(message["content"])
+            key = digest.hexdigest()
+            cached = app.state.prompt_prefixes.get(key, cached)
+            app.state.prompt_prefixes[key] = tokens
+        if cached < prompt_cache_min_tokens:
+            return 0
+        return prompt_cache_min_tokens + (cached - prompt_cache_min_tokens) // 128 * 128
+
+    def _usage(messages: list[dict], answer: str) -> dict:
+        prompt = sum(fake_token_count(m["content"]) for m in messages)
+        completion = fake_token_count(answer)
+        cached = _cached_tokens(messages)
+        app.state.chat_usage.append((fake_kind(_last_user(messages)), prompt, cached))
+        return {
+            "prompt_tokens": prompt,
+            "completion_tokens": completion,
+            "total_tokens": prompt + completion,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+    async def _tokens(messages: list[dict]):
+        async with _chat_slot():
+            await asyncio.sleep(delay)
+            for word in _answer(messages).split(" "):
+                yield word + " "
+                await asyncio.sleep(token_ms / 1000.0)
+
+    async def _embed(body: dict) -> list[list[float]] | JSONResponse:
+        app.state.calls["embed"] += 1
+        if rate_limit_every and app.state.calls["embed"] % rate_limit_every == 0:
+            app.state.calls["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"Retry-After": str(retry_after)},
+            )
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        app.state.embed_in_flight += 1
+        app.state.embed_peak_in_flight = max(app.state.embed_peak_in_flight, app.state.embed_in_flight)
+        try:
+            await asyncio.sleep(delay + len(texts) * embed_item_ms / 1000.0)
+        finally:
+            app.state.embed_in_flight -= 1
+        return [fake_embedding(t, dim) for t in texts]
+
+    # --- Ollama ---
+
+    @app.post("/api/embed")
+    async def ollama_embed(body: dict):
+        vectors = await _embed(body)
+        if isinstance(vectors, JSONResponse):
+            return vectors
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        return {
+            "model": body["model"],
+            "embeddings": vectors,
+            "prompt_eval_count": sum(fake_token_count(t) for t in texts),
+        }
+
+    @app.post("/api/chat")
+    async def ollama_chat(body: dict):
+        app.state.calls["chat"] += 1
+        if unavailable := await _unavailable("ollama"):
+            return unavailable
+        usage = _usage(body["messages"], _answer(body["messages"]))
+        counts = {"prompt_eval_count": usage["prompt_tokens"], "eval_count": usage["completion_tokens"]}
+        if body.get("stream", True):
+            async def ndjson():
+                async for token in _tokens(body["messages"]):
+                    message = {"role": "assistant", "content": token}
+                    yield json.dumps({"model": body["model"], "message": message, "done": False}) + "\n"
+                yield json.dumps({"model": body["model"], "done": True, **counts}) + "\n"
+            return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+        async with _chat_slot():
+            await asyncio.sleep(delay)
+        return {
+            "model": body["model"],
+            "message": {"role": "assistant", "content": _answer(body["messages"])},
+            "done": True,
+            **counts,
+        }
+
+    @app.get("/api/tags")
+    async def ollama_tags():
+        return {"models": [{"name": "fake-model"}]}
+
+    # --- OpenAI ---
+
+    @app.post("/v1/embeddings")
+    async def openai_embeddings(body: dict):
+        vectors = await _embed(body)
+        if isinstance(vectors, JSONResponse):
+            return vectors
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        tokens = sum(fake_token_count(t) for t in texts)
+        return {
+            "object": "list",
+            "model": body["model"],
+            "data": [
+                {"object": "embedding", "index": i, "embedding": v}
+                for i, v in enumerate(vectors)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(body: dict):
+        app.state.calls["chat"] += 1
+        if unavailable := await _unavailable("openai"):
+            return unavailable
+        usage = _usage(body["messages"], _answer(body["messages"]))
+        if body.get("stream"):
+            async def sse():
+                async for token in _tokens(body["messages"]):
+                    chunk = {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body["model"],
+                        "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    chunk = {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body["model"],
+                        "choices": [],
+                        "usage": usage,
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(sse(), media_type="text/event-stream")
+
+        async with _chat_slot():
+            await asyncio.sleep(delay)
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": _answer(body["messages"])},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_in_thread(app, port: int) -> uvicorn.Server:
+    """Start an ASGI app on 127.0.0.1:port in a daemon thread and wait until it's up."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
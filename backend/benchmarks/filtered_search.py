@@ -0,0 +1,125 @@
+"""Metadata-filtered search: a question about one handbook among many, with and without a filter.
+
+Ingests ``--documents`` handbooks (``--pages`` each, different seeds) into
+one tenant with the fake provider's embeddings. The handbooks share their
+structure — every one has a "regel 12" and ORSAK codes from the same
+range — the way several versions or companies' handbooks would. Questions
+are asked about the first handbook three ways: unfiltered, filtered to its
+source, and filtered to its source and the fact's entry type. Reports
+search p50/p99, the share of retrieved chunks from the other handbooks,
+and how often the planted fact was retrieved from the right handbook.
+
+    cd backend
+    python -m benchmarks.filtered_search --documents 20 --pages 100
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+from benchmarks.synthetic_docx import generate_handbook
+
+
+def _question(fact) -> str:
+    if fact.kind == "table_entry":
+        return f"Vad betyder {fact.key}?"
+    return f"Vad gäller enligt {fact.key}?"
+
+
+async def _run(args: argparse.Namespace, workdir: str) -> None:
+    from app.chunking import iter_chunks
+    from app.config import settings
+    from app.document import iter_docx_sections
+    from app.embeddings import embed_query
+    from app.models import SearchFilters
+    from app.providers import close_clients, start_clients
+    from app.vectorstore import add_chunks, get_facets, get_stats, search, where_for
+
+    await start_clients()
+    facts = []
+    for n in range(args.documents):
+        path = os.path.join(workdir, f"handbok-{n:02d}.docx")
+        planted = generate_handbook(path, pages=args.pages, seed=n)
+        if n == 0:
+            facts = planted
+        sections = iter_docx_sections(path)
+        await add_chunks(iter_chunks(sections, os.path.basename(path), merge_windows=True))
+    target = "handbok-00.docx"
+    facets = get_facets()
+    print(
+        f"{settings.vector_backend}: {args.documents} handbooks, "
+        f"{get_stats()['total_chunks']} chunks, {len(facets.sections)} sections; "
+        f"{target} has {next(f.count for f in facets.sources if f.value == target)} chunks"
+    )
+
+    asked = random.Random(0).sample(facts, min(args.queries, len(facts)))
+    questions = [(fact, await embed_query(_question(fact))) for fact in asked]
+
+    def filters_for(label: str, fact) -> SearchFilters | None:
+        if label == "none":
+            return None
+        if label == "source":
+            return SearchFilters(sources=[target])
+        return SearchFilters(sources=[target], kinds=[fact.kind])
+
+    print(f"  {'filter':<12} {'p50 ms':>8} {'p99 ms':>8} {'foreign':>8} {'found':>7}")
+    for label in ("none", "source", "source+kind"):
+        # Warm-up: the first query touches the pages of the index
+        fact, embedding = questions[0]
+        where = where_for(filters_for(label, fact))
+        await search(_question(fact), args.top_k, embedding, where)
+
+        latencies, foreign, total, found = [], 0, 0, 0
+        for fact, embedding in questions:
+            where = where_for(filters_for(label, fact))
+            start = time.perf_counter()
+            sources = await search(_question(fact), args.top_k, embedding, where)
+            latencies.append((time.perf_counter() - start) * 1000)
+            foreign += sum(s.source != target for s in sources)
+            total += len(sources)
+            found += any(s.source == target and fact.found_in(s.chunk_text) for s in sources)
+        latencies.sort()
+        print(
+            f"  {label:<12} {statistics.median(latencies):>8.2f} "
+            f"{latencies[int(0.99 * (len(latencies) - 1))]:>8.2f} "
+            f"{foreign / max(total, 1):>8.0%} {found / len(questions):>7.0%}"
+        )
+    await close_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--backend", choices=["numpy", "chroma"], default="numpy")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    fake_port = free_port()
+    serve_in_thread(create_app(latency_ms=0), fake_port)
+    workdir = tempfile.mkdtemp(prefix="filtered-")
+    os.environ.update({
+        "EMBEDDING_PROVIDER": "ollama",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "VECTOR_BACKEND": args.backend,
+        "CHROMA_PERSIST_DIR": os.path.join(workdir, "chroma"),
+        "NUMPY_INDEX_DIR": os.path.join(workdir, "numpy"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical.npz"),
+        "TENANTS_DIR": os.path.join(workdir, "tenants"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "ANONYMIZED_TELEMETRY": "False",
+        "CATALOG_PATH": os.path.join(workdir, "catalog.sqlite3"),
+    })
+    asyncio.run(_run(args, workdir))
+
+
+if __name__ == "__main__":
+    main()
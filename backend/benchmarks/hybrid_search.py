@@ -0,0 +1,124 @@
+"""BM25 query latency at scale, and exact-term recall: dense vs. hybrid retrieval.
+
+1. Builds a BM25 index over ``--chunks`` synthetic handbook chunks and
+   reports build time, on-disk size, load time and p50/p99 query latency.
+2. Ingests a synthetic handbook (``--pages``) through ``add_chunks`` with
+   the fake provider's embeddings and asks for ORSAK codes and rule
+   numbers; reports how often the chunk holding the answer is in the
+   top k with dense-only vs. hybrid retrieval.
+
+    cd backend
+    python -m benchmarks.hybrid_search --chunks 100000 --pages 300
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+from benchmarks.synthetic_docx import generate_handbook
+
+
+def _bm25_latency(chunks: int, queries: int, top_k: int) -> None:
+    from app.lexical import BM25Index
+    from benchmarks.synthetic_docx import _CAUSES, _TOPICS, _WORDS
+
+    rng = random.Random(0)
+    texts = []
+    for i in range(chunks):
+        words = [rng.choice(_WORDS) for _ in range(60)]
+        if i % 10 == 0:
+            words.insert(0, f"ORSAK-{i:06d} {rng.choice(_CAUSES)}")
+        texts.append(f"{_TOPICS[i % len(_TOPICS)]}: " + " ".join(words))
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bm25-"), "lexical.npz")
+    index = BM25Index(path)
+    start = time.perf_counter()
+    for offset in range(0, chunks, 1000):
+        index.add([f"c{i}" for i in range(offset, min(offset + 1000, chunks))], texts[offset : offset + 1000])
+    index.flush()
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = BM25Index(path)
+    load_s = time.perf_counter() - start
+
+    questions = [
+        f"Vad betyder ORSAK-{rng.randrange(0, chunks, 10):06d}?" if n % 2 else
+        f"Hur beräknas {rng.choice(_TOPICS).lower()} och {rng.choice(_WORDS)} för {rng.choice(_WORDS)}?"
+        for n in range(queries)
+    ]
+    latencies = []
+    for q in questions:
+        t = time.perf_counter()
+        index.search(q, top_k)
+        latencies.append((time.perf_counter() - t) * 1000)
+    latencies.sort()
+    print(
+        f"BM25, {chunks} chunks: build {build_s:.1f} s, {os.path.getsize(path) / 1e6:.1f} MB on disk, "
+        f"load {load_s * 1000:.0f} ms, query p50 {statistics.median(latencies):.2f} ms, "
+        f"p99 {latencies[int(0.99 * (len(latencies) - 1))]:.2f} ms"
+    )
+
+
+async def _recall(pages: int, top_k: int, questions: int) -> None:
+    from app.chunking import iter_chunks
+    from app.config import settings
+    from app.document import iter_docx_sections
+    from app.providers import close_clients
+    from app.vectorstore import add_chunks, search
+
+    path = os.path.join(tempfile.mkdtemp(prefix="hybrid-"), "handbok.docx")
+    facts = generate_handbook(path, pages=pages)
+    await add_chunks(iter_chunks(iter_docx_sections(path), "handbok.docx"))
+
+    rng = random.Random(1)
+    asked = rng.sample(facts, min(questions, len(facts)))
+    print(f"{len(asked)} exact-term questions over {pages} pages, top_k={top_k}")
+    for hybrid in (False, True):
+        settings.hybrid_search = hybrid
+        found = 0
+        for fact in asked:
+            if fact.kind == "table_entry":
+                question = f"Vad betyder {fact.key}?"
+            else:
+                question = f"Vad gäller enligt {fact.key}?"
+            sources = await search(question, top_k=top_k)
+            found += any(fact.found_in(s.chunk_text) for s in sources)
+        print(f"  {'hybrid' if hybrid else 'dense':<7} recall@{top_k}: {found / len(asked):.0%}")
+    await close_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    fake_port = free_port()
+    serve_in_thread(create_app(latency_ms=0), fake_port)
+    workdir = tempfile.mkdtemp(prefix="hybrid-search-")
+    os.environ.update({
+        "EMBEDDING_PROVIDER": "ollama",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "VECTOR_BACKEND": "numpy",
+        "NUMPY_INDEX_DIR": os.path.join(workdir, "numpy"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical.npz"),
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "CATALOG_PATH": os.path.join(workdir, "catalog.sqlite3"),
+    })
+
+    _bm25_latency(args.chunks, args.queries, args.top_k)
+    asyncio.run(_recall(args.pages, args.top_k, min(args.queries, 200)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Parse throughput per file format, and chat latency while documents are parsed.
+
+The synthetic handbook is exported as DOCX, HTML, XLSX and PDF
+(``synthetic_formats``). ``throughput`` times parse → chunk of each file
+in this process (best of three) and reports MB/s and sections/s.
+
+``latency`` then runs the server in a subprocess per mode — parsing in the
+ingestion threads (``INGEST_PARSE_PROCESSES=0``) or in worker processes —
+uploads ``--documents`` PDF copies in one batch and asks ``/api/chat``
+questions back to back until every job is done, against fake providers
+without latency. Pure-Python PDF parsing in a thread holds the GIL the
+event loop needs; in a process it does not.
+
+    cd backend
+    python -m benchmarks.parsers --pages 500 --documents 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic_docx import generate_handbook
+from benchmarks.synthetic_formats import FORMATS, convert
+
+
+def _throughput(paths: dict[str, str]) -> None:
+    from app.chunking import iter_chunks
+    from app.parsers import iter_sections
+
+    print(f"  {'format':<6} {'MB':>6} {'MB/s':>7} {'sections/s':>11} {'sections':>9} {'chunks':>7}")
+    for fmt, path in paths.items():
+        name = os.path.basename(path)
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            sections = list(iter_sections(path, name))
+            chunks = sum(1 for _ in iter_chunks(sections, name))
+            best = min(best, time.perf_counter() - start)
+        mb = os.path.getsize(path) / (1024 * 1024)
+        print(
+            f"  {fmt:<6} {mb:>6.1f} {mb / best:>7.2f} {len(sections) / best:>11.0f} "
+            f"{len(sections):>9} {chunks:>7}"
+        )
+
+
+async def _latency(workdir: str, pdf: str, documents: int, processes: int) -> dict:
+    import httpx
+
+    from app.main import app
+
+    question = {"question": "Vad gäller enligt regel 12?", "provider": "ollama"}
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=600
+    ) as client:
+
+        async def ask() -> float:
+            start = time.perf_counter()
+            response = await client.post("/api/chat", json=question)
+            response.raise_for_status()
+            return (time.perf_counter() - start) * 1000
+
+        with open(os.path.join(workdir, "handbok.docx"), "rb") as f:
+            job = (await client.post("/api/upload", files={"file": ("handbok.docx", f)})).json()
+        while (await client.get(f"/api/upload/jobs/{job['job_id']}")).json()["status"] not in (
+            "done", "failed"
+        ):
+            await asyncio.sleep(0.05)
+        idle = [await ask() for _ in range(50)]
+
+        with open(pdf, "rb") as f:
+            data = f.read()
+        files = [("files", (f"kopia-{n}.pdf", data)) for n in range(documents)]
+        start = time.perf_counter()
+        jobs = (await client.post("/api/upload/batch", files=files)).json()["jobs"]
+        busy: list[float] = []
+        pending = {job["job_id"] for job in jobs}
+        while pending:
+            busy.append(await ask())
+            for job_id in list(pending):
+                job = (await client.get(f"/api/upload/jobs/{job_id}")).json()
+                if job["status"] in ("done", "failed"):
+                    pending.discard(job_id)
+        ingest_s = time.perf_counter() - start
+
+    def p99(values: list[float]) -> float:
+        return sorted(values)[int(0.99 * (len(values) - 1))]
+
+    return {
+        "mode": f"processes={processes}" if processes else "threads",
+        "idle_p50": statistics.median(idle),
+        "busy_p50": statistics.median(busy),
+        "busy_p99": p99(busy),
+        "busy_max": max(busy),
+        "ingest_s": ingest_s,
+    }
+
+
+def _latency_worker(workdir: str, pdf: str, documents: int, processes: int) -> dict:
+    from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+
+    fake_port = free_port()
+    serve_in_thread(create_app(latency_ms=0, token_ms=0), fake_port)
+    data = tempfile.mkdtemp(prefix="data-", dir=workdir)
+    os.environ.update({
+        "EMBEDDING_PROVIDER": "ollama",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "VECTOR_BACKEND": "numpy",
+        "INGEST_PARSE_PROCESSES": str(processes),
+        "UPLOAD_DIR": os.path.join(data, "uploads"),
+        "NUMPY_INDEX_DIR": os.path.join(data, "numpy"),
+        "LEXICAL_INDEX_PATH": os.path.join(data, "lexical.npz"),
+        "TENANTS_DIR": os.path.join(data, "tenants"),
+        "EMBEDDING_CACHE_PATH": os.path.join(data, "embedding_cache.sqlite3"),
+        "CATALOG_PATH": os.path.join(data, "catalog.sqlite3"),
+        "ANSWER_CACHE_ENABLED": "false",
+        "ANONYMIZED_TELEMETRY": "False",
+    })
+    logging.disable(logging.INFO)
+    return asyncio.run(_latency(workdir, pdf, documents, processes))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--documents", type=int, default=4)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--worker", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        workdir, pdf, documents, processes = args.worker
+        print(json.dumps(_latency_worker(workdir, pdf, int(documents), int(processes))))
+        return
+
+    from app.document import iter_docx_sections
+
+    workdir = tempfile.mkdtemp(prefix="parsers-")
+    try:
+        docx = os.path.join(workdir, "handbok.docx")
+        generate_handbook(docx, pages=args.pages)
+        paths = {"docx": docx}
+        for fmt in FORMATS:
+            paths[fmt] = os.path.join(workdir, f"handbok.{fmt}")
+            convert(iter_docx_sections(docx), paths[fmt], fmt)
+
+        print(f"Parse → chunk, one process, {args.pages} pages")
+        _throughput(paths)
+
+        print(f"\n/api/chat while {args.documents} PDFs are ingested (ms)")
+        print(
+            f"  {'parsing in':<12} {'idle p50':>9} {'busy p50':>9} {'busy p99':>9} "
+            f"{'busy max':>9} {'ingest s':>9}"
+        )
+        for processes in (0, args.processes):
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.parsers", "--worker",
+                 workdir, paths["pdf"], str(args.documents), str(processes)],
+                capture_output=True, text=True, check=True,
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(
+                f"  {r['mode']:<12} {r['idle_p50']:>9.1f} {r['busy_p50']:>9.1f} "
+                f"{r['busy_p99']:>9.1f} {r['busy_max']:>9.1f} {r['ingest_s']:>9.1f}"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""End-to-end pipeline benchmark and regression gate.
+
+Generates a synthetic handbook, ingests it through the real upload job
+(parse → chunk → embed → store), then asks one labelled question per
+sampled fact through ``generate_response`` (embed → search → select
+context → generate) against the deterministic fake provider. Everything
+runs offline in one process.
+
+Reports per-stage wall time, peak RSS, recall@k and MRR (does a source
+sent to the LLM contain the fact?) and prompt tokens. With ``--check`` the
+run is compared with a stored baseline and exits non-zero on regression:
+quality metrics are deterministic and gated tightly, timings only against
+a generous ``--max-slowdown`` since CI machines vary.
+
+    cd backend
+    python -m benchmarks.pipeline                                   # report
+    python -m benchmarks.pipeline --check benchmarks/baselines/pipeline.json
+    python -m benchmarks.pipeline --write-baseline benchmarks/baselines/pipeline.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+from benchmarks.synthetic_docx import Fact, generate_handbook
+
+# Allowed drift before --check fails
+RECALL_TOLERANCE = 0.02
+PROMPT_TOKENS_TOLERANCE = 0.10
+
+
+def _question(fact: Fact) -> str:
+    if fact.kind == "table_entry":
+        return f"Vad betyder {fact.key}?"
+    return f"Vad gäller enligt {fact.key}?"
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return round(ordered[int(q * (len(ordered) - 1))], 1)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+async def _run(args: argparse.Namespace, workdir: str) -> dict:
+    from app import ingestion
+    from app.models import ChatRequest
+    from app.providers import close_clients, start_clients
+    from app.rag import generate_response
+
+    await start_clients()
+
+    path = os.path.join(workdir, "handbok.docx")
+    start = time.perf_counter()
+    facts = generate_handbook(path, pages=args.pages, seed=args.seed)
+    generate_s = time.perf_counter() - start
+
+    # --- Ingest through the real upload job ---
+    # Measures the job, not process start-up (see WARMUP_PARSE_POOL)
+    await ingestion.start_parse_pool()
+    start = time.perf_counter()
+    job = ingestion.submit_job(path, "handbok.docx", 500, 50)
+    while job.status not in ingestion.FINISHED:
+        await asyncio.sleep(0.01)
+    if job.status == "failed":
+        raise RuntimeError(f"Ingestion failed: {job.error}")
+    ingest_ms = (time.perf_counter() - start) * 1000
+    ingest_rss = _peak_rss_mb()
+
+    # --- Labelled questions through the chat pipeline ---
+    asked = random.Random(args.seed).sample(facts, min(args.questions, len(facts)))
+    retrieval, generation, total, prompt_tokens, reciprocal_ranks = [], [], [], [], []
+    for fact in asked:
+        request = ChatRequest(question=_question(fact), provider=args.provider, top_k=args.top_k)
+        response = await generate_response(request)
+        retrieval.append(response.timing.retrieval_ms)
+        generation.append(response.timing.generation_ms)
+        total.append(response.timing.total_ms)
+        prompt_tokens.append(response.prompt_tokens or 0)
+        rank = next(
+            (i for i, s in enumerate(response.sources, 1) if fact.found_in(s.chunk_text)), None
+        )
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    await ingestion.shutdown_jobs()
+    await close_clients()
+
+    return {
+        "config": {
+            "pages": args.pages,
+            "questions": len(asked),
+            "top_k": args.top_k,
+            "provider": args.provider,
+            "vector_backend": os.environ["VECTOR_BACKEND"],
+            "latency_ms": args.latency_ms,
+            "seed": args.seed,
+        },
+        "ingest": {
+            "chunks": job.chunks_total,
+            "generate_docx_ms": round(generate_s * 1000, 1),
+            "parse_chunk_ms": job.stage_ms.get("parsing", 0.0),
+            "embed_ms": job.stage_ms.get("embedding", 0.0),
+            "store_ms": job.stage_ms.get("storing", 0.0),
+            "total_ms": round(ingest_ms, 1),
+            "peak_rss_mb": ingest_rss,
+        },
+        "query": {
+            "retrieval_p50_ms": _percentile(retrieval, 0.5),
+            "retrieval_p95_ms": _percentile(retrieval, 0.95),
+            "generation_p50_ms": _percentile(generation, 0.5),
+            "total_p50_ms": _percentile(total, 0.5),
+            "total_p95_ms": _percentile(total, 0.95),
+        },
+        "quality": {
+            "recall_at_k": round(sum(r > 0 for r in reciprocal_ranks) / len(asked), 4),
+            "mrr": round(statistics.mean(reciprocal_ranks), 4),
+            "prompt_tokens_mean": round(statistics.mean(prompt_tokens), 1),
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _report(result: dict) -> None:
+    config, ingest, query, quality = (
+        result["config"], result["ingest"], result["query"], result["quality"]
+    )
+    print(
+        f"{config['pages']} pages → {ingest['chunks']} chunks, {config['questions']} questions, "
+        f"top_k={config['top_k']}, {config['provider']}, {config['vector_backend']}"
+    )
+    print(
+        f"  ingest   parse+chunk {ingest['parse_chunk_ms']:.0f} ms | embed {ingest['embed_ms']:.0f} ms | "
+        f"store {ingest['store_ms']:.0f} ms | total {ingest['total_ms']:.0f} ms | "
+        f"peak RSS {ingest['peak_rss_mb']} MB"
+    )
+    print(
+        f"  query    retrieval p50 {query['retrieval_p50_ms']} / p95 {query['retrieval_p95_ms']} ms | "
+        f"generation p50 {query['generation_p50_ms']} ms | "
+        f"total p50 {query['total_p50_ms']} / p95 {query['total_p95_ms']} ms"
+    )
+    print(
+        f"  quality  recall@{config['top_k']} {quality['recall_at_k']:.1%} | MRR {quality['mrr']:.3f} | "
+        f"prompt tokens {quality['prompt_tokens_mean']:.0f}"
+    )
+    print(f"  peak RSS {result['peak_rss_mb']} MB")
+
+
+def _check(result: dict, baseline: dict, max_slowdown: float) -> list[str]:
+    failures = []
+    if result["config"] != baseline["config"]:
+        failures.append(f"config differs from baseline: {baseline['config']}")
+        return failures
+
+    quality, base_quality = result["quality"], baseline["quality"]
+    if quality["recall_at_k"] < base_quality["recall_at_k"] - RECALL_TOLERANCE:
+        failures.append(f"recall@k {quality['recall_at_k']} < baseline {base_quality['recall_at_k']}")
+    if quality["mrr"] < base_quality["mrr"] - RECALL_TOLERANCE:
+        failures.append(f"MRR {quality['mrr']} < baseline {base_quality['mrr']}")
+    limit = base_quality["prompt_tokens_mean"] * (1 + PROMPT_TOKENS_TOLERANCE)
+    if quality["prompt_tokens_mean"] > limit:
+        failures.append(
+            f"prompt tokens {quality['prompt_tokens_mean']} > baseline "
+            f"{base_quality['prompt_tokens_mean']} + {PROMPT_TOKENS_TOLERANCE:.0%}"
+        )
+
+    for section, key in [("ingest", "total_ms"), ("query", "retrieval_p50_ms"), ("query", "total_p50_ms")]:
+        value, base = result[section][key], baseline[section][key]
+        if base and value > base * max_slowdown:
+            failures.append(f"{section}.{key} {value} > {max_slowdown}× baseline {base}")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--provider", choices=["openai", "ollama"], default="ollama")
+    parser.add_argument("--vector-backend", choices=["chroma", "numpy"], default="numpy")
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the result to this file")
+    parser.add_argument("--check", metavar="BASELINE", help="fail on regression against a baseline")
+    parser.add_argument("--max-slowdown", type=float, default=3.0)
+    parser.add_argument("--write-baseline", metavar="PATH")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    fake_port = free_port()
+    serve_in_thread(create_app(latency_ms=args.latency_ms, token_ms=0.0), fake_port)
+
+    workdir = tempfile.mkdtemp(prefix="pipeline-")
+    os.environ.update({
+        "EMBEDDING_PROVIDER": args.provider,
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "VECTOR_BACKEND": args.vector_backend,
+        "CHROMA_PERSIST_DIR": os.path.join(workdir, "chroma"),
+        "NUMPY_INDEX_DIR": os.path.join(workdir, "numpy"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical.npz"),
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "ANSWER_CACHE_ENABLED": "false",
+        # Measures retrieval and the LLM; benchmarks.direct_answers covers the lookups
+        "DIRECT_ANSWERS_ENABLED": "false",
+        "ANONYMIZED_TELEMETRY": "False",
+        "CATALOG_PATH": os.path.join(workdir, "catalog.sqlite3"),
+    })
+
+    result = asyncio.run(_run(args, workdir))
+    _report(result)
+
+    for path in (args.json, args.write_baseline):
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(result, f, indent=2)
+                f.write("\n")
+
+    if args.check:
+        with open(args.check, encoding="utf-8") as f:
+            baseline = json.load(f)
+        failures = _check(result, baseline, args.max_slowdown)
+        if failures:
+            print("REGRESSION:")
+            for failure in failures:
+                print(f"  - {failure}")
+            sys.exit(1)
+        print("OK: no regression against", args.check)
+
+
+if __name__ == "__main__":
+    main()
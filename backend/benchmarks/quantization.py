@@ -0,0 +1,234 @@
+"""Recall, latency, memory and disk of truncated and quantized NumPy indexes.
+
+Embeds the chunks of a synthetic handbook once at ``--dim`` dimensions
+with the fake provider's hashing embedder, which (like a Matryoshka model)
+keeps a usable embedding in every prefix. Every step runs in its own
+subprocess (peak RSS survives fork and exec on Linux): for each variant one
+builds a NumPy index of the vectors truncated to ``dims`` and stored with
+``quantization``, and a second, fresh subprocess opens it and asks one
+question per planted fact — so the reported RSS is what a serving process
+pays. Vector search only (no BM25), to isolate the index.
+
+"recall" is the share of questions whose fact is in the top k; "exact"
+is the overlap of the top k with the full-dimension float32 top k.
+
+    cd backend
+    python -m benchmarks.quantization --pages 5000 --dim 1536
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# (dims, quantization); 0 dims = all of --dim
+VARIANTS = [
+    (0, "none"),
+    (0, "int8"),
+    (0, "binary"),
+    (512, "none"),
+    (512, "int8"),
+    (256, "none"),
+    (256, "binary"),
+]
+
+
+def _question(fact) -> str:
+    if fact.kind == "table_entry":
+        return f"Vad betyder {fact.key}?"
+    return f"Vad gäller enligt {fact.key}?"
+
+
+def _embed(texts: list[str], dim: int):
+    """``fake_embedding`` for many texts: each distinct word is hashed once."""
+    import numpy as np
+
+    from benchmarks.fake_provider import _WORD_RE, fake_embedding
+
+    words: dict[str, np.ndarray] = {}
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for word in _WORD_RE.findall(text.lower()):
+            vector = words.get(word)
+            if vector is None:
+                vector = words[word] = np.asarray(fake_embedding(word, dim), dtype=np.float32)
+            matrix[i] += vector
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def _truncate(matrix, dims: int):
+    import numpy as np
+
+    if not dims or dims >= matrix.shape[1]:
+        return matrix
+    head = matrix[:, :dims]
+    norms = np.linalg.norm(head, axis=1, keepdims=True)
+    return head / np.where(norms == 0, 1.0, norms)
+
+
+def _prepare(workdir: str, pages: int, dim: int, queries: int, top_k: int) -> dict:
+    import random
+
+    import numpy as np
+
+    from app.chunking import iter_chunks
+    from app.document import iter_docx_sections
+    from benchmarks.synthetic_docx import generate_handbook
+
+    path = os.path.join(workdir, "handbok.docx")
+    facts = generate_handbook(path, pages=pages)
+    chunks = list(iter_chunks(iter_docx_sections(path), "handbok.docx"))
+    asked = random.Random(0).sample(facts, min(queries, len(facts)))
+
+    vectors = _embed([c.text for c in chunks], dim)
+    questions = _embed([_question(f) for f in asked], dim)
+    exact = np.argsort(-(questions @ vectors.T), axis=1)[:, :top_k]
+
+    np.save(os.path.join(workdir, "vectors.npy"), vectors)
+    np.save(os.path.join(workdir, "questions.npy"), questions)
+    with open(os.path.join(workdir, "labels.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "texts": [c.text for c in chunks],
+            "keys": [f.key for f in asked],
+            "exact": exact.tolist(),
+        }, f, ensure_ascii=False)
+    return {"chunks": len(chunks)}
+
+
+def _build(workdir: str, directory: str, dims: int, quantization: str) -> dict:
+    import numpy as np
+
+    from app.stores import NumpyStore
+
+    vectors = _truncate(np.load(os.path.join(workdir, "vectors.npy")), dims)
+    with open(os.path.join(workdir, "labels.json"), encoding="utf-8") as f:
+        texts = json.load(f)["texts"]
+
+    store = NumpyStore(directory, quantization)
+    start = time.perf_counter()
+    batch = 1000
+    for offset in range(0, len(texts), batch):
+        ids = [str(i) for i in range(offset, min(offset + batch, len(texts)))]
+        store.upsert(
+            ids,
+            texts[offset : offset + batch],
+            vectors[offset : offset + batch],
+            [{"source": "handbok.docx"} for _ in ids],
+        )
+    store.flush()
+    return {"build_s": round(time.perf_counter() - start, 1)}
+
+
+def _query(
+    workdir: str, directory: str, dims: int, quantization: str, top_k: int, factor: int
+) -> dict:
+    import re
+
+    import numpy as np
+
+    from app.stores import NumpyStore
+
+    questions = _truncate(np.load(os.path.join(workdir, "questions.npy")), dims)
+    with open(os.path.join(workdir, "labels.json"), encoding="utf-8") as f:
+        labels = json.load(f)
+    store = NumpyStore(directory, quantization, rerank_factor=factor)
+
+    # Warm-up: first query touches the pages it needs
+    store.query(questions[0].tolist(), top_k)
+    latencies, found, overlap = [], 0, 0
+    for question, key, exact in zip(questions, labels["keys"], labels["exact"]):
+        embedding = question.tolist()
+        start = time.perf_counter()
+        hits = store.query(embedding, top_k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        pattern = rf"(?<!\w){re.escape(key)}(?!\w)"
+        found += any(re.search(pattern, text) for _, text, _, _ in hits)
+        overlap += len({int(chunk_id) for chunk_id, _, _, _ in hits} & set(exact))
+
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p99_ms": round(latencies[int(0.99 * (n - 1))], 2),
+        "recall": round(found / n, 3),
+        "exact": round(overlap / (n * top_k), 3),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _disk_mb(directory: str) -> float:
+    total = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))
+    return round(total / (1024 * 1024), 1)
+
+
+def _subprocess(*args: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.quantization", "--worker", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=5000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--worker", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        step, workdir, *variant = args.worker
+        if step == "prepare":
+            print(json.dumps(_prepare(workdir, args.pages, args.dim, args.queries, args.top_k)))
+            return
+        directory, dims, quantization = variant
+        if step == "build":
+            result = _build(workdir, directory, int(dims), quantization)
+        else:
+            result = _query(
+                workdir, directory, int(dims), quantization, args.top_k, args.rerank_factor
+            )
+        print(json.dumps(result))
+        return
+
+    workdir = tempfile.mkdtemp(prefix="quantization-")
+    common = ["--pages", str(args.pages), "--dim", str(args.dim), "--queries", str(args.queries),
+              "--top-k", str(args.top_k), "--rerank-factor", str(args.rerank_factor)]
+    chunks = _subprocess("prepare", workdir, *common)["chunks"]
+    print(
+        f"{chunks} chunks × {args.dim} dims, {args.queries} questions, top_k={args.top_k}, "
+        f"rerank factor {args.rerank_factor}"
+    )
+    print(
+        f"  {'dims':>5} {'quantization':<13} {'p50 ms':>7} {'p99 ms':>7} {'recall':>7} "
+        f"{'exact':>6} {'RSS MB':>7} {'disk MB':>8}"
+    )
+    for dims, quantization in VARIANTS:
+        dims = dims or args.dim
+        if dims > args.dim:
+            continue
+        directory = tempfile.mkdtemp(prefix=f"index-{dims}-{quantization}-", dir=workdir)
+        variant = [workdir, directory, str(dims), quantization]
+        _subprocess("build", *variant, *common)
+        query = _subprocess("query", *variant, *common)
+        print(
+            f"  {dims:>5} {quantization:<13} {query['p50_ms']:>7} {query['p99_ms']:>7} "
+            f"{query['recall']:>7.0%} {query['exact']:>6.0%} {query['peak_rss_mb']:>7} "
+            f"{_disk_mb(directory):>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
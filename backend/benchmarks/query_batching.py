@@ -0,0 +1,101 @@
+"""Question embedding under concurrency: one request per question vs. micro-batched.
+
+``--users`` callers each embed a stream of distinct questions through
+``embed_query`` (cache off, so every question reaches the provider) against
+the fake provider, whose embedding latency is ``latency_ms`` per request
+plus ``item_ms`` per text. With ``EMBEDDING_MAX_IN_FLIGHT`` requests
+allowed at once, single-question requests queue behind each other at high
+concurrency; batched, they share requests. Reports embed latency p50/p99,
+questions/s, provider requests and mean batch size per wait setting.
+
+    cd backend
+    python -m benchmarks.query_batching --users 1 8 32 64
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+
+WAITS_MS = [0.0, 2.0, 5.0]
+
+
+async def _run(users: int, per_user: int, wait_ms: float, fake) -> dict:
+    from app import embeddings
+    from app.config import settings
+
+    settings.query_batch_wait_ms = wait_ms
+    calls_before = fake.state.calls["embed"]
+    latencies: list[float] = []
+
+    async def user(n: int) -> None:
+        for i in range(per_user):
+            start = time.perf_counter()
+            await embeddings.embed_query(f"Vad gäller för regel {n}-{i} vid {wait_ms} ms?")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(n) for n in range(users)))
+    elapsed = time.perf_counter() - start
+    requests = fake.state.calls["embed"] - calls_before
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p99": latencies[int(0.99 * (len(latencies) - 1))],
+        "qps": len(latencies) / elapsed,
+        "requests": requests,
+        "batch": len(latencies) / max(requests, 1),
+    }
+
+
+async def _main(args: argparse.Namespace, fake) -> None:
+    from app.providers import close_clients, start_clients
+
+    await start_clients()
+    print(
+        f"{args.latency_ms:.0f} ms + {args.item_ms} ms/text per request, "
+        f"{args.max_in_flight} in flight, {args.per_user} questions per user"
+    )
+    print(
+        f"  {'users':>5} {'wait ms':>7} {'p50 ms':>7} {'p99 ms':>7} {'q/s':>7} "
+        f"{'requests':>9} {'batch':>6}"
+    )
+    for users in args.users:
+        for wait_ms in WAITS_MS:
+            r = await _run(users, args.per_user, wait_ms, fake)
+            print(
+                f"  {users:>5} {wait_ms:>7.0f} {r['p50']:>7.1f} {r['p99']:>7.1f} {r['qps']:>7.0f} "
+                f"{r['requests']:>9} {r['batch']:>6.1f}"
+            )
+    await close_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--per-user", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--item-ms", type=float, default=0.2)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("app.embeddings").setLevel(logging.WARNING)
+
+    fake = create_app(latency_ms=args.latency_ms, embed_item_ms=args.item_ms, dim=8)
+    fake_port = free_port()
+    serve_in_thread(fake, fake_port)
+    os.environ.update({
+        "EMBEDDING_PROVIDER": "ollama",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "EMBEDDING_MAX_IN_FLIGHT": str(args.max_in_flight),
+    })
+    asyncio.run(_main(args, fake))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Synthetic Swedish payroll handbooks for benchmarks.
+
+Writes a valid .docx straight into the zip archive (no python-docx object
+model), so 10k-page documents are generated quickly and with flat memory.
+Each handbook has headings, body paragraphs and ORSAK/FÖRKLARING tables, and
+``generate_handbook`` returns the facts it planted so benchmarks can ask
+labelled questions about them.
+"""
+
+import io
+import random
+import re
+import zipfile
+from dataclasses import dataclass
+from xml.sax.saxutils import escape
+
+from docx import Document
+
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+
+_TOPICS = [
+    "Lönespecifikation", "OB-tillägg", "Semesterersättning", "Sjuklön", "Föräldraledighet",
+    "Övertid", "Tjänstepension", "Reseersättning", "Traktamente", "Friskvårdsbidrag",
+    "Löneutbetalning", "Skatteavdrag", "Jour och beredskap", "Karensavdrag", "Uppsägningstid",
+]
+_WORDS = (
+    "lön arbetsgivare medarbetare avtal ersättning timme månad utbetalning beräknas "
+    "enligt gäller schema period underlag rapportering attest chef system kollektivavtal "
+    "anställning heltid deltid timlön månadslön procent belopp skatt avdrag frånvaro "
+    "semesterdagar intjänande handläggning blankett portal kontroll registrering"
+).split()
+_CAUSES = [
+    "Sjukfrånvaro", "Semester", "Vård av barn", "Tjänstledighet", "Permission",
+    "Övertidskompensation", "Utbildning", "Facklig tid", "Arbetsskada", "Föräldrapenning",
+]
+
+
+@dataclass
+class Fact:
+    """Something planted in the handbook that a question can be asked about."""
+
+    kind: str  # "paragraph" | "table_entry"
+    key: str
+    text: str
+    heading: str
+
+    def found_in(self, text: str) -> bool:
+        # Whole-key match: "regel 1" must not count as found in "regel 12"
+        return re.search(rf"(?<!\w){re.escape(self.key)}(?!\w)", text) is not None
+
+
+def generate_handbook(
+    path: str,
+    pages: int,
+    seed: int = 0,
+    paragraphs_per_page: int = 6,
+    table_every_pages: int = 4,
+    heading_every_pages: int = 3,
+    long_paragraph_every: int = 0,
+) -> list[Fact]:
+    """Write the handbook to ``path``; ``heading_every_pages=0`` leaves out headings.
+
+    With ``long_paragraph_every=n`` every n-th body paragraph is 10–30
+    sentences long, the kind of text the chunker has to split.
+    """
+    rng = random.Random(seed)
+    facts: list[Fact] = []
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in _template_parts().items():
+            archive.writestr(name, data)
+
+        with archive.open("word/document.xml", "w") as xml:
+            xml.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                      f'<w:document xmlns:w="{_W_NS}"><w:body>'.encode("utf-8"))
+
+            heading = ""
+            for page in range(pages):
+                if heading_every_pages and page % heading_every_pages == 0:
+                    n = page // heading_every_pages
+                    heading = f"{_TOPICS[n % len(_TOPICS)]} {n + 1}"
+                    xml.write(_paragraph(heading, style="Heading1"))
+
+                for n in range(paragraphs_per_page):
+                    text = _sentence(rng, 8 + rng.randrange(40))
+                    index = page * paragraphs_per_page + n
+                    if long_paragraph_every and index % long_paragraph_every == 0:
+                        sentences = 9 + rng.randrange(21)
+                        more = [_sentence(rng, 6 + rng.randrange(20)) for _ in range(sentences)]
+                        text = " ".join([text, *more])
+                    if n == 0:
+                        # One uniquely identifiable fact per page
+                        key = f"regel {page + 1}"
+                        text = f"Enligt {key} betalas {_TOPICS[page % len(_TOPICS)].lower()} ut med {rng.randrange(5, 95)} procent. {text}"
+                        facts.append(Fact("paragraph", key, text, heading))
+                    xml.write(_paragraph(text))
+
+                if page % table_every_pages == 0:
+                    rows = []
+                    for r in range(4):
+                        code = f"ORSAK-{page:05d}{r}"
+                        explanation = f"{rng.choice(_CAUSES)}: {_sentence(rng, 12)}"
+                        rows.append((code, explanation))
+                        facts.append(Fact("table_entry", code, explanation, heading))
+                    xml.write(_table([("ORSAK", "FÖRKLARING"), *rows]))
+
+            xml.write(b"<w:sectPr/></w:body></w:document>")
+
+    return facts
+
+
+def _template_parts() -> dict[str, bytes]:
+    """Every part of python-docx's default template except the body."""
+    buffer = io.BytesIO()
+    Document().save(buffer)
+    with zipfile.ZipFile(buffer) as template:
+        return {
+            name: template.read(name)
+            for name in template.namelist()
+            if name != "word/document.xml"
+        }
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _paragraph(text: str, style: str | None = None) -> bytes:
+    props = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    return f"<w:p>{props}<w:r><w:t xml:space=\"preserve\">{escape(text)}</w:t></w:r></w:p>".encode("utf-8")
+
+
+def _table(rows: list[tuple[str, ...]]) -> bytes:
+    cells = "".join(
+        "<w:tr>" + "".join(f"<w:tc>{_paragraph(c).decode('utf-8')}</w:tc>" for c in row) + "</w:tr>"
+        for row in rows
+    )
+    grid = "".join("<w:gridCol/>" for _ in rows[0])
+    return f"<w:tbl><w:tblGrid>{grid}</w:tblGrid>{cells}</w:tbl>".encode("utf-8")
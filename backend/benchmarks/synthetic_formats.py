@@ -0,0 +1,201 @@
+"""The synthetic handbook as HTML, XLSX and PDF exports.
+
+Rendered from the sections of a generated ``.docx``, so every format
+carries the same headings, paragraphs and ORSAK tables: HTML with
+``<h1>``/``<p>``/``<table>``, XLSX with one sheet of table rows per heading
+(no paragraphs, like a spreadsheet export), and PDF with Helvetica text —
+headings in a larger bold font and table rows as plain lines.
+"""
+
+import html
+import textwrap
+import zipfile
+from collections.abc import Iterable, Iterator
+from itertools import groupby
+from xml.sax.saxutils import escape
+
+FORMATS = ("html", "xlsx", "pdf")
+
+
+def convert(sections: Iterable[dict], path: str, fmt: str) -> None:
+    writers = {"html": write_html, "xlsx": write_xlsx, "pdf": write_pdf}
+    writers[fmt](sections, path)
+
+
+def _blocks(sections: Iterable[dict]) -> Iterator[tuple[str, object]]:
+    """("heading", text), ("paragraph", text) and ("table", [header, *rows]) in order."""
+    def key(section: dict) -> object:
+        if section["type"] == "table_entry":
+            return ("table", section["table_index"])
+        return None
+
+    for table, group in groupby(sections, key=key):
+        if table is None:
+            for section in group:
+                yield section["type"], section["text"]
+            continue
+        rows: dict[int, dict[str, str]] = {}
+        for entry in group:
+            rows.setdefault(entry["row_index"], {})[entry["header"]] = entry["text"]
+        headers = list(dict.fromkeys(h for row in rows.values() for h in row))
+        yield "table", [headers, *[[row.get(h, "") for h in headers] for row in rows.values()]]
+
+
+def write_html(sections: Iterable[dict], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('<!DOCTYPE html>\n<html lang="sv"><head><meta charset="utf-8">'
+                "<title>Handbok</title></head><body>\n")
+        for kind, value in _blocks(sections):
+            if kind == "heading":
+                f.write(f"<h1>{html.escape(value)}</h1>\n")
+            elif kind == "paragraph":
+                f.write(f"<p>{html.escape(value)}</p>\n")
+            else:
+                header, *rows = value
+                f.write("<table><thead><tr>")
+                f.write("".join(f"<th>{html.escape(h)}</th>" for h in header))
+                f.write("</tr></thead><tbody>\n")
+                for row in rows:
+                    cells = "".join(f"<td>{html.escape(c)}</td>" for c in row)
+                    f.write(f"<tr>{cells}</tr>\n")
+                f.write("</tbody></table>\n")
+        f.write("</body></html>\n")
+
+
+def write_xlsx(sections: Iterable[dict], path: str) -> None:
+    sheets: dict[str, list[list[str]]] = {}
+    heading = "Blad"
+    for kind, value in _blocks(sections):
+        if kind == "heading":
+            heading = value
+        elif kind == "table":
+            header, *rows = value
+            # Sheet names: at most 31 characters, unique
+            sheet = sheets.setdefault(heading[:31], [header])
+            sheet.extend(rows)
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        names = list(sheets) or ["Blad1"]
+        archive.writestr("[Content_Types].xml", _XLSX_TYPES.format(
+            sheets="".join(
+                f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="application/'
+                f'vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for i in range(1, len(names) + 1)
+            )
+        ))
+        archive.writestr("_rels/.rels", _XLSX_ROOT_RELS)
+        archive.writestr("xl/workbook.xml", _XLSX_WORKBOOK.format(sheets="".join(
+            f'<sheet name="{escape(name, {chr(34): "&quot;"})}" sheetId="{i}" r:id="rId{i}"/>'
+            for i, name in enumerate(names, 1)
+        )))
+        archive.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS.format(sheets="".join(
+            f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/'
+            f'2006/relationships/worksheet" Target="worksheets/sheet{i}.xml"/>'
+            for i in range(1, len(names) + 1)
+        )))
+        for i, name in enumerate(names, 1):
+            rows = "".join(
+                f'<row r="{r}">' + "".join(
+                    f'<c t="inlineStr"><is><t>{escape(cell)}</t></is></c>' for cell in row
+                ) + "</row>"
+                for r, row in enumerate(sheets.get(name, []), 1)
+            )
+            archive.writestr(f"xl/worksheets/sheet{i}.xml", _XLSX_SHEET.format(rows=rows))
+
+
+_XLSX_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>{sheets}</Types>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+    'relationships/officeDocument" Target="xl/workbook.xml"/></Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    "<sheets>{sheets}</sheets></workbook>"
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    "{sheets}</Relationships>"
+)
+_XLSX_SHEET = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    "<sheetData>{rows}</sheetData></worksheet>"
+)
+
+
+# A4 in points; body text 10 pt on 13 pt lines, headings 16 pt
+_PAGE_W, _PAGE_H, _MARGIN = 595, 842, 56
+_BODY, _LEADING, _HEADING = 10, 13, 16
+_WRAP = 95
+
+
+def write_pdf(sections: Iterable[dict], path: str) -> None:
+    pages: list[list[str]] = [[]]
+    y = _PAGE_H - _MARGIN
+
+    def line(text: str, font: str, size: int, gap: float) -> None:
+        nonlocal y
+        if y - gap < _MARGIN:
+            pages.append([])
+            y = _PAGE_H - _MARGIN
+        else:
+            y -= gap
+        pages[-1].append(f"BT /{font} {size} Tf {_MARGIN} {y:.0f} Td ({_pdf_string(text)}) Tj ET")
+
+    for kind, value in _blocks(sections):
+        if kind == "heading":
+            line(value, "F2", _HEADING, _LEADING * 2.5)
+        elif kind == "paragraph":
+            for i, text in enumerate(textwrap.wrap(value, _WRAP)):
+                line(text, "F1", _BODY, _LEADING * (2 if i == 0 else 1))
+        else:
+            header, *rows = value
+            for i, row in enumerate([header, *rows]):
+                line("   ".join(row)[:_WRAP * 2], "F1", _BODY, _LEADING * (2 if i == 0 else 1))
+
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # pages, once the page objects are numbered
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for content in pages:
+        stream = "\n".join(content).encode("cp1252", "replace")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n".encode() + stream + b"\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_PAGE_W} {_PAGE_H}] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            data = body if isinstance(body, bytes) else body.encode("cp1252")
+            f.write(f"{number} 0 obj\n".encode() + data + b"\nendobj\n")
+        xref = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+        f.write("".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode())
+        f.write(
+            f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+        )
+
+
+def _pdf_string(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
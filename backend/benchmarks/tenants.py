@@ -0,0 +1,124 @@
+"""Per-tenant indexes: a small tenant's query latency next to a large one.
+
+Ingests a small handbook (``--small-pages``) and a large one
+(``--big-pages``) with the fake provider's embeddings, three ways: each into
+its own tenant, and both into one shared tenant (the single global
+collection from before tenants). Then asks questions about the small
+handbook and reports search p50/p99 for the small tenant alone vs. in the
+shared index, how many retrieved chunks came from the other handbook, and
+the cost of the first query after the small tenant's index was evicted.
+
+    cd backend
+    python -m benchmarks.tenants --small-pages 20 --big-pages 1000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_provider import create_app, free_port, serve_in_thread
+from benchmarks.synthetic_docx import generate_handbook
+
+
+def _question(fact) -> str:
+    if fact.kind == "table_entry":
+        return f"Vad betyder {fact.key}?"
+    return f"Vad gäller enligt {fact.key}?"
+
+
+async def _ingest(path: str, source: str, tenant: str) -> None:
+    from app.chunking import iter_chunks
+    from app.document import iter_docx_sections
+    from app.vectorstore import add_chunks
+
+    await add_chunks(iter_chunks(iter_docx_sections(path), source), tenant=tenant)
+
+
+async def _run(args: argparse.Namespace, workdir: str) -> None:
+    from app.config import settings
+    from app.embeddings import embed_query
+    from app.providers import close_clients, start_clients
+    from app.vectorstore import evict_idle_tenants, get_stats, search
+
+    await start_clients()
+    small = os.path.join(workdir, "small.docx")
+    big = os.path.join(workdir, "big.docx")
+    facts = generate_handbook(small, pages=args.small_pages, seed=1)
+    generate_handbook(big, pages=args.big_pages, seed=2)
+
+    await _ingest(small, "small.docx", "small")
+    await _ingest(big, "big.docx", "big")
+    await _ingest(small, "small.docx", "shared")
+    await _ingest(big, "big.docx", "shared")
+    print(
+        f"{settings.vector_backend}: small {get_stats('small')['total_chunks']} chunks, "
+        f"big {get_stats('big')['total_chunks']}, shared {get_stats('shared')['total_chunks']}"
+    )
+
+    asked = random.Random(0).sample(facts, min(args.queries, len(facts)))
+    questions = [(q, await embed_query(q)) for q in map(_question, asked)]
+
+    print(f"  {'index':<10} {'p50 ms':>8} {'p99 ms':>8} {'foreign':>8}")
+    for tenant in ("small", "shared"):
+        # Warm-up: the first query touches the pages of the index
+        await search(questions[0][0], args.top_k, questions[0][1], tenant=tenant)
+        latencies, foreign, total = [], 0, 0
+        for question, embedding in questions:
+            start = time.perf_counter()
+            sources = await search(question, args.top_k, embedding, tenant=tenant)
+            latencies.append((time.perf_counter() - start) * 1000)
+            foreign += sum(s.source != "small.docx" for s in sources)
+            total += len(sources)
+        latencies.sort()
+        print(
+            f"  {tenant:<10} {statistics.median(latencies):>8.2f} "
+            f"{latencies[int(0.99 * (len(latencies) - 1))]:>8.2f} {foreign / total:>8.0%}"
+        )
+
+    settings.tenant_idle_seconds = 0
+    evicted = evict_idle_tenants()
+    question, embedding = questions[0]
+    start = time.perf_counter()
+    await search(question, args.top_k, embedding, tenant="small")
+    print(
+        f"  first query after evicting {evicted} indexes: "
+        f"{(time.perf_counter() - start) * 1000:.1f} ms"
+    )
+    await close_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--small-pages", type=int, default=20)
+    parser.add_argument("--big-pages", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--backend", choices=["numpy", "chroma"], default="numpy")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    fake_port = free_port()
+    serve_in_thread(create_app(latency_ms=0), fake_port)
+    workdir = tempfile.mkdtemp(prefix="tenants-")
+    os.environ.update({
+        "EMBEDDING_PROVIDER": "ollama",
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "VECTOR_BACKEND": args.backend,
+        "CHROMA_PERSIST_DIR": os.path.join(workdir, "chroma"),
+        "NUMPY_INDEX_DIR": os.path.join(workdir, "numpy"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical.npz"),
+        "TENANTS_DIR": os.path.join(workdir, "tenants"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite3"),
+        "ANONYMIZED_TELEMETRY": "False",
+        "CATALOG_PATH": os.path.join(workdir, "catalog.sqlite3"),
+    })
+    asyncio.run(_run(args, workdir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Query latency and memory: Chroma (HNSW) vs. the NumPy memory-mapped index.
+
+For each backend a subprocess builds a persisted index of ``--chunks``
+random unit vectors, and a second, fresh subprocess opens it and runs
+``--queries`` top-k queries — unfiltered and filtered to one document — so
+the reported RSS is what a serving process pays for the index.
+
+    cd backend
+    python -m benchmarks.vector_search --chunks 30000 --dim 1536
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKENDS = ["chroma", "numpy"]
+DOCUMENTS = 20
+
+
+def _open(backend: str, directory: str):
+    from app.stores import create_store
+
+    return create_store(backend, chroma_dir=directory, numpy_dir=directory)
+
+
+def _build(backend: str, directory: str, chunks: int, dim: int) -> dict:
+    import numpy as np
+
+    store = _open(backend, directory)
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    batch = 1000
+    for offset in range(0, chunks, batch):
+        n = min(batch, chunks - offset)
+        ids = [f"chunk-{offset + i}" for i in range(n)]
+        metadatas = [
+            {"source": f"doc-{(offset + i) % DOCUMENTS}.docx", "chunk_index": offset + i, "section": ""}
+            for i in range(n)
+        ]
+        vectors = rng.standard_normal((n, dim), dtype=np.float32)
+        store.upsert(ids, [f"text {i}" for i in ids], vectors.tolist(), metadatas)
+    store.flush()
+    return {"build_s": round(time.perf_counter() - start, 1)}
+
+
+def _query(backend: str, directory: str, queries: int, dim: int, top_k: int) -> dict:
+    import numpy as np
+
+    start = time.perf_counter()
+    store = _open(backend, directory)
+    store.count()
+    open_s = time.perf_counter() - start
+    rng = np.random.default_rng(1)
+    result = {"open_s": round(open_s, 2)}
+
+    for label, where in [("all", None), ("filtered", {"source": "doc-3.docx"})]:
+        # Warm-up: first query loads the index / touches the pages
+        store.query(rng.standard_normal(dim).tolist(), top_k, where)
+        latencies = []
+        for _ in range(queries):
+            q = rng.standard_normal(dim).tolist()
+            t = time.perf_counter()
+            store.query(q, top_k, where)
+            latencies.append((time.perf_counter() - t) * 1000)
+        latencies.sort()
+        result[f"{label}_p50_ms"] = round(statistics.median(latencies), 2)
+        result[f"{label}_p99_ms"] = round(latencies[int(0.99 * (len(latencies) - 1))], 2)
+
+    # ru_maxrss is in KiB on Linux
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+def _disk_mb(directory: str) -> float:
+    total = 0
+    for root, _, files in os.walk(directory):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return round(total / (1024 * 1024), 1)
+
+
+def _subprocess(*args: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.vector_search", "--worker", *args],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "ANONYMIZED_TELEMETRY": "False"},
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=30_000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--worker", nargs="+", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        step, backend, directory = args.worker
+        if step == "build":
+            result = _build(backend, directory, args.chunks, args.dim)
+        else:
+            result = _query(backend, directory, args.queries, args.dim, args.top_k)
+        print(json.dumps(result))
+        return
+
+    print(f"{args.chunks} chunks × {args.dim} dims, {args.queries} queries, top_k={args.top_k}")
+    print(
+        f"{'backend':<8} {'build s':>8} {'open s':>7} {'p50 ms':>7} {'p99 ms':>7} "
+        f"{'filt p50':>9} {'filt p99':>9} {'RSS MB':>7} {'disk MB':>8}"
+    )
+    common = ["--chunks", str(args.chunks), "--dim", str(args.dim),
+              "--queries", str(args.queries), "--top-k", str(args.top_k)]
+    for backend in args.backends.split(","):
+        directory = tempfile.mkdtemp(prefix=f"vector-{backend}-")
+        build = _subprocess("build", backend, directory, *common)
+        query = _subprocess("query", backend, directory, *common)
+        print(
+            f"{backend:<8} {build['build_s']:>8} {query['open_s']:>7} "
+            f"{query['all_p50_ms']:>7} {query['all_p99_ms']:>7} "
+            f"{query['filtered_p50_ms']:>9} {query['filtered_p99_ms']:>9} "
+            f"{query['peak_rss_mb']:>7} {_disk_mb(directory):>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
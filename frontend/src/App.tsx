@@ -31,7 +31,12 @@ export default function App() {
   }, [darkMode]);
 
   const handleUpload = useCallback((doc: DocumentInfo) => {
-    setDocuments((prev) => [...prev, doc]);
+    // Re-uploading a file replaces the earlier version
+    setDocuments((prev) => [...prev.filter((d) => d.filename !== doc.filename), doc]);
+  }, []);
+
+  const handleDocumentRemoved = useCallback((filename: string) => {
+    setDocuments((prev) => prev.filter((d) => d.filename !== filename));
   }, []);
 
   const handleDocumentsCleared = useCallback(() => {
@@ -52,6 +57,7 @@ export default function App() {
           onSettingsChange={setSettings}
           documents={documents}
           onDocumentsCleared={handleDocumentsCleared}
+          onDocumentRemoved={handleDocumentRemoved}
           darkMode={darkMode}
           onToggleDarkMode={() => setDarkMode(!darkMode)}
         />
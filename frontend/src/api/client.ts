@@ -1,4 +1,15 @@
-import type { ChatMessage, DocumentInfo, HealthStatus, ModelOption } from "../types";
+import type {
+  BatchUploadResponse,
+  ChatMessage,
+  DocumentInfo,
+  Facets,
+  GenerationTiming,
+  HealthStatus,
+  IngestionJob,
+  ModelOption,
+  SearchFilters,
+  SourceReference,
+} from "../types";
 
 const API_BASE = "/api";
 
@@ -6,7 +17,7 @@ export async function uploadDocument(
   file: File,
   chunkSize: number,
   chunkOverlap: number,
-): Promise<DocumentInfo> {
+): Promise<IngestionJob> {
   const formData = new FormData();
   formData.append("file", file);
 
@@ -28,12 +39,49 @@ export async function uploadDocument(
   return res.json();
 }
 
+export async function uploadDocuments(
+  files: File[],
+  chunkSize: number,
+  chunkOverlap: number,
+): Promise<BatchUploadResponse> {
+  const formData = new FormData();
+  for (const file of files) formData.append("files", file);
+
+  const params = new URLSearchParams({
+    chunk_size: chunkSize.toString(),
+    chunk_overlap: chunkOverlap.toString(),
+  });
+
+  const res = await fetch(`${API_BASE}/upload/batch?${params}`, {
+    method: "POST",
+    body: formData,
+  });
+
+  if (!res.ok) {
+    const err = await res.json().catch(() => ({ detail: "Uppladdning misslyckades" }));
+    throw new Error(err.detail || "Uppladdning misslyckades");
+  }
+
+  return res.json();
+}
+
+export async function getUploadJob(jobId: string): Promise<IngestionJob> {
+  const res = await fetch(`${API_BASE}/upload/jobs/${jobId}`);
+  if (!res.ok) {
+    const err = await res.json().catch(() => ({ detail: "Uppladdningsjobbet hittades inte" }));
+    throw new Error(err.detail || "Uppladdningsjobbet hittades inte");
+  }
+  return res.json();
+}
+
 export async function sendMessage(
   question: string,
   provider: string,
   model: string,
   temperature: number,
   topK: number,
+  filters?: SearchFilters,
+  conversationId?: string,
 ): Promise<{ answer: string; sources: ChatMessage["sources"]; model_used: string }> {
   const res = await fetch(`${API_BASE}/chat`, {
     method: "POST",
@@ -44,6 +92,8 @@ export async function sendMessage(
       model: model || undefined,
       temperature,
       top_k: topK,
+      filters,
+      conversation_id: conversationId,
     }),
   });
 
@@ -55,15 +105,101 @@ export async function sendMessage(
   return res.json();
 }
 
+export interface StreamHandlers {
+  onSources: (sources: SourceReference[]) => void;
+  onToken: (text: string) => void;
+  onDone: (
+    modelUsed: string,
+    timing: GenerationTiming | null,
+    promptTokens: number | null,
+  ) => void;
+}
+
+export async function streamMessage(
+  question: string,
+  provider: string,
+  model: string,
+  temperature: number,
+  topK: number,
+  handlers: StreamHandlers,
+  filters?: SearchFilters,
+  conversationId?: string,
+): Promise<void> {
+  const res = await fetch(`${API_BASE}/chat/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+    body: JSON.stringify({
+      question,
+      provider,
+      model: model || undefined,
+      temperature,
+      top_k: topK,
+      filters,
+      conversation_id: conversationId,
+    }),
+  });
+
+  if (!res.ok || !res.body) {
+    const err = await res.json().catch(() => ({ detail: "Chattfel" }));
+    throw new Error(err.detail || "Chattfel");
+  }
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+
+    // Server-sent events are separated by a blank line
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf("\n\n");
+
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      if (!data) continue;
+      const payload = JSON.parse(data);
+
+      if (event === "sources") handlers.onSources(payload.sources);
+      else if (event === "token") handlers.onToken(payload.text);
+      else if (event === "done") handlers.onDone(payload.model_used, payload.timing, payload.prompt_tokens ?? null);
+      else if (event === "error") throw new Error(payload.detail || "Chattfel");
+    }
+  }
+}
+
 export async function getDocuments(): Promise<DocumentInfo[]> {
   const res = await fetch(`${API_BASE}/documents`);
   return res.json();
 }
 
+export async function getFacets(): Promise<Facets> {
+  const res = await fetch(`${API_BASE}/facets`);
+  return res.json();
+}
+
 export async function clearDocuments(): Promise<void> {
   await fetch(`${API_BASE}/documents`, { method: "DELETE" });
 }
 
+export async function deleteDocument(filename: string): Promise<void> {
+  await fetch(`${API_BASE}/documents/${encodeURIComponent(filename)}`, { method: "DELETE" });
+}
+
+export async function deleteConversation(conversationId: string): Promise<void> {
+  await fetch(`${API_BASE}/conversations/${encodeURIComponent(conversationId)}`, {
+    method: "DELETE",
+  });
+}
+
 export async function getHealth(): Promise<HealthStatus> {
   const res = await fetch(`${API_BASE}/health`);
   return res.json();
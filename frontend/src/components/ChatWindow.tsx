@@ -20,6 +20,10 @@ export function ChatWindow({ messages, isLoading, error, onSend, onClear }: Prop
     bottomRef.current?.scrollIntoView({ behavior: "smooth" });
   }, [messages, isLoading]);
 
+  // Once tokens are streaming into a bubble the typing indicator is redundant
+  const lastMessage = messages[messages.length - 1];
+  const isStreaming = lastMessage?.role === "assistant" && lastMessage.streaming;
+
   const handleSubmit = (e: FormEvent) => {
     e.preventDefault();
     if (!input.trim() || isLoading) return;
@@ -73,7 +77,7 @@ export function ChatWindow({ messages, isLoading, error, onSend, onClear }: Prop
           <MessageBubble key={msg.id} message={msg} />
         ))}
 
-        {isLoading && (
+        {isLoading && !isStreaming && (
           <div className="message message--assistant">
             <div className="message__avatar">
               <Loader2 size={18} className="spinning" />
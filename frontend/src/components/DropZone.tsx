@@ -1,8 +1,42 @@
 import { useCallback, useState } from "react";
 import { useDropzone } from "react-dropzone";
 import { Upload, FileText, CheckCircle, AlertCircle, Loader2 } from "lucide-react";
-import { uploadDocument } from "../api/client";
-import type { DocumentInfo } from "../types";
+import { getUploadJob, uploadDocument } from "../api/client";
+import type { DocumentInfo, IngestionJob } from "../types";
+
+const POLL_INTERVAL_MS = 1000;
+
+const STAGE_LABELS: Record<IngestionJob["status"], string> = {
+  queued: "I kö",
+  parsing: "Läser och delar upp dokumentet",
+  embedding: "Skapar embeddings",
+  storing: "Sparar i vektordatabasen",
+  done: "Klar",
+  failed: "Misslyckades",
+};
+
+function describeJob(job: IngestionJob): string {
+  const label = STAGE_LABELS[job.status];
+  if (job.chunks_total > 0 && job.status === "embedding") {
+    return `${label} (${job.chunks_embedded}/${job.chunks_total} segment)`;
+  }
+  if (job.chunks_total > 0 && job.status === "storing") {
+    return `${label} (${job.chunks_stored}/${job.chunks_total} segment)`;
+  }
+  return label;
+}
+
+async function waitForJob(
+  jobId: string,
+  onProgress: (job: IngestionJob) => void,
+): Promise<IngestionJob> {
+  for (;;) {
+    const job = await getUploadJob(jobId);
+    onProgress(job);
+    if (job.status === "done" || job.status === "failed") return job;
+    await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+  }
+}
 
 interface Props {
   chunkSize: number;
@@ -12,6 +46,7 @@ interface Props {
 
 export function DropZone({ chunkSize, chunkOverlap, onUpload }: Props) {
   const [uploading, setUploading] = useState(false);
+  const [progress, setProgress] = useState<string | null>(null);
   const [uploadStatus, setUploadStatus] = useState<{
     type: "success" | "error";
     message: string;
@@ -24,9 +59,15 @@ export function DropZone({ chunkSize, chunkOverlap, onUpload }: Props) {
 
       setUploading(true);
       setUploadStatus(null);
+      setProgress(null);
 
       try {
-        const doc = await uploadDocument(file, chunkSize, chunkOverlap);
+        const submitted = await uploadDocument(file, chunkSize, chunkOverlap);
+        const job = await waitForJob(submitted.job_id, (j) => setProgress(describeJob(j)));
+        if (job.status === "failed" || !job.document) {
+          throw new Error(job.error || "Uppladdning misslyckades");
+        }
+        const doc = job.document;
         setUploadStatus({
           type: "success",
           message: `"${doc.filename}" uppladdad! ${doc.num_chunks} textsegment, ${doc.num_tables} tabellposter, ${doc.num_paragraphs} stycken.`,
@@ -48,6 +89,9 @@ export function DropZone({ chunkSize, chunkOverlap, onUpload }: Props) {
     onDrop,
     accept: {
       "application/vnd.openxmlformats-officedocument.wordprocessingml.document": [".docx"],
+      "application/pdf": [".pdf"],
+      "text/html": [".html", ".htm"],
+      "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": [".xlsx"],
     },
     maxFiles: 1,
     disabled: uploading,
@@ -64,7 +108,9 @@ export function DropZone({ chunkSize, chunkOverlap, onUpload }: Props) {
           <div className="drop-zone__content">
             <Loader2 className="drop-zone__icon spinning" size={40} />
             <p>Bearbetar dokument...</p>
-            <span className="drop-zone__sub">Extraherar text, skapar embeddings</span>
+            <span className="drop-zone__sub">
+              {progress ?? "Extraherar text, skapar embeddings"}
+            </span>
           </div>
         ) : isDragActive ? (
           <div className="drop-zone__content">
@@ -74,7 +120,7 @@ export function DropZone({ chunkSize, chunkOverlap, onUpload }: Props) {
         ) : (
           <div className="drop-zone__content">
             <FileText className="drop-zone__icon" size={40} />
-            <p>Dra och släpp en .docx-fil här</p>
+            <p>Dra och släpp ett dokument här (.docx, .pdf, .html, .xlsx)</p>
             <span className="drop-zone__sub">eller klicka för att välja fil</span>
           </div>
         )}
@@ -27,6 +27,17 @@ export function MessageBubble({ message }: Props) {
           {message.model_used && (
             <span className="message__model">{message.model_used}</span>
           )}
+          {message.timing && (
+            <span title="Tid till första token / total tid">
+              {(message.timing.time_to_first_token_ms / 1000).toFixed(1)} s /{" "}
+              {(message.timing.total_ms / 1000).toFixed(1)} s
+            </span>
+          )}
+          {!!message.prompt_tokens && (
+            <span title="Uppskattat antal tokens i prompten">
+              ~{message.prompt_tokens} tokens
+            </span>
+          )}
         </div>
       </div>
     </div>
@@ -1,6 +1,6 @@
 import { useEffect, useState } from "react";
-import { Settings, FileText, Trash2, Sun, Moon } from "lucide-react";
-import { getModels, clearDocuments } from "../api/client";
+import { Settings, FileText, Trash2, Sun, Moon, X } from "lucide-react";
+import { getModels, clearDocuments, deleteDocument } from "../api/client";
 import type { ChatSettings, DocumentInfo, ModelOption } from "../types";
 
 interface Props {
@@ -8,6 +8,7 @@ interface Props {
   onSettingsChange: (settings: ChatSettings) => void;
   documents: DocumentInfo[];
   onDocumentsCleared: () => void;
+  onDocumentRemoved: (filename: string) => void;
   darkMode: boolean;
   onToggleDarkMode: () => void;
 }
@@ -17,6 +18,7 @@ export function SettingsPanel({
   onSettingsChange,
   documents,
   onDocumentsCleared,
+  onDocumentRemoved,
   darkMode,
   onToggleDarkMode,
 }: Props) {
@@ -39,6 +41,12 @@ export function SettingsPanel({
     }
   };
 
+  const handleRemove = async (filename: string) => {
+    if (!confirm(`Vill du ta bort "${filename}"?`)) return;
+    await deleteDocument(filename);
+    onDocumentRemoved(filename);
+  };
+
   const providerModels = models[settings.provider] || [];
 
   return (
@@ -196,8 +204,8 @@ export function SettingsPanel({
             {documents.length > 0 ? (
               <>
                 <div className="doc-list">
-                  {documents.map((doc, i) => (
-                    <div key={i} className="doc-item">
+                  {documents.map((doc) => (
+                    <div key={doc.filename} className="doc-item">
                       <FileText size={14} />
                       <div className="doc-item__info">
                         <span className="doc-item__name">{doc.filename}</span>
@@ -205,6 +213,13 @@ export function SettingsPanel({
                           {doc.num_chunks} segment &middot; {doc.num_tables} tabeller
                         </span>
                       </div>
+                      <button
+                        className="btn btn--ghost btn--sm"
+                        onClick={() => handleRemove(doc.filename)}
+                        title="Ta bort dokumentet"
+                      >
+                        <X size={14} />
+                      </button>
                     </div>
                   ))}
                 </div>
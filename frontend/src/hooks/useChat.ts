@@ -1,5 +1,5 @@
-import { useCallback, useState } from "react";
-import { sendMessage } from "../api/client";
+import { useCallback, useRef, useState } from "react";
+import { deleteConversation, streamMessage } from "../api/client";
 import type { ChatMessage, ChatSettings } from "../types";
 
 let messageId = 0;
@@ -8,10 +8,17 @@ function nextId(): string {
   return `msg-${++messageId}-${Date.now()}`;
 }
 
+// The server keeps the history of a conversation; a cleared chat starts a new one.
+// (crypto.randomUUID needs a secure context, which plain-HTTP deployments lack.)
+function newConversationId(): string {
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+}
+
 export function useChat(settings: ChatSettings) {
   const [messages, setMessages] = useState<ChatMessage[]>([]);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const conversationId = useRef(newConversationId());
 
   const send = useCallback(
     async (question: string) => {
@@ -28,28 +35,47 @@ export function useChat(settings: ChatSettings) {
       setIsLoading(true);
       setError(null);
 
+      const assistantId = nextId();
+      const updateAssistant = (update: (msg: ChatMessage) => ChatMessage) =>
+        setMessages((prev) => prev.map((m) => (m.id === assistantId ? update(m) : m)));
+
       try {
-        const response = await sendMessage(
+        await streamMessage(
           question,
           settings.provider,
           settings.model,
           settings.temperature,
           settings.top_k,
+          {
+            onSources: (sources) => {
+              const assistantMessage: ChatMessage = {
+                id: assistantId,
+                role: "assistant",
+                content: "",
+                sources,
+                streaming: true,
+                timestamp: new Date(),
+              };
+              setMessages((prev) => [...prev, assistantMessage]);
+            },
+            onToken: (text) =>
+              updateAssistant((m) => ({ ...m, content: m.content + text })),
+            onDone: (modelUsed, timing, promptTokens) =>
+              updateAssistant((m) => ({
+                ...m,
+                model_used: modelUsed,
+                timing,
+                prompt_tokens: promptTokens,
+                streaming: false,
+              })),
+          },
+          undefined,
+          conversationId.current,
         );
-
-        const assistantMessage: ChatMessage = {
-          id: nextId(),
-          role: "assistant",
-          content: response.answer,
-          sources: response.sources,
-          model_used: response.model_used,
-          timestamp: new Date(),
-        };
-
-        setMessages((prev) => [...prev, assistantMessage]);
       } catch (err) {
         const msg = err instanceof Error ? err.message : "Ett oväntat fel uppstod";
         setError(msg);
+        updateAssistant((m) => ({ ...m, streaming: false }));
       } finally {
         setIsLoading(false);
       }
@@ -58,6 +84,8 @@ export function useChat(settings: ChatSettings) {
   );
 
   const clearMessages = useCallback(() => {
+    deleteConversation(conversationId.current).catch(() => {});
+    conversationId.current = newConversationId();
     setMessages([]);
     setError(null);
   }, []);
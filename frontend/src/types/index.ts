@@ -4,6 +4,34 @@ export interface SourceReference {
   section: string | null;
   score: number;
   chunk_index: number;
+  chunk_id?: string | null;
+}
+
+export type ChunkKind = "paragraph" | "table_entry" | "window";
+
+export interface SearchFilters {
+  sources?: string[];
+  sections?: string[];
+  kinds?: ChunkKind[];
+}
+
+export interface FacetValue {
+  value: string;
+  count: number;
+  source: string | null;
+}
+
+export interface Facets {
+  sources: FacetValue[];
+  sections: FacetValue[];
+  kinds: FacetValue[];
+}
+
+export interface GenerationTiming {
+  retrieval_ms: number;
+  time_to_first_token_ms: number;
+  generation_ms: number;
+  total_ms: number;
 }
 
 export interface ChatMessage {
@@ -12,6 +40,9 @@ export interface ChatMessage {
   content: string;
   sources?: SourceReference[];
   model_used?: string;
+  timing?: GenerationTiming | null;
+  prompt_tokens?: number | null;
+  streaming?: boolean;
   timestamp: Date;
 }
 
@@ -21,6 +52,53 @@ export interface DocumentInfo {
   num_tables: number;
   num_paragraphs: number;
   sample_sections: string[];
+  status: "indexing" | "ready" | "failed";
+  content_hash: string | null;
+  stage_ms: Record<string, number>;
+  error: string | null;
+  updated_at: number | null;
+}
+
+export type IngestionStatus =
+  | "queued"
+  | "parsing"
+  | "embedding"
+  | "storing"
+  | "done"
+  | "failed";
+
+export interface IndexResult {
+  added: number;
+  unchanged: number;
+  updated: number;
+  removed: number;
+}
+
+export interface IngestionJob {
+  job_id: string;
+  filename: string;
+  tenant: string;
+  status: IngestionStatus;
+  chunks_total: number;
+  chunks_embedded: number;
+  chunks_stored: number;
+  index: IndexResult | null;
+  stage_ms: Record<string, number>;
+  file_bytes: number;
+  parse_mb_per_s: number | null;
+  error: string | null;
+  document: DocumentInfo | null;
+  created_at: number;
+}
+
+export interface SkippedFile {
+  filename: string;
+  reason: string;
+}
+
+export interface BatchUploadResponse {
+  jobs: IngestionJob[];
+  skipped: SkippedFile[];
 }
 
 export interface ModelOption {
@@ -37,9 +115,28 @@ export interface ChatSettings {
   chunk_overlap: number;
 }
 
+export interface EmbeddingCacheStats {
+  entries: number;
+  max_entries: number;
+  hits: number;
+  misses: number;
+  hit_rate: number;
+}
+
+export interface AnswerCacheStats {
+  entries: number;
+  hits: number;
+  misses: number;
+  hit_rate: number;
+  latency_saved_ms: number;
+}
+
 export interface HealthStatus {
   status: string;
   documents_loaded: number;
   total_chunks: number;
+  vector_backend: string;
   embedding_model: string;
+  embedding_cache: EmbeddingCacheStats | null;
+  answer_cache: AnswerCacheStats | null;
 }